@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +56,20 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# リクエストの計測 (core.middleware.InstrumentationMiddleware)
+# onの場合、クエリ数・DB時間・テンプレート描画時間をServer-Timingヘッダーで返し、/metrics/で集計値を公開する
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION", "off") == "on"
+# /metrics/の認証トークン (Authorization: Bearer <token>). 未設定の場合はスタッフユーザーのみ閲覧できる
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# 料理名の一括生成API (/api/generate-dishes/batch/) の認証トークン (Authorization: Bearer <token>)
+# 未設定の場合はAPIを使えない
+BATCH_API_TOKEN = os.environ.get("BATCH_API_TOKEN", "")
+# 料理名の一括生成APIの1分あたりのリクエスト数の上限
+BATCH_API_RATE_LIMIT = int(os.environ.get("BATCH_API_RATE_LIMIT", "30"))
+if INSTRUMENTATION_ENABLED:
+    # 他のミドルウェア (セッション・認証) のクエリも含めて計測するため先頭に置く
+    MIDDLEWARE.insert(0, "core.middleware.InstrumentationMiddleware")
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -77,13 +92,119 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "database" / "db.sqlite3",
+# DATABASE_ENGINE: sqlite (既定) / postgres
+
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite")
+
+if DATABASE_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "whimsicalmeals"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "127.0.0.1"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+    if os.environ.get("DATABASE_POOL", "on") == "on":
+        # psycopgの接続プール (psycopg[pool]が必要). プール使用時はCONN_MAX_AGEを0にする
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10")),
+                "timeout": int(os.environ.get("DATABASE_POOL_TIMEOUT", "10")),
+            },
+        }
+    else:
+        # プールを使わない場合は接続を使い回す
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DATABASE_CONN_MAX_AGE", "60"))
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "database" / "db.sqlite3"),
+        }
     }
+
+# SQLiteの同時書き込み向けチューニング (core.signalsで接続ごとに適用)
+# SQLITE_TUNING=offで無効化できる
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "on") == "on"
+SQLITE_PRAGMAS = {
+    # 読み取りと書き込みを同時に行えるようにする
+    "journal_mode": "WAL",
+    # WALモードではNORMALでもデータベースは破損しない
+    "synchronous": "NORMAL",
+    # ロック中は即座にエラーにせず最大20秒待つ. 単位はミリ秒
+    "busy_timeout": 20000,
+    # 256MBまでメモリマップドI/Oで読み取る
+    "mmap_size": 256 * 1024 * 1024,
 }
+if DATABASE_ENGINE != "postgres" and SQLITE_TUNING:
+    # 書き込みトランザクションを開始時にロックし、途中でのロック昇格の失敗を防ぐ
+    DATABASES["default"]["OPTIONS"] = {"transaction_mode": "IMMEDIATE"}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND: locmem (既定) / file / redis
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", "redis://127.0.0.1:6379"),
+        }
+    }
+elif CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", BASE_DIR / "database" / "cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# ランキングキャッシュ (dishes.leaderboard)
+LEADERBOARD_CACHE_ALIAS = "default"
+LEADERBOARD_SIZE = 100
+LEADERBOARD_TIMEOUT = 300
+
+# ユーザーごとの材料スナップショットキャッシュ (ingredients.cache)
+# LocMemCacheはプロセスごとのため、他のプロセスでの変更はこの時間が過ぎるまで表示に反映されない
+INGREDIENT_CACHE_ALIAS = "default"
+INGREDIENT_CACHE_TIMEOUT = 60 * 5
+
+# ユーザーがいいねした料理IDの集合のキャッシュ (dishes.liked)
+# LocMemCacheはプロセスごとのため、他のプロセスでのいいねはこの時間が過ぎるまで表示に反映されない.
+# 複数プロセスで動かす場合は共有のキャッシュを使うこと (check --deployで警告する)
+LIKED_DISHES_CACHE_ALIAS = "default"
+LIKED_DISHES_CACHE_TIMEOUT = 60
+# これより多くいいねしているユーザーは集合をキャッシュせず、表示中の料理ごとに問い合わせる
+LIKED_DISHES_MAX_SIZE = 5000
+
+# いいねの書き込みバッファ (dishes.like_buffer)
+# onの場合、いいねのトグルはキャッシュに記録してすぐに応答し、データベースへはまとめて書き込む。
+# 共有のキャッシュ (CACHE_BACKEND=redis) が必要. LocMemCache・FileBasedCacheではシステムチェックのエラーになる
+LIKE_BUFFER = os.environ.get("LIKE_BUFFER", "off") == "on"
+LIKE_BUFFER_CACHE_ALIAS = "default"
+# 1回のトランザクションで反映するトグルの件数
+LIKE_BUFFER_BATCH_SIZE = 500
+# リクエストの処理中にフラッシュする間隔 (秒). 0の場合はflush_likesコマンドでのみフラッシュする
+LIKE_BUFFER_FLUSH_INTERVAL = float(os.environ.get("LIKE_BUFFER_FLUSH_INTERVAL", "1"))
+
+
+# 料理名生成の独自テンプレートセット (dishes.utils.register_template_set)
+# 例: {"spicy": {"templates": ["激辛{0}{1}{2}"], "dish_types": ["鍋", "炒め"]}}
+DISH_TEMPLATE_SETS: dict[str, dict] = {}
 
 
 # Password validation
@@ -136,7 +257,21 @@ STATICFILES_FINDERS = [
 
 COMPRESS_PRECOMPILERS = (("text/x-scss", "django_libsass.SassCompiler"),)
 COMPRESS_ENABLED = True
-COMPRESS_OFFLINE = False
+
+# 静的ファイルの事前ビルド (build_assetsコマンド)
+# ASSETS_OFFLINE=onの場合、SCSSはビルド時にコンパイル済みのものを使い、リクエスト時にはコンパイルしない。
+# 静的ファイルはハッシュ付きのファイル名でマニフェストから解決する
+ASSETS_OFFLINE = os.environ.get("ASSETS_OFFLINE", "off") == "on"
+COMPRESS_OFFLINE = ASSETS_OFFLINE
+if ASSETS_OFFLINE:
+    STORAGES = {
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "core.storage.HashedManifestStaticFilesStorage",
+        },
+    }
 
 # LibSass settings for SCSS compilation
 LIBSASS_INCLUDE_PATHS = [
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401, PLC0415
+        from .instrumentation import instrument_templates  # noqa: PLC0415
+
+        if settings.INSTRUMENTATION_ENABLED:
+            instrument_templates()
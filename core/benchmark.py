@@ -0,0 +1,40 @@
+"""負荷試験・ベンチマークコマンド共通の処理."""
+
+import statistics
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.db import connection
+
+
+@contextmanager
+def throwaway_database(name: str) -> Iterator[None]:
+    """使い捨てのテスト用データベースを作成し、終了時に削除する.
+
+    SQLiteの場合はインメモリではなく一時ファイルに作成する。
+    インメモリでは実際のロック競合やファイルI/Oが再現されないため。
+
+    Args:
+        name: SQLiteのファイル名 (拡張子なし)
+    """
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if connection.vendor == "sqlite" and not test_settings.get("NAME"):
+            test_settings["NAME"] = str(Path(tmpdir) / f"{name}.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def latency_percentiles(latencies: list[float]) -> dict[str, float]:
+    """レイテンシ (秒) のp50/p95/p99をミリ秒で返す."""
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
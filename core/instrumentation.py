@@ -0,0 +1,229 @@
+"""リクエストごとのクエリ数・処理時間の計測.
+
+INSTRUMENTATION=onの場合のみ有効になる。計測値はServer-Timingヘッダーで返し、
+URL名ごとにプロセス内で集計してメトリクスエンドポイント (Prometheus形式) で公開する。
+
+クエリは全てのデータベース接続に登録したexecute_wrapperで数える。
+計測中のリクエストはContextVarで保持するため、非同期ビューからsync_to_asyncで実行されたクエリや、
+シグナルから実行された書き込み (いいね数の更新など) も同じリクエストに集計される。
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from django.template.base import Template
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from django.db.backends.base.base import BaseDatabaseWrapper
+    from django.template.context import Context
+    from django.utils.safestring import SafeString
+
+# 処理時間のヒストグラムの区切り. 単位は秒
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# クエリ数のヒストグラムの区切り
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# 書き込みとして数えるSQL
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@dataclass
+class RequestStats:
+    """1リクエスト分の計測値."""
+
+    queries: int = 0
+    writes: int = 0
+    db_time: float = 0.0
+    template_time: float = 0.0
+    # extends・includeで入れ子になったテンプレートを二重に数えないための深さ
+    template_depth: int = 0
+
+    def server_timing(self, view_time: float) -> str:
+        """Server-Timingヘッダーの値を返す (ミリ秒)."""
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {self.writes} writes", '
+            f"tpl;dur={self.template_time * 1000:.1f}, "
+            f"view;dur={view_time * 1000:.1f}"
+        )
+
+
+_current_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def start_request() -> tuple[RequestStats, Any]:
+    """リクエストの計測を開始する. 戻り値のトークンはfinish_requestに渡す."""
+    stats = RequestStats()
+    return stats, _current_stats.set(stats)
+
+
+def finish_request(token: Any) -> None:  # noqa: ANN401
+    """リクエストの計測を終了する."""
+    _current_stats.reset(token)
+
+
+def count_queries(
+    execute: Callable,
+    sql: str,
+    params: Any,  # noqa: ANN401
+    many: bool,  # noqa: FBT001
+    context: dict[str, Any],
+) -> Any:  # noqa: ANN401
+    """クエリ数と実行時間を計測中のリクエストに加算するexecute_wrapper."""
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+        if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            stats.writes += 1
+
+
+def instrument_connection(connection: BaseDatabaseWrapper) -> None:
+    """データベース接続にexecute_wrapperを登録する."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def instrument_templates() -> None:
+    """テンプレートの描画時間を計測するようにTemplate._renderを置き換える."""
+    original = Template._render  # noqa: SLF001
+    if getattr(original, "instrumented", False):
+        return
+
+    @functools.wraps(original)
+    def _render(self: Template, context: Context) -> SafeString:
+        stats = _current_stats.get()
+        if stats is None or stats.template_depth:
+            return original(self, context)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.template_depth -= 1
+
+    _render.instrumented = True  # type: ignore[attr-defined]
+    Template._render = _render  # type: ignore[method-assign]  # noqa: SLF001
+
+
+@dataclass
+class Histogram:
+    """累積ヒストグラム (Prometheusのhistogram型と同じ形式)."""
+
+    buckets: tuple[float, ...]
+    counts: list[int] = field(init=False)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        """区切りごとの件数を初期化する. 最後の要素は+Inf."""
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        """値を1件記録する."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(上限, 上限以下の件数) のリストを返す."""
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        cumulative = 0
+        result = []
+        for bound, count in zip(bounds, self.counts, strict=True):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+
+@dataclass
+class ViewMetrics:
+    """URL名ごとの集計値."""
+
+    duration: Histogram = field(default_factory=lambda: Histogram(DURATION_BUCKETS))
+    queries: Histogram = field(default_factory=lambda: Histogram(QUERY_COUNT_BUCKETS))
+    db_time: float = 0.0
+    template_time: float = 0.0
+    writes: int = 0
+
+
+class RequestMetrics:
+    """リクエストの計測値をURL名ごとにプロセス内で集計するサービス.
+
+    ワーカープロセスごとに別々に集計されるため、複数プロセスで動かす場合は
+    各プロセスのメトリクスを収集側で合算する。
+    """
+
+    def __init__(self) -> None:
+        """空の集計で初期化する."""
+        self.lock = threading.Lock()
+        self.views: dict[str, ViewMetrics] = {}
+
+    def record(self, view_name: str, stats: RequestStats, view_time: float) -> None:
+        """1リクエスト分の計測値を集計に加える."""
+        with self.lock:
+            metrics = self.views.get(view_name)
+            if metrics is None:
+                metrics = self.views[view_name] = ViewMetrics()
+            metrics.duration.observe(view_time)
+            metrics.queries.observe(stats.queries)
+            metrics.db_time += stats.db_time
+            metrics.template_time += stats.template_time
+            metrics.writes += stats.writes
+
+    def render_prometheus(self) -> str:
+        """集計値をPrometheusのテキスト形式で返す."""
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = [
+                "# HELP request_duration_seconds ビューの処理時間 (テンプレートの描画とクエリを含む)",
+                "# TYPE request_duration_seconds histogram",
+                *_histogram_lines("request_duration_seconds", views, lambda metrics: metrics.duration),
+                "# HELP request_queries 1リクエストあたりのSQLクエリ数",
+                "# TYPE request_queries histogram",
+                *_histogram_lines("request_queries", views, lambda metrics: metrics.queries),
+                "# HELP request_db_seconds_total SQLクエリの実行時間の合計",
+                "# TYPE request_db_seconds_total counter",
+                *(f'request_db_seconds_total{{view="{name}"}} {m.db_time:.6f}' for name, m in views),
+                "# HELP request_template_seconds_total テンプレートの描画時間の合計",
+                "# TYPE request_template_seconds_total counter",
+                *(f'request_template_seconds_total{{view="{name}"}} {m.template_time:.6f}' for name, m in views),
+                "# HELP request_db_writes_total 書き込みクエリ (INSERT/UPDATE/DELETE) の数. シグナルによる更新を含む",
+                "# TYPE request_db_writes_total counter",
+                *(f'request_db_writes_total{{view="{name}"}} {m.writes}' for name, m in views),
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(
+    metric: str,
+    views: list[tuple[str, ViewMetrics]],
+    select: Callable[[ViewMetrics], Histogram],
+) -> list[str]:
+    """ヒストグラム1種類分の行を返す."""
+    lines = []
+    for name, metrics in views:
+        histogram = select(metrics)
+        lines.extend(
+            f'{metric}_bucket{{view="{name}",le="{bound}"}} {count}' for bound, count in histogram.cumulative()
+        )
+        lines.append(f'{metric}_sum{{view="{name}"}} {histogram.total:g}')
+        lines.append(f'{metric}_count{{view="{name}"}} {histogram.count}')
+    return lines
+
+
+request_metrics = RequestMetrics()
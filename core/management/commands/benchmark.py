@@ -0,0 +1,249 @@
+"""主要ページのベンチマーク."""
+
+import json
+import random
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmark import latency_percentiles, throwaway_database
+from core.seeding import DataSeeder
+from dishes.models import GeneratedDish
+
+
+class Endpoint(NamedTuple):
+    """計測対象のエンドポイント."""
+
+    method: str
+    # 乱数生成器とリクエストするユーザーを受け取り、URLを返す
+    url: Callable[[random.Random, User], str]
+
+
+class Command(BaseCommand):
+    """使い捨てのデータベースにデータを投入し、主要ページを複数のクライアントから同時に計測する."""
+
+    help = (
+        "使い捨てのデータベースにユーザー・材料・料理・いいねを投入し、主要ページを複数スレッドで同時に計測します。"
+        "エンドポイントごとのレイテンシ (p50/p95/p99)・スループット・クエリ数をJSONファイルに出力します。"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--users", type=int, default=50, help="ユーザー数")
+        parser.add_argument("--ingredients", type=int, default=8, help="1ユーザーあたりの材料数")
+        parser.add_argument("--dishes", type=int, default=1000, help="料理の総数")
+        parser.add_argument("--likes", type=int, default=5000, help="いいねの総数の目安 (べき分布)")
+        parser.add_argument("--threads", type=int, default=4, help="同時実行するクライアント数")
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="1クライアントあたりのリクエスト数 (エンドポイントごと)",
+        )
+        parser.add_argument(
+            "--endpoints",
+            default="",
+            help="計測するエンドポイントをカンマ区切りで指定 (既定は全て)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+        parser.add_argument("--output", default="benchmark.json", help="結果を書き出すJSONファイル")
+        parser.add_argument("--baseline", default="", help="比較対象とする以前の結果のJSONファイル")
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        self.endpoints = self.select_endpoints(options["endpoints"])
+        baseline = self.load_baseline(options["baseline"])
+        try:
+            seeder = DataSeeder(
+                users=options["users"],
+                ingredients=options["ingredients"],
+                dishes=options["dishes"],
+                likes=options["likes"],
+                seed=options["seed"],
+                username_prefix="bench_",
+            )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        # テストクライアント用にALLOWED_HOSTSを設定し、本番と同じくDEBUG=Falseで計測する
+        setup_test_environment(debug=False)
+        try:
+            with throwaway_database("benchmark"):
+                result = self.run(seeder, options)
+        finally:
+            teardown_test_environment()
+
+        output = Path(options["output"])
+        output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        self.write_result(result, baseline)
+        self.stdout.write(self.style.SUCCESS(f"結果を{output}に書き出しました。"))
+
+    def select_endpoints(self, names: str) -> dict[str, Endpoint]:
+        """計測するエンドポイントを選ぶ."""
+        endpoints = {
+            "index": Endpoint("GET", lambda _rng, _user: reverse("index")),
+            "ranking": Endpoint("GET", lambda _rng, _user: reverse("dishes:ranking")),
+            "recent": Endpoint("GET", lambda _rng, _user: reverse("dishes:recent")),
+            "generate": Endpoint("POST", lambda _rng, _user: reverse("dishes:generate")),
+            "toggle_like": Endpoint(
+                "POST",
+                lambda rng, user: reverse("dishes:toggle_like", args=[rng.choice(self.likeable_dish_ids[user.pk])]),
+            ),
+        }
+        selected = [name.strip() for name in names.split(",") if name.strip()]
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            msg = f"不明なエンドポイントです: {', '.join(sorted(unknown))} (指定可能: {', '.join(endpoints)})"
+            raise CommandError(msg)
+        return {name: endpoint for name, endpoint in endpoints.items() if not selected or name in selected}
+
+    def load_baseline(self, path: str) -> dict[str, Any] | None:
+        """比較対象の結果を読み込む."""
+        if not path:
+            return None
+        try:
+            return json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            msg = f"比較対象の結果を読み込めません: {e}"
+            raise CommandError(msg) from e
+
+    def run(self, seeder: DataSeeder, options: dict[str, Any]) -> dict[str, Any]:
+        """データを投入して計測する."""
+        rng = random.Random(options["seed"])  # noqa: S311
+        started = time.perf_counter()
+        dataset = seeder.run()
+        self.stdout.write(
+            f"データ投入: ユーザー {dataset.users}人, 材料 {dataset.ingredients}件, "
+            f"料理 {dataset.dishes}件, いいね {dataset.likes}件 ({time.perf_counter() - started:.1f}秒)",
+        )
+
+        users = list(User.objects.order_by("pk")[: options["threads"]])
+        # 自分の料理にはいいねできないため、他人の料理から選ぶ
+        self.likeable_dish_ids = {
+            user.pk: list(GeneratedDish.objects.exclude(user=user).values_list("pk", flat=True)) for user in users
+        }
+        results = {}
+        for name, endpoint in self.endpoints.items():
+            # 初回のみ発生するコストを除く. SCSSのコンパイル・テンプレートの読み込み・ランキングのキャッシュ作成など
+            self.request(Client(), endpoint, rng, users[0], login=True)
+            results[name] = self.measure(endpoint, users, options["requests"], rng.random())
+
+        return {
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "threads": len(users),
+            "requests": options["requests"],
+            "dataset": dataset._asdict(),
+            "endpoints": results,
+        }
+
+    def measure(self, endpoint: Endpoint, users: list[User], requests: int, seed: float) -> dict[str, Any]:
+        """1つのエンドポイントを全クライアントから同時に計測する."""
+        latencies: list[float] = []
+        query_counts: list[int] = []
+        statuses: dict[int, int] = {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(users))
+
+        def worker(user: User, worker_seed: float) -> None:
+            worker_rng = random.Random(worker_seed)  # noqa: S311
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            local_latencies = []
+            local_query_counts = []
+            local_statuses: dict[int, int] = {}
+            barrier.wait()
+            for _ in range(requests):
+                start = time.perf_counter()
+                response, queries = self.request(client, endpoint, worker_rng, user)
+                local_latencies.append(time.perf_counter() - start)
+                local_query_counts.append(queries)
+                local_statuses[response.status_code] = local_statuses.get(response.status_code, 0) + 1
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                query_counts.extend(local_query_counts)
+                for status, count in local_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+        worker_rng = random.Random(seed)  # noqa: S311
+        threads = [threading.Thread(target=worker, args=(user, worker_rng.random())) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        errors = sum(count for status, count in statuses.items() if status >= 400)  # noqa: PLR2004
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "elapsed": elapsed,
+            # エラーになったリクエストは除いて計算する
+            "throughput_rps": (len(latencies) - errors) / elapsed if elapsed else 0.0,
+            **latency_percentiles(latencies),
+            "queries_avg": sum(query_counts) / len(query_counts) if query_counts else 0.0,
+            "queries_max": max(query_counts, default=0),
+        }
+
+    def request(
+        self,
+        client: Client,
+        endpoint: Endpoint,
+        rng: random.Random,
+        user: User,
+        *,
+        login: bool = False,
+    ) -> tuple[Any, int]:
+        """1回リクエストし、レスポンスと実行されたクエリ数を返す."""
+        if login:
+            client.force_login(user)
+        queries = 0
+
+        def count_queries(execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:  # noqa: ANN401, FBT001
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        url = endpoint.url(rng, user)
+        # 非同期ビューのORM呼び出しも含め、クエリは同じスレッドの接続で実行される
+        with connection.execute_wrapper(count_queries):
+            response = client.post(url) if endpoint.method == "POST" else client.get(url)
+        return response, queries
+
+    def write_result(self, result: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+        """結果を表示する."""
+        self.stdout.write(f"クライアント {result['threads']}並列 x {result['requests']}リクエスト")
+        for name, stats in result["endpoints"].items():
+            line = (
+                f"{name:<12} {stats['throughput_rps']:8.1f} req/s  "
+                f"p50 {stats['p50_ms']:7.1f}ms  p95 {stats['p95_ms']:7.1f}ms  p99 {stats['p99_ms']:7.1f}ms  "
+                f"クエリ {stats['queries_avg']:.1f} (最大 {stats['queries_max']})  エラー {stats['errors']}件"
+            )
+            previous = (baseline or {}).get("endpoints", {}).get(name)
+            if previous:
+                line += (
+                    f"  [比較: p95 {_change(previous['p95_ms'], stats['p95_ms'])}, "
+                    f"スループット {_change(previous['throughput_rps'], stats['throughput_rps'])}, "
+                    f"クエリ {stats['queries_avg'] - previous['queries_avg']:+.1f}]"
+                )
+            self.stdout.write(line)
+
+
+def _change(before: float, after: float) -> str:
+    """変化率を表示用の文字列にする."""
+    if not before:
+        return "-"
+    return f"{(after - before) / before:+.0%}"
@@ -0,0 +1,168 @@
+"""データベース設定ごとの同時書き込み性能の負荷試験."""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import OperationalError, connection
+
+from core.benchmark import latency_percentiles, throwaway_database
+from dishes.leaderboard import RANKING_ORDERING
+from dishes.models import GeneratedDish, Like
+
+# --compareで比較するモードと、そのモードで起動する際の環境変数
+MODES: dict[str, dict[str, str]] = {
+    "sqlite": {"DATABASE_ENGINE": "sqlite", "SQLITE_TUNING": "off"},
+    "sqlite-tuned": {"DATABASE_ENGINE": "sqlite", "SQLITE_TUNING": "on"},
+    "postgres": {"DATABASE_ENGINE": "postgres", "DATABASE_POOL": "off", "DATABASE_CONN_MAX_AGE": "0"},
+    "postgres-persistent": {"DATABASE_ENGINE": "postgres", "DATABASE_POOL": "off"},
+    "postgres-pool": {"DATABASE_ENGINE": "postgres", "DATABASE_POOL": "on"},
+}
+
+
+class Command(BaseCommand):
+    """使い捨てのデータベースに対して、いいねの切り替えとランキングの読み取りを並行実行する."""
+
+    help = (
+        "いいねの切り替えとランキングの読み取りを複数スレッドで同時に実行し、スループットとエラー数を計測します。"
+        "--compareを指定すると、データベース設定ごとに計測して比較します。"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--threads", type=int, default=8, help="同時実行するスレッド数")
+        parser.add_argument("--iterations", type=int, default=200, help="1スレッドあたりの操作回数")
+        parser.add_argument("--dishes", type=int, default=5, help="いいね対象の料理の数 (少ないほど競合が増える)")
+        parser.add_argument("--read-ratio", type=float, default=0.5, help="操作のうちランキング読み取りの割合")
+        parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+        parser.add_argument(
+            "--compare",
+            default="",
+            help=f"比較するモードをカンマ区切りで指定 ({', '.join(MODES)})",
+        )
+        parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        if options["compare"]:
+            self.compare(options)
+            return
+
+        result = self.run_in_test_database(options)
+        if options["json"]:
+            self.stdout.write(json.dumps(result))
+            return
+        self.write_result(result)
+
+    def compare(self, options: dict[str, Any]) -> None:
+        """モードごとに別プロセスで計測して結果を並べる."""
+        modes = [mode.strip() for mode in options["compare"].split(",") if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            msg = f"不明なモードです: {', '.join(sorted(unknown))}"
+            raise CommandError(msg)
+
+        args = [
+            f"--threads={options['threads']}",
+            f"--iterations={options['iterations']}",
+            f"--dishes={options['dishes']}",
+            f"--read-ratio={options['read_ratio']}",
+            f"--seed={options['seed']}",
+            "--json",
+        ]
+        for mode in modes:
+            completed = subprocess.run(  # noqa: S603
+                [sys.executable, str(Path(settings.BASE_DIR) / "manage.py"), "loadtest_db", *args],
+                env={**os.environ, **MODES[mode]},
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            if completed.returncode != 0:
+                self.stderr.write(f"{mode}: 失敗しました\n{completed.stderr.strip()}")
+                continue
+            self.write_result(json.loads(completed.stdout.strip().splitlines()[-1]), label=mode)
+
+    def run_in_test_database(self, options: dict[str, Any]) -> dict[str, Any]:
+        """使い捨てのデータベースを作成して計測する."""
+        with throwaway_database("loadtest"):
+            return self.run(options)
+
+    def run(self, options: dict[str, Any]) -> dict[str, Any]:
+        """計測本体."""
+        rng = random.Random(options["seed"])  # noqa: S311
+        owner = User.objects.create_user(username="loadtest_owner")
+        dishes = [GeneratedDish.objects.create(name=f"負荷試験{i}", user=owner) for i in range(options["dishes"])]
+        users = [User.objects.create_user(username=f"loadtest_{i}") for i in range(options["threads"])]
+        dish_ids = [dish.pk for dish in dishes]
+
+        latencies: list[float] = []
+        errors: list[str] = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(users))
+
+        def worker(user: User, seed: int) -> None:
+            worker_rng = random.Random(seed)  # noqa: S311
+            local_latencies = []
+            local_errors = []
+            barrier.wait()
+            for _ in range(options["iterations"]):
+                start = time.perf_counter()
+                try:
+                    if worker_rng.random() < options["read_ratio"]:
+                        list(GeneratedDish.objects.order_by(*RANKING_ORDERING).for_listing()[:10])
+                    else:
+                        # ToggleLikeViewと同じ手順でいいねを切り替える
+                        Like.objects.toggle(worker_rng.choice(dish_ids), user)  # type: ignore[attr-defined]
+                except OperationalError as e:
+                    local_errors.append(str(e))
+                local_latencies.append(time.perf_counter() - start)
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.extend(local_errors)
+
+        threads = [threading.Thread(target=worker, args=(user, rng.random())) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "vendor": connection.vendor,
+            "tuning": settings.SQLITE_TUNING if connection.vendor == "sqlite" else None,
+            "pool": "pool" in connection.settings_dict.get("OPTIONS", {}),
+            "operations": len(latencies),
+            "elapsed": elapsed,
+            # エラーになった操作は即座に返るため、成功した操作のみで計算する
+            "throughput": (len(latencies) - len(errors)) / elapsed if elapsed else 0.0,
+            **latency_percentiles(latencies),
+            "errors": len(errors),
+            "error_samples": sorted(set(errors))[:3],
+            # いいね数とLikeテーブルの実数がずれた料理の数 (0であるべき)
+            "drift": GeneratedDish.objects.filter(pk__in=dish_ids).reconcile_likes_count(),
+            "likes": Like.objects.count(),
+        }
+
+    def write_result(self, result: dict[str, Any], label: str = "") -> None:
+        """結果を表示する."""
+        if not label:
+            label = result["vendor"] + (" (tuned)" if result["tuning"] else "") + (" (pool)" if result["pool"] else "")
+        self.stdout.write(
+            f"{label}: {result['operations']}回 / {result['elapsed']:.2f}秒, 成功 {result['throughput']:.1f} ops/s, "
+            f"p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, "
+            f"エラー {result['errors']}件, いいね数のずれ {result['drift']}件",
+        )
+        for sample in result["error_samples"]:
+            self.stdout.write(f"  - {sample}")
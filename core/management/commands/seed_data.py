@@ -0,0 +1,84 @@
+"""検証用データの一括投入コマンド."""
+
+import time
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from core.seeding import DataSeeder
+from dishes.utils import DEFAULT_TEMPLATE_SET, template_set_names
+
+
+class Command(BaseCommand):
+    """ユーザー・材料・料理・いいねを一括で投入する."""
+
+    help = (
+        "ユーザー・材料・料理・いいねを一括で投入します。いいね数はべき分布に従います。"
+        "同じ--seedを指定すると同じデータを投入します。"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--users", type=int, default=1000, help="ユーザー数")
+        parser.add_argument("--ingredients", type=int, default=10, help="1ユーザーあたりの材料数")
+        parser.add_argument("--dishes", type=int, default=10000, help="料理の総数")
+        parser.add_argument("--likes", type=int, default=100000, help="いいねの総数の目安")
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=1.2,
+            help="いいね数のべき分布の形状パラメータ (小さいほど一部の料理に集中する)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=30,
+            help="料理といいねの作成日時を分散させる日数 (直近この日数に並ぶ)",
+        )
+        parser.add_argument("--prefix", default="seed_", help="ユーザー名の接頭辞")
+        parser.add_argument("--password", default=None, help="ユーザーのパスワード (省略時はログイン不可)")
+        parser.add_argument(
+            "--template-set",
+            default=DEFAULT_TEMPLATE_SET,
+            choices=template_set_names(),
+            help="料理名の生成に使うテンプレートセット",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk_createの1回あたりの件数")
+        parser.add_argument("--chunk-size", type=int, default=20000, help="1トランザクションで投入する料理数")
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        if User.objects.filter(username__startswith=options["prefix"]).exists():
+            msg = f"ユーザー名が「{options['prefix']}」で始まるユーザーが既に存在します。--prefixを変更してください。"
+            raise CommandError(msg)
+
+        try:
+            seeder = DataSeeder(
+                users=options["users"],
+                ingredients=options["ingredients"],
+                dishes=options["dishes"],
+                likes=options["likes"],
+                alpha=options["alpha"],
+                seed=options["seed"],
+                days=options["days"],
+                username_prefix=options["prefix"],
+                password=options["password"],
+                template_set=options["template_set"],
+                batch_size=options["batch_size"],
+                chunk_size=options["chunk_size"],
+                log=self.stdout.write if options["verbosity"] >= 1 else None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        started = time.perf_counter()
+        result = seeder.run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"ユーザー {result.users}人, 材料 {result.ingredients}件, 料理 {result.dishes}件, "
+                f"いいね {result.likes}件を投入しました ({elapsed:.1f}秒, {sum(result) / elapsed:,.0f}行/秒)。",
+            ),
+        )
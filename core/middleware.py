@@ -0,0 +1,62 @@
+"""共通ミドルウェア."""
+
+import time
+from collections.abc import Awaitable, Callable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpRequest, HttpResponseBase
+
+from .instrumentation import RequestStats, finish_request, request_metrics, start_request
+
+
+class InstrumentationMiddleware:
+    """リクエストごとのクエリ数・DB時間・テンプレート描画時間・処理時間を計測するミドルウェア.
+
+    計測値はServer-Timingヘッダーで返し、URL名ごとにrequest_metricsへ集計する。
+    非同期ビューを同期処理に変換しないよう、同期・非同期の両方に対応する。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        """ミドルウェアの初期化."""
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase | Awaitable[HttpResponseBase]:
+        """同期リクエストの処理."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        """非同期リクエストの処理."""
+        stats, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        stats: RequestStats,
+        view_time: float,
+    ) -> HttpResponseBase:
+        """計測値をヘッダーに付け、集計に加える."""
+        match = request.resolver_match
+        view_name = match.view_name if match else "<unresolved>"
+        request_metrics.record(view_name, stats, view_time)
+        response["Server-Timing"] = stats.server_timing(view_time)
+        return response
@@ -0,0 +1,334 @@
+"""大規模な検証用データの一括投入.
+
+ランキングなどを本番規模のデータで検証するため、ユーザー・材料・料理・いいねをまとめて投入する。
+シグナルを経由しないbulk_createやexecutemanyで書き込み、一定件数ごとにトランザクションを分ける。
+ingredient_namesとlikes_count、トレンドスコア、期間別いいね数はシグナルの代わりに投入時に設定するため、
+投入後も整合している。料理といいねの作成日時は直近days日に分散させ、トレンドの減衰や期間別の集計が働くようにする。
+"""
+
+import itertools
+import random
+import time
+from array import array
+from collections import Counter
+from collections.abc import Callable, Iterable, Sequence
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from dishes import rollups, trending
+from dishes.leaderboard import leaderboard
+from dishes.models import DishLikeRollup, GeneratedDish, Like
+from dishes.utils import DEFAULT_TEMPLATE_SET, get_template_set
+from ingredients.models import Ingredient
+
+# 材料名の候補. 1ユーザーあたりの材料数がこれより多い場合は番号を付けて区別する
+INGREDIENT_NAMES = (
+    "卵", "ネギ", "チーズ", "豚肉", "鶏肉", "牛肉", "玉ねぎ", "にんじん", "じゃがいも", "キャベツ",
+    "トマト", "ピーマン", "なす", "きゅうり", "大根", "白菜", "ほうれん草", "ブロッコリー", "しめじ", "しいたけ",
+    "豆腐", "納豆", "油揚げ", "鮭", "さば", "えび", "いか", "あさり", "ベーコン", "ソーセージ",
+    "ツナ", "ごはん", "うどん", "パスタ", "食パン", "牛乳", "バター", "味噌", "醤油", "マヨネーズ",
+    "レモン", "りんご", "バナナ", "もやし", "ごぼう", "かぼちゃ", "アボカド", "とうもろこし", "わかめ", "梅干し",
+)  # fmt: skip
+
+# 1つの料理に使う材料数の範囲
+MIN_DISH_INGREDIENTS = 2
+MAX_DISH_INGREDIENTS = 4
+# 料理の作成からいいねまでの平均時間. 単位は秒. いいねは作成直後ほど多く付く
+LIKE_DELAY_MEAN = 24 * 60 * 60
+
+
+class SeedResult(NamedTuple):
+    """投入した件数."""
+
+    users: int
+    ingredients: int
+    dishes: int
+    dish_ingredients: int
+    likes: int
+
+
+class DataSeeder:
+    """検証用データの一括投入.
+
+    いいね数は料理ごとにパレート分布 (べき分布) で決め、総数がlikesに近くなるよう比例配分する。
+    比例配分に必要な重みの合計は同じシードの乱数列を2回生成して求めるため、
+    料理数によらずメモリ使用量は一定。
+
+    Args:
+        users: ユーザー数
+        ingredients: 1ユーザーあたりの材料数 (2以上)
+        dishes: 料理の総数
+        likes: いいねの総数の目安
+        alpha: パレート分布の形状パラメータ (小さいほど一部の料理にいいねが集中する)
+        seed: 乱数シード (同じ値なら同じデータを投入する)
+        days: 料理の作成日時を分散させる日数. 料理は作成順に直近days日に並び、いいねは作成後から現在までに付く
+        username_prefix: ユーザー名の接頭辞
+        password: ユーザーのパスワード (Noneの場合はログイン不可)
+        template_set: 料理名の生成に使うテンプレートセット
+        batch_size: bulk_createの1回あたりの件数
+        chunk_size: 1トランザクションで投入する料理数 (ユーザー・材料は同じ件数のユーザーごと)
+        log: 進捗を出力する関数
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        users: int,
+        ingredients: int,
+        dishes: int,
+        likes: int,
+        alpha: float = 1.2,
+        seed: int = 0,
+        days: float = 30,
+        username_prefix: str = "seed_",
+        password: str | None = None,
+        template_set: str = DEFAULT_TEMPLATE_SET,
+        batch_size: int = 2000,
+        chunk_size: int = 20000,
+        log: Callable[[str], None] | None = None,
+    ) -> None:
+        """投入するデータの規模を設定する."""
+        if users < 2 or ingredients < MIN_DISH_INGREDIENTS:  # noqa: PLR2004
+            # 他人の料理へのいいねには2人以上、料理名の生成には2つ以上の材料が必要
+            msg = f"ユーザー数は2以上、材料数は{MIN_DISH_INGREDIENTS}以上を指定してください。"
+            raise ValueError(msg)
+        self.users = users
+        self.ingredients = ingredients
+        self.dishes = dishes
+        self.likes = likes
+        self.alpha = alpha
+        self.seed = seed
+        self.days = days
+        self.username_prefix = username_prefix
+        self.password = password
+        self.engine = get_template_set(template_set)
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.log = log or (lambda _message: None)
+        self.started = 0.0
+
+    def ingredient_name(self, index: int) -> str:
+        """index番目の材料名を返す."""
+        base = INGREDIENT_NAMES[index % len(INGREDIENT_NAMES)]
+        round_ = index // len(INGREDIENT_NAMES)
+        return f"{base}{round_ + 1}" if round_ else base
+
+    def run(self) -> SeedResult:
+        """データを投入する."""
+        rng = random.Random(self.seed)  # noqa: S311
+        self.started = time.perf_counter()
+        user_ids = self.create_users()
+        self.log(f"ユーザー {len(user_ids)}人 ({self.elapsed():.1f}秒)")
+        ingredient_ids = self.create_ingredients(user_ids)
+        self.log(f"材料 {len(ingredient_ids)}件 ({self.elapsed():.1f}秒)")
+        dish_ingredients, likes = self.create_dishes(user_ids, ingredient_ids, rng)
+
+        # 投入前の状態で作られたランキングのキャッシュを破棄する
+        leaderboard.invalidate()
+        return SeedResult(
+            users=len(user_ids),
+            ingredients=len(ingredient_ids),
+            dishes=self.dishes,
+            dish_ingredients=dish_ingredients,
+            likes=likes,
+        )
+
+    def elapsed(self) -> float:
+        """投入開始からの経過秒数."""
+        return time.perf_counter() - self.started
+
+    def create_users(self) -> array:
+        """ユーザーを作成し、IDを作成順に返す."""
+        # パスワードのハッシュ計算は重いため全員で同じ値を使う
+        password = make_password(self.password)
+        user_ids = array("q")
+        for start in range(0, self.users, self.chunk_size):
+            stop = min(start + self.chunk_size, self.users)
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [User(username=f"{self.username_prefix}{i}", password=password) for i in range(start, stop)],
+                    batch_size=self.batch_size,
+                )
+            user_ids.extend(user.pk for user in users)
+        return user_ids
+
+    def create_ingredients(self, user_ids: array) -> array:
+        """材料を作成し、IDを返す. ユーザーiのj番目の材料は i * ingredients + j 番目."""
+        ingredient_ids = array("q")
+        names = [self.ingredient_name(j) for j in range(self.ingredients)]
+        users_per_chunk = max(1, self.chunk_size // self.ingredients)
+        for start in range(0, len(user_ids), users_per_chunk):
+            with transaction.atomic():
+                ingredients = Ingredient.objects.bulk_create(
+                    [
+                        Ingredient(name=name, user_id=user_id)
+                        for user_id in user_ids[start : start + users_per_chunk]
+                        for name in names
+                    ],
+                    batch_size=self.batch_size,
+                )
+            ingredient_ids.extend(ingredient.pk for ingredient in ingredients)
+        return ingredient_ids
+
+    def insert_rows(self, model: type[models.Model], fields: Sequence[str], rows: Iterable[tuple]) -> int:
+        """行をbatch_size件ずつexecutemanyで挿入し、件数を返す.
+
+        料理・中間テーブル・いいねは件数が多く、bulk_createではモデルのインスタンス化と値の変換が
+        処理時間の大半を占めるため、モデルを経由せずに挿入する。行は生成しながら挿入するため、
+        全件を同時にメモリに保持しない。値はデータベースの型に変換済みのものを渡す。
+        """
+        opts = model._meta  # noqa: SLF001
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(quote_name(opts.get_field(field).column) for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = f"INSERT INTO {quote_name(opts.db_table)} ({columns}) VALUES ({placeholders})"  # noqa: S608
+        count = 0
+        with connection.cursor() as cursor:
+            for batch in itertools.batched(rows, self.batch_size):
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        return count
+
+    def like_weights(self) -> random.Random:
+        """料理ごとのいいね数の重み (パレート分布) を生成する乱数生成器を返す."""
+        return random.Random(f"{self.seed}:likes")  # noqa: S311
+
+    def create_dishes(self, user_ids: array, ingredient_ids: array, rng: random.Random) -> tuple[int, int]:
+        """料理・使用材料・いいねを作成し、使用材料といいねの件数を返す.
+
+        料理はcreated_at (auto_now_add) を分散させた日時で1回で挿入するため、モデルを経由せずに挿入する。
+        使用材料・いいねから参照するIDは投入前の最大値からの連番で割り当て、最後にシーケンスを合わせる。
+        投入中に他から料理を作成しないこと。
+        """
+        weights = self.like_weights()
+        # パレート分布の最小値 (1) を引き、いいね0件の料理が最も多くなるようにする
+        total_weight = sum(weights.paretovariate(self.alpha) - 1 for _ in range(self.dishes))
+        likes_per_weight = self.likes / total_weight if total_weight else 0.0
+        weights = self.like_weights()
+
+        through = GeneratedDish.ingredients.through
+        score_fields = [period.field for period in trending.TRENDING_PERIODS.values()]
+        dish_fields = [
+            "id",
+            "name",
+            "user",
+            "ingredient_names",
+            "likes_count",
+            "created_at",
+            "trending_at",
+            "info_version",
+            *score_fields,
+        ]
+        prep_names = GeneratedDish._meta.get_field("ingredient_names").get_db_prep_save  # noqa: SLF001
+        adapt = connection.ops.adapt_datetimefield_value
+        max_ingredients = min(MAX_DISH_INGREDIENTS, self.ingredients)
+        names = [self.ingredient_name(j) for j in range(self.ingredients)]
+        now = timezone.now()
+        clock = trending.timestamp(now)
+        span = timedelta(days=self.days)
+        created_dish_ingredients = 0
+        created_likes = 0
+        for start in range(0, self.dishes, self.chunk_size):
+            stop = min(start + self.chunk_size, self.dishes)
+            dishes: list[tuple] = []
+            dish_ingredients = []
+            dish_likes = []
+            for index in range(start, stop):
+                owner = rng.randrange(len(user_ids))
+                # 材料は新しい順 (Ingredientの既定の並び順) に並べる
+                chosen = sorted(
+                    rng.sample(range(self.ingredients), rng.randint(MIN_DISH_INGREDIENTS, max_ingredients)),
+                    reverse=True,
+                )
+                chosen_names = [names[j] for j in chosen]
+                # 確率的に丸めて、総数の期待値がlikesと一致するようにする
+                expected = (weights.paretovariate(self.alpha) - 1) * likes_per_weight
+                count = min(int(expected) + (rng.random() < expected % 1), len(user_ids) - 1)
+                # 自分の料理にはいいねできないため、作成者を除いたユーザーから選ぶ
+                likers = [i + (i >= owner) for i in rng.sample(range(len(user_ids) - 1), count)]
+                # 料理はIDの順に作成日時が新しくなるよう、期間を料理数で等分した区間の中に置く
+                created_at = now - span * (1 - (index + rng.random()) / self.dishes)
+                likes = [(user_ids[i], self.liked_at(created_at, now, rng)) for i in likers]
+                scores = trending.like_scores([liked_at.timestamp() for _, liked_at in likes], clock)
+                dishes.append(
+                    (
+                        self.engine.pick(chosen_names, rng),
+                        user_ids[owner],
+                        prep_names(chosen_names, connection),
+                        count,
+                        adapt(created_at),
+                        clock,
+                        0,
+                        *(scores[field] for field in score_fields),
+                    ),
+                )
+                dish_ingredients.append([ingredient_ids[owner * self.ingredients + j] for j in chosen])
+                dish_likes.append(likes)
+
+            with transaction.atomic():
+                first_id = (GeneratedDish.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+                dish_ids = range(first_id, first_id + len(dishes))
+                self.insert_rows(
+                    GeneratedDish,
+                    dish_fields,
+                    ((dish_id, *dish) for dish_id, dish in zip(dish_ids, dishes, strict=True)),
+                )
+                created_dish_ingredients += self.insert_rows(
+                    through,
+                    ["generateddish", "ingredient"],
+                    (
+                        (dish_id, ingredient_id)
+                        for dish_id, ids in zip(dish_ids, dish_ingredients, strict=True)
+                        for ingredient_id in ids
+                    ),
+                )
+                created_likes += self.insert_rows(
+                    Like,
+                    ["dish", "user", "created_at"],
+                    (
+                        (dish_id, user_id, adapt(liked_at))
+                        for dish_id, likes in zip(dish_ids, dish_likes, strict=True)
+                        for user_id, liked_at in likes
+                    ),
+                )
+                # 期間別いいね数. いいねの作成日時が属するバケットごとに数える
+                counts = Counter(
+                    (period, bucket, dish_id)
+                    for dish_id, likes in zip(dish_ids, dish_likes, strict=True)
+                    for _, liked_at in likes
+                    for period, bucket in rollups.buckets(liked_at)
+                )
+                self.insert_rows(
+                    DishLikeRollup,
+                    ["period", "bucket", "dish", "likes"],
+                    (
+                        (period, connection.ops.adapt_datefield_value(bucket), dish_id, likes)
+                        for (period, bucket, dish_id), likes in counts.items()
+                    ),
+                )
+            self.log(
+                f"料理 {stop}/{self.dishes}件, いいね {created_likes}件 ({self.elapsed():.1f}秒)",
+            )
+        # IDを指定して挿入したため、次に作成する料理のIDが重ならないようシーケンスを進める (SQLiteは不要)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [GeneratedDish]):
+                cursor.execute(sql)
+        return created_dish_ingredients, created_likes
+
+    @staticmethod
+    def liked_at(created_at: datetime, now: datetime, rng: random.Random) -> datetime:
+        """料理の作成日時から現在までの、いいねの作成日時を選ぶ.
+
+        作成からの経過時間は平均LIKE_DELAY_MEANの指数分布に従い、現在を超えた分は期間内に折り返す。
+        """
+        age = (now - created_at).total_seconds()
+        if age <= 0:
+            return now
+        return created_at + timedelta(seconds=rng.expovariate(1 / LIKE_DELAY_MEAN) % age)
@@ -0,0 +1,25 @@
+"""データベース接続のシグナルハンドラ."""
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .instrumentation import instrument_connection
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(*, connection: BaseDatabaseWrapper, **_kwargs: object) -> None:
+    """SQLiteの接続ごとにPRAGMAを設定する."""
+    if connection.vendor != "sqlite" or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def instrument_new_connection(*, connection: BaseDatabaseWrapper, **_kwargs: object) -> None:
+    """リクエストの計測が有効な場合、接続ごとにクエリ数の計測を登録する."""
+    if settings.INSTRUMENTATION_ENABLED:
+        instrument_connection(connection)
@@ -0,0 +1,16 @@
+"""静的ファイルのストレージ."""
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class HashedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """DEBUGの設定によらず、常にハッシュ付きのファイル名を返すストレージ.
+
+    ManifestStaticFilesStorageはDEBUG=Trueの場合にハッシュなしのURLを返すが、
+    事前ビルドした{% compress %}ブロックはレンダリング結果 (静的ファイルのURL) をキーに解決されるため、
+    ビルド時と配信時でURLが変わるとキーが一致しなくなる。
+    """
+
+    def url(self, name: str | None, force: bool = False) -> str:  # noqa: ARG002, FBT001, FBT002
+        """ハッシュ付きのファイル名のURLを返す."""
+        return super().url(name, force=True)
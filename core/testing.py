@@ -0,0 +1,161 @@
+"""ビューのクエリ数の上限を検証するテストの共通処理.
+
+各アプリのtests.pyでURL名ごとのクエリ数の上限 (QueryBudget) を宣言し、
+QueryBudgetMixinを継承したテストケースで未ログイン・ログインの両方について検証する。
+ページングのあるビューはページサイズを変えて計測し、表示件数によらずクエリ数が一定であることも確認する。
+"""
+
+from collections.abc import Callable
+from contextlib import nullcontext
+from importlib import import_module
+from typing import Any, ClassVar, NamedTuple
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponseBase
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dishes.models import DishLikeRollup, GeneratedDish, Like
+from ingredients.models import Ingredient
+
+# 1ユーザーあたりの料理・材料の数. ページサイズの最大値以上にする
+FIXTURE_SIZE = 25
+# ページングのあるビューで計測するページサイズ
+PAGE_SIZES = (1, 5, 20)
+TEST_PASSWORD = "test-password"  # noqa: S105
+
+
+class QueryBudget(NamedTuple):
+    """1つのURLに対するクエリ数の上限."""
+
+    # URL名. 名前空間は含めない
+    name: str
+    # 未ログイン時・ログイン時の上限
+    anonymous: int
+    authenticated: int
+    method: str = "get"
+    # 送信するデータを返す関数. テストケースを受け取る
+    data: Callable[[Any], Any] | None = None
+    # JSONで送信する場合は"application/json"
+    content_type: str | None = None
+    # 追加のリクエストヘッダー. JSONで応答させる場合は{"Accept": "application/json"}など
+    headers: dict[str, str] | None = None
+    # URL引数を返す関数. テストケースを受け取る
+    kwargs: Callable[[Any], dict[str, Any]] | None = None
+    # ページサイズを変えて計測するビュー. paginate_byを持つクラスを指定する
+    paginated_view: type | None = None
+
+
+class QueryBudgetMixin:
+    """URLconfの全URLについてクエリ数の上限を検証するテストケースのミックスイン.
+
+    継承したクラスでurlconfとbudgetsを指定する。urlconfの全URL名にbudgetsが必要。
+    各リクエストはロールバックするトランザクション内で実行し、キャッシュも毎回空にするため、
+    POSTによるデータの変更は他の計測に影響しない。
+    """
+
+    urlconf: ClassVar[str]
+    budgets: ClassVar[list[QueryBudget]]
+
+    user: User
+    other: User
+    dish: GeneratedDish
+    other_dish: GeneratedDish
+    ingredient: Ingredient
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """2人のユーザーの材料・料理と、お互いの料理へのいいねを作成."""
+        cls.user = User.objects.create_user(username="budget_user", password=TEST_PASSWORD)
+        cls.other = User.objects.create_user(username="budget_other", password=TEST_PASSWORD)
+        for user in (cls.user, cls.other):
+            ingredients = Ingredient.objects.bulk_create(
+                [Ingredient(name=f"材料{i}", user=user) for i in range(FIXTURE_SIZE)],
+            )
+            GeneratedDish.objects.bulk_create_with_ingredients(  # type: ignore[attr-defined]
+                user,
+                [f"{user.username}の料理{i}" for i in range(FIXTURE_SIZE)],
+                sorted(ingredients[:3], key=lambda ingredient: ingredient.pk, reverse=True),
+            )
+        Like.objects.bulk_create(
+            [Like(dish=dish, user=cls.user) for dish in GeneratedDish.objects.filter(user=cls.other)]
+            + [Like(dish=dish, user=cls.other) for dish in GeneratedDish.objects.filter(user=cls.user)[:10]],
+        )
+        # bulk_createではシグナルが発生しないため、いいねから集計する値をまとめて計算する
+        GeneratedDish.objects.reconcile_likes_count()  # type: ignore[attr-defined]
+        GeneratedDish.objects.rebuild_trending_scores()  # type: ignore[attr-defined]
+        DishLikeRollup.objects.rebuild()  # type: ignore[attr-defined]
+        cls.dish = GeneratedDish.objects.filter(user=cls.user).first()
+        cls.other_dish = GeneratedDish.objects.filter(user=cls.other).first()
+        cls.ingredient = Ingredient.objects.filter(user=cls.user).first()
+
+    def test_every_url_has_budget(self) -> None:
+        """URLconfの全URL名にクエリ数の上限が指定されている."""
+        names = {pattern.name for pattern in import_module(self.urlconf).urlpatterns if pattern.name}
+        missing = names - {budget.name for budget in self.budgets}
+        if missing:
+            self.fail(f"クエリ数の上限が指定されていないURLがあります: {', '.join(sorted(missing))}")  # type: ignore[attr-defined]
+
+    def test_query_budgets(self) -> None:
+        """未ログイン・ログインの両方でクエリ数が上限以内に収まる."""
+        for budget in self.budgets:
+            for login, limit in ((False, budget.anonymous), (True, budget.authenticated)):
+                with self.subTest(url=budget.name, method=budget.method, login=login):  # type: ignore[attr-defined]
+                    self.check_budget(budget, login=login, limit=limit)
+
+    def check_budget(self, budget: QueryBudget, *, login: bool, limit: int) -> None:
+        """1つのURLを計測して上限と比較する."""
+        page_sizes = PAGE_SIZES if budget.paginated_view else (None,)
+        counts = {}
+        for page_size in page_sizes:
+            queries = self.measure(budget, login=login, page_size=page_size)
+            counts[page_size] = len(queries)
+            if len(queries) > limit:
+                executed = "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(queries, start=1))
+                self.fail(  # type: ignore[attr-defined]
+                    f"{budget.method.upper()} {budget.name} (ページサイズ {page_size}) のクエリ数が"
+                    f"上限を超えました: {len(queries)} > {limit}\n{executed}",
+                )
+        if len(set(counts.values())) > 1:
+            self.fail(f"{budget.name} のクエリ数が表示件数によって変わります: {counts}")  # type: ignore[attr-defined]
+
+    def measure(self, budget: QueryBudget, *, login: bool, page_size: int | None) -> list[dict[str, Any]]:
+        """リクエストを1回実行し、実行されたクエリを返す."""
+        client = Client()
+        if login:
+            client.force_login(self.user)
+        for cache in caches.all():
+            cache.clear()
+        namespace = getattr(import_module(self.urlconf), "app_name", None)
+        url = reverse(
+            f"{namespace}:{budget.name}" if namespace else budget.name,
+            kwargs=budget.kwargs(self) if budget.kwargs else None,
+        )
+        extra: dict[str, Any] = {"content_type": budget.content_type} if budget.content_type else {}
+        if budget.headers:
+            extra["headers"] = budget.headers
+        data = budget.data(self) if budget.data else None
+
+        patch = (
+            mock.patch.object(budget.paginated_view, "paginate_by", page_size)
+            if budget.paginated_view
+            else nullcontext()
+        )
+        with patch, transaction.atomic():
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+                response = getattr(client, budget.method)(url, data, **extra)
+                consume(response)
+            transaction.set_rollback(True)
+        if response.status_code >= 500:  # noqa: PLR2004
+            self.fail(f"{budget.method.upper()} {budget.name} がエラーになりました: {response.status_code}")  # type: ignore[attr-defined]
+        return context.captured_queries
+
+
+def consume(response: HttpResponseBase) -> None:
+    """ストリーミングレスポンスを最後まで読む. 読み出し中に実行されるクエリも計測に含める."""
+    if response.streaming:
+        b"".join(response.streaming_content)  # type: ignore[attr-defined]
@@ -1,3 +1,474 @@
-from django.test import TestCase
+import json
+import math
+import random
+import re
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from typing import ClassVar
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Max
+from django.http import HttpResponseBase
+from django.test import Client, SimpleTestCase, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmark import latency_percentiles
+from core.instrumentation import count_queries, instrument_connection, instrument_templates, request_metrics
+from core.management.commands.benchmark import Command as BenchmarkCommand
+from core.seeding import DataSeeder
+from core.signals import configure_sqlite_connection
+from core.storage import HashedManifestStaticFilesStorage
+from core.testing import QueryBudget, QueryBudgetMixin
+from core.views import MAX_BATCH_COUNT, CoreView
+from dishes import rollups, trending
+from dishes.models import DishLikeRollup, GeneratedDish, Like
+from dishes.utils import DEMO_ENGINE, DishNameEngine
+
+JSON = "application/json"
+BATCH_TOKEN = "batch-token"  # noqa: S105
+METRICS_TOKEN = "metrics-token"  # noqa: S105
+
+
+@override_settings(BATCH_API_TOKEN=BATCH_TOKEN)
+class CoreQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """共通アプリの全URLのクエリ数の上限."""
+
+    urlconf = "core.urls"
+    budgets: ClassVar[list[QueryBudget]] = [
+        QueryBudget("index", 2, 5),
+        QueryBudget(
+            "demo_generate_dish_class",
+            0,
+            0,
+            method="post",
+            data=lambda _t: {"ingredients": ["卵", "ネギ"]},
+            content_type=JSON,
+        ),
+        QueryBudget(
+            "demo_generate_dish",
+            0,
+            0,
+            method="post",
+            data=lambda _t: {"ingredients": ["卵", "ネギ"]},
+            content_type=JSON,
+        ),
+        QueryBudget(
+            "batch_generate_dishes",
+            0,
+            0,
+            method="post",
+            data=lambda _t: {"ingredients": ["卵", "ネギ", "チーズ"], "count": 10, "seed": 1},
+            content_type=JSON,
+            headers={"Authorization": f"Bearer {BATCH_TOKEN}"},
+        ),
+        # 計測が有効な場合はスタッフ権限の確認でセッションとユーザーを読み込む
+        QueryBudget("metrics", 0, 2),
+    ]
+
+
+class HomePageTests(TestCase):
+    """トップページの非同期ビュー."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理4件と、最新の料理にいいねしたユーザーを作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.liker = User.objects.create_user(username="liker")
+        cls.dishes = [GeneratedDish.objects.create(name=f"料理{i}", user=owner) for i in range(4)]
+        Like.objects.create(dish=cls.dishes[-1], user=cls.liker)
+
+    def setUp(self) -> None:
+        """ランキングキャッシュを空にする."""
+        cache.clear()
+
+    def test_view_is_async(self) -> None:
+        """トップページは非同期ビューとして登録される."""
+        self.assertTrue(CoreView.view_is_async)
+
+    async def test_recent_and_top_dishes_with_liked_state(self) -> None:
+        """最新料理とトップ3を表示し、ログインユーザーのいいね状態を両方に反映する."""
+        await self.async_client.aforce_login(self.liker)
+        response = await self.async_client.get(reverse("index"))
+        liked = self.dishes[-1]
+        recent = [dish.pk for dish in reversed(self.dishes[1:])]
+        self.assertEqual([dish.pk for dish in response.context["recent_dishes"]], recent)
+        self.assertEqual(len(response.context["top_dishes"]), 3)
+        self.assertEqual(response.context["top_dishes"][0].id, liked.pk)
+        self.assertEqual(response.context["user_liked_dish_ids"], {liked.pk})
+
+
+class DemoGenerateDishTests(TestCase):
+    """デモ用の料理名生成APIの入力検証."""
+
+    url_names: ClassVar[list[str]] = ["demo_generate_dish_class", "demo_generate_dish"]
+
+    def post(self, url_name: str, body: str) -> dict:
+        """JSONの本文でPOSTし、400であることを確認してレスポンスを返す."""
+        response = self.client.post(reverse(url_name), body, content_type=JSON)
+        self.assertEqual(response.status_code, 400, f"{url_name}: {body}")
+        return response.json()
+
+    def test_generates_dish_name(self) -> None:
+        for url_name in self.url_names:
+            response = self.client.post(reverse(url_name), {"ingredients": ["卵", "ネギ"]}, content_type=JSON)
+            self.assertTrue(response.json()["dish_name"], url_name)
+
+    def test_rejects_invalid_ingredients(self) -> None:
+        bodies = [
+            "{",
+            '["卵", "ネギ"]',
+            '{"ingredients": "卵ネギ"}',
+            '{"ingredients": [["卵"], ["ネギ"]]}',
+            '{"ingredients": [{"name": "卵"}, "ネギ"]}',
+            '{"ingredients": [1, 2]}',
+            '{"ingredients": ["卵", "卵"]}',
+        ]
+        for url_name in self.url_names:
+            for body in bodies:
+                self.assertIn("error", self.post(url_name, body), f"{url_name}: {body}")
+
+    def test_empty_dish_name_is_an_error(self) -> None:
+        with mock.patch.object(DEMO_ENGINE, "pick", return_value=None):
+            for url_name in self.url_names:
+                self.assertNotIn("dish_name", self.post(url_name, '{"ingredients": ["卵", "ネギ"]}'), url_name)
+
+
+@override_settings(BATCH_API_TOKEN=BATCH_TOKEN)
+class BatchGenerateDishTests(TestCase):
+    """料理名の一括生成API."""
+
+    def setUp(self) -> None:
+        """リクエスト数の上限のカウンターを空にする."""
+        cache.clear()
+
+    def post(self, body: object, token: str = BATCH_TOKEN) -> HttpResponseBase:
+        """JSONの本文とAPIトークンでPOSTする."""
+        return self.client.post(
+            reverse("batch_generate_dishes"),
+            body,
+            content_type=JSON,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    def names(self, response: HttpResponseBase) -> list[str]:
+        """NDJSONのレスポンスの料理名."""
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()  # type: ignore[attr-defined]
+        return [json.loads(line)["dish_name"] for line in lines]
+
+    def test_streams_requested_number_of_names(self) -> None:
+        """count件の料理名を1行に1件ずつ返し、同じseedなら同じ料理名になる."""
+        body = {"ingredients": ["卵", "ネギ", "チーズ"], "count": 20, "seed": 1}
+        names = self.names(self.post(body))
+        self.assertEqual(len(names), 20)
+        self.assertEqual(len(set(names)), 20)
+        self.assertEqual(self.names(self.post(body)), names)
+
+    def test_colliding_combinations_are_deduplicated(self) -> None:
+        """異なる組み合わせが同じ文字列になっても、同じ料理名は1回だけ返す."""
+        engine = DishNameEngine(["{0}{1}", "{1}{0}", "{0}と{1}"], [])
+        with mock.patch("core.views.get_template_set", return_value=engine):
+            names = self.names(self.post({"ingredients": ["卵", "ネギ"], "count": 6}))
+        self.assertCountEqual(names, ["卵ネギ", "ネギ卵", "卵とネギ", "ネギと卵"])
+
+    def test_requires_token(self) -> None:
+        """APIトークンがない・違う場合、トークンが未設定の場合は401."""
+        body = {"ingredients": ["卵", "ネギ"]}
+        self.assertEqual(self.client.post(reverse("batch_generate_dishes"), body, content_type=JSON).status_code, 401)
+        self.assertEqual(self.post(body, token="wrong").status_code, 401)  # noqa: S106
+        with override_settings(BATCH_API_TOKEN=""):
+            self.assertEqual(self.post(body, token="").status_code, 401)
+
+    def test_rejects_invalid_parameters(self) -> None:
+        """材料・生成数・シード・テンプレートセットが不正な場合は400."""
+        bodies = [
+            "{",
+            [],
+            {"ingredients": "卵,ネギ"},
+            {"ingredients": ["卵", " 卵 "]},
+            {"ingredients": ["卵", "ネギ"], "count": 0},
+            {"ingredients": ["卵", "ネギ"], "count": MAX_BATCH_COUNT + 1},
+            {"ingredients": ["卵", "ネギ"], "count": "10"},
+            {"ingredients": ["卵", "ネギ"], "count": True},
+            {"ingredients": ["卵", "ネギ"], "seed": "1"},
+            {"ingredients": ["卵", "ネギ"], "template_set": "unknown"},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_rate_limit(self) -> None:
+        """1分あたりのリクエスト数の上限を超えると429."""
+        body = {"ingredients": ["卵", "ネギ"]}
+        with override_settings(BATCH_API_RATE_LIMIT=2):
+            statuses = [self.post(body).status_code for _ in range(3)]
+            response = self.post(body)
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response["Retry-After"], "60")
+
+
+class AssetBuildTests(SimpleTestCase):
+    """静的ファイルの事前ビルド."""
+
+    def test_requires_assets_offline(self) -> None:
+        """ASSETS_OFFLINE=offではビルドしない."""
+        with self.assertRaises(CommandError):
+            call_command("build_assets", stdout=StringIO())
+
+    @override_settings(ASSETS_OFFLINE=True)
+    def test_collects_before_compressing(self) -> None:
+        """ハッシュ付きのファイル名を参照するよう、collectstaticの後にcompressを実行する."""
+        with mock.patch("core.management.commands.build_assets.call_command") as command:
+            call_command("build_assets", "--clear", verbosity=0, stdout=StringIO())
+        self.assertEqual(
+            command.call_args_list,
+            [
+                mock.call("collectstatic", interactive=False, clear=True, verbosity=0),
+                mock.call("compress", force=True, verbosity=0),
+            ],
+        )
+
+    def test_hashed_urls_regardless_of_debug(self) -> None:
+        """DEBUG=Trueでもマニフェストのハッシュ付きのファイル名を返す."""
+        storages = [HashedManifestStaticFilesStorage(location="unused"), ManifestStaticFilesStorage(location="unused")]
+        for storage in storages:
+            storage.hashed_files = {"core/site.css": "core/site.0123abcd.css"}
+        with override_settings(DEBUG=True):
+            self.assertEqual(
+                [storage.url("core/site.css") for storage in storages],
+                ["/static/core/site.0123abcd.css", "/static/core/site.css"],
+            )
+        with override_settings(DEBUG=False):
+            self.assertEqual(storages[0].url("core/site.css"), "/static/core/site.0123abcd.css")
+
+
+class BenchmarkTests(TestCase):
+    """ベンチマークコマンドの集計と入力の検証."""
+
+    def test_latency_percentiles(self) -> None:
+        """秒単位のレイテンシからミリ秒のp50/p95/p99を求める."""
+        percentiles = latency_percentiles([i / 1000 for i in range(1, 100)])
+        self.assertEqual(
+            {key: round(value) for key, value in percentiles.items()},
+            {"p50_ms": 50, "p95_ms": 95, "p99_ms": 99},
+        )
+        self.assertEqual(latency_percentiles([0.5]), {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0})
+
+    def test_rejects_invalid_options(self) -> None:
+        """不正なデータ規模・不明なエンドポイント・読み込めない比較対象はデータベースを作らずにエラー."""
+        for args in (["--users", "1"], ["--endpoints", "index,unknown"], ["--baseline", "missing.json"]):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command("benchmark", *args, stdout=StringIO())
+
+    def test_select_endpoints(self) -> None:
+        """指定したエンドポイントだけを既定の順に計測し、省略時は全てを計測する."""
+        command = BenchmarkCommand()
+        self.assertEqual(list(command.select_endpoints(" recent, index ")), ["index", "recent"])
+        self.assertEqual(list(command.select_endpoints("")), ["index", "ranking", "recent", "generate", "toggle_like"])
+
+    def test_request_counts_queries(self) -> None:
+        """非同期ビューのクエリも含めて、1回のリクエストで実行されたクエリ数を数える."""
+        user = User.objects.create_user(username="bench")
+        endpoint = BenchmarkCommand().select_endpoints("ranking")["ranking"]
+        with CaptureQueriesContext(connection) as captured:
+            response, queries = BenchmarkCommand().request(Client(), endpoint, random.Random(0), user)  # noqa: S311
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+        self.assertEqual(queries, len(captured))
+
+    def test_compares_with_baseline(self) -> None:
+        """比較対象がある場合はp95・スループット・クエリ数の変化を表示する."""
+        stats = {
+            "throughput_rps": 150.0,
+            "p50_ms": 5.0,
+            "p95_ms": 9.0,
+            "p99_ms": 12.0,
+            "queries_avg": 4.0,
+            "queries_max": 5,
+            "errors": 0,
+        }
+        baseline = {"endpoints": {"index": {**stats, "throughput_rps": 100.0, "p95_ms": 10.0, "queries_avg": 6.0}}}
+        out = StringIO()
+        BenchmarkCommand(stdout=out).write_result(
+            {"threads": 2, "requests": 10, "endpoints": {"index": stats}},
+            baseline,
+        )
+        self.assertIn("[比較: p95 -10%, スループット +50%, クエリ -2.0]", out.getvalue())
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, METRICS_TOKEN="")
+@modify_settings(MIDDLEWARE={"prepend": "core.middleware.InstrumentationMiddleware"})
+class InstrumentationTests(TestCase):
+    """リクエストごとの計測とメトリクスエンドポイント."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """いいねできる料理と、スタッフ・一般ユーザーを作成."""
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+        cls.user = User.objects.create_user(username="cook")
+        cls.dish = GeneratedDish.objects.create(name="料理", user=cls.staff)
+
+    def setUp(self) -> None:
+        """接続とテンプレートに計測を登録し、集計を空にする."""
+        cache.clear()
+        if count_queries not in connection.execute_wrappers:
+            instrument_connection(connection)
+            self.addCleanup(connection.execute_wrappers.remove, count_queries)
+        instrument_templates()
+        patcher = mock.patch.object(request_metrics, "views", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def server_timing(self, response: HttpResponseBase) -> tuple[int, int]:
+        """Server-Timingヘッダーのクエリ数と書き込み数."""
+        match = re.search(r'desc="(\d+) queries, (\d+) writes"', response["Server-Timing"])
+        self.assertIsNotNone(match)
+        return int(match[1]), int(match[2])
+
+    def test_async_view_queries_are_counted(self) -> None:
+        """非同期ビューからsync_to_asyncで実行したクエリも、リクエストのクエリ数に含める."""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("index"))
+        self.assertEqual(self.server_timing(response), (len(captured), 0))
+        self.assertRegex(response["Server-Timing"], r"tpl;dur=\d+\.\d, view;dur=\d+\.\d$")
+        self.assertGreater(len(captured), 0)
+
+    def test_signal_writes_are_counted(self) -> None:
+        """シグナルによるいいね数の更新も、いいねしたリクエストの書き込みに含める."""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse("dishes:toggle_like", args=[self.dish.pk]))
+        writes = [query for query in captured if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertEqual(self.server_timing(response), (len(captured), len(writes)))
+        # いいねの作成とlikes_countの更新
+        self.assertGreaterEqual(len(writes), 2)
+
+    def test_metrics_are_aggregated_by_view_name(self) -> None:
+        """URL名ごとにPrometheus形式で集計する."""
+        self.client.get(reverse("index"))
+        self.client.get(reverse("index"))
+        self.client.get(reverse("dishes:ranking"))
+        self.client.force_login(self.staff)
+        metrics = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('request_queries_count{view="index"} 2', metrics)
+        self.assertIn('request_queries_count{view="dishes:ranking"} 1', metrics)
+        self.assertIn('request_duration_seconds_bucket{view="index",le="+Inf"} 2', metrics)
+
+    def test_metrics_access(self) -> None:
+        """無効時は404. トークン未設定ならスタッフのみ、設定時はBearerトークンのみ閲覧できる."""
+        url = reverse("metrics")
+        with override_settings(INSTRUMENTATION_ENABLED=False):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with override_settings(METRICS_TOKEN=METRICS_TOKEN):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, headers={"Authorization": "Bearer wrong"}).status_code, 403)
+            self.client.logout()
+            response = self.client.get(url, headers={"Authorization": f"Bearer {METRICS_TOKEN}"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite専用の設定")
+class SQLiteTuningTests(TestCase):
+    """SQLiteの接続ごとのPRAGMA."""
+
+    def pragma(self, wrapper: BaseDatabaseWrapper, name: str) -> object:
+        """PRAGMAの現在値."""
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_TUNING=True)
+    def test_pragmas_are_applied_to_new_connections(self) -> None:
+        """新しいファイルの接続にWAL・同期モード・待機時間を設定する."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            wrapper = type(connections["default"])(
+                {**connection.settings_dict, "NAME": str(Path(tmpdir) / "db.sqlite3")},
+                "tuning",
+            )
+            try:
+                values = [self.pragma(wrapper, name) for name in ("journal_mode", "synchronous", "busy_timeout")]
+            finally:
+                wrapper.close()
+        # synchronousのNORMALは数値の1として返る
+        self.assertEqual(values, ["wal", 1, 20000])
+
+    @override_settings(SQLITE_TUNING=False)
+    def test_tuning_can_be_disabled(self) -> None:
+        """SQLITE_TUNING=offの場合はPRAGMAを実行しない."""
+        wrapper = mock.Mock(vendor="sqlite")
+        configure_sqlite_connection(connection=wrapper)
+        wrapper.cursor.assert_not_called()
+
+
+class DataSeederTests(TestCase):
+    """検証用データの一括投入."""
+
+    def test_timestamps_are_spread_and_aggregates_match(self) -> None:
+        """作成日時を期間内に分散させ、いいね数・トレンドスコア・期間別いいね数をいいねと整合させる."""
+        started = timezone.now()
+        DataSeeder(users=10, ingredients=3, dishes=30, likes=120, seed=1, days=30).run()
+        finished = timezone.now()
+
+        dishes = list(GeneratedDish.objects.order_by("pk"))
+        created_ats = [dish.created_at for dish in dishes]
+        self.assertEqual(created_ats, sorted(created_ats))
+        self.assertGreaterEqual(created_ats[-1] - created_ats[0], timedelta(days=20))
+
+        liked_at: dict[int, list[float]] = {dish.pk: [] for dish in dishes}
+        created_by_pk = {dish.pk: dish.created_at for dish in dishes}
+        for dish_id, created_at in Like.objects.values_list("dish_id", "created_at"):
+            self.assertTrue(created_by_pk[dish_id] <= created_at <= finished, created_at)
+            liked_at[dish_id].append(created_at.timestamp())
+        self.assertGreaterEqual(len({at for ats in liked_at.values() for at in ats}), Like.objects.count() // 2)
+
+        for dish in dishes:
+            self.assertEqual(dish.likes_count, len(liked_at[dish.pk]))
+            expected = trending.like_scores(liked_at[dish.pk], dish.trending_at)
+            for field, score in expected.items():
+                self.assertTrue(math.isclose(getattr(dish, field), score, rel_tol=1e-9, abs_tol=1e-9), field)
+            self.assertTrue(started.timestamp() <= dish.trending_at <= finished.timestamp())
+
+        expected_rollups = Counter(
+            (period, bucket, dish_id)
+            for dish_id, created_at in Like.objects.values_list("dish_id", "created_at")
+            for period, bucket in rollups.buckets(created_at)
+        )
+        self.assertQuerySetEqual(
+            DishLikeRollup.objects.values_list("period", "bucket", "dish_id", "likes"),
+            [(*key, likes) for key, likes in expected_rollups.items()],
+            ordered=False,
+        )
+
+    def test_seeding_appends_with_fresh_ids(self) -> None:
+        """既存の料理の後に続けて投入し、投入後に作成した料理のIDとも重ならない."""
+        DataSeeder(users=3, ingredients=2, dishes=5, likes=4, seed=1, chunk_size=2).run()
+        DataSeeder(users=3, ingredients=2, dishes=5, likes=4, seed=2, username_prefix="again_").run()
+        dish = GeneratedDish.objects.create(name="新しい料理", user=User.objects.first())
+
+        self.assertEqual(GeneratedDish.objects.count(), 11)
+        self.assertEqual(dish.pk, GeneratedDish.objects.aggregate(last=Max("pk"))["last"])
+        self.assertEqual(
+            GeneratedDish.ingredients.through.objects.values("generateddish").distinct().count(),
+            10,
+        )
@@ -1,15 +1,32 @@
+import asyncio
 import json
 import random
-from typing import Any
-
-from django.db.models import QuerySet
-from django.http import HttpRequest, JsonResponse
+import time
+from collections.abc import Iterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 
-from dishes.models import GeneratedDish, Like
+from core.instrumentation import request_metrics
+from dishes.leaderboard import DishCard, leaderboard
+from dishes.like_buffer import like_buffer
+from dishes.liked import liked_dishes
+from dishes.models import GeneratedDish
+from dishes.utils import DEFAULT_TEMPLATE_SET, DishNameEngine, generate_dish_name, get_template_set
 
 MIN_INGREDIENTS = 2
+# 一括生成APIの1リクエストあたりの生成数の上限. 重複を除くため生成済みの料理名をこの件数まで保持する
+MAX_BATCH_COUNT = 10_000
+# 一括生成APIのリクエスト数を数える期間. 単位は秒
+BATCH_RATE_WINDOW = 60
 
 
 class CoreView(TemplateView):
@@ -17,76 +34,83 @@ class CoreView(TemplateView):
 
     template_name = "core/index.html"
 
-    def get_context_data(self, **kwargs: object) -> dict[str, Any]:
-        context = super().get_context_data(**kwargs)
-        # 最新料理を3つ取得
-        recent_dishes = self.get_recent_dishes(limit=3)
-        context["recent_dishes"] = recent_dishes
-
-        # トップ3ランキングを取得
-        top_dishes = self.get_top_dishes(limit=3)
-        context["top_dishes"] = top_dishes
-
-        # ユーザーのいいね情報を取得
-        all_dishes = list(recent_dishes) + list(top_dishes)
-        if self.request.user.is_authenticated:
-            liked_dish_ids = Like.objects.filter(
-                user=self.request.user,
-                dish__in=all_dishes,
-            ).values_list("dish_id", flat=True)
-            context["user_liked_dish_ids"] = list(liked_dish_ids)
-        else:
-            context["user_liked_dish_ids"] = []
-
-        return context
-
-    def get_recent_dishes(self, limit: int | None = None) -> QuerySet[GeneratedDish]:
-        """最新料理を取得するメソッド."""
-        queryset = GeneratedDish.objects.order_by("-created_at").prefetch_related(
-            "ingredients",
-            "user",
+    async def get(self, request: HttpRequest, *_args: object, **kwargs: object) -> HttpResponse:
+        """GETリクエストの処理."""
+        # テンプレート描画時に同期側で再取得しないよう、取得済みのユーザーを設定
+        request.user = await request.auser()
+        context = self.get_context_data(**kwargs)
+
+        # 最新料理3つとトップ3ランキングを並行して取得
+        recent_dishes, top_dishes = await asyncio.gather(
+            self.get_recent_dishes(limit=3),
+            self.get_top_dishes(limit=3),
         )
-        if limit:
-            return queryset[:limit]
-        return queryset
-
-    def get_top_dishes(self, limit: int | None = None) -> QuerySet[GeneratedDish]:
-        """人気料理を取得するメソッド(いいね数順)."""
-        queryset = GeneratedDish.objects.order_by(
-            "-likes_count",
-            "-created_at",
-        ).prefetch_related(
-            "ingredients",
-            "user",
+
+        # 最新料理とランキングの料理について、ユーザーのいいね状態をまとめて判定
+        liked_ids = await liked_dishes.aliked_ids(
+            request.user,
+            [dish.id for dish in recent_dishes + top_dishes],
+        )
+        # いいねの書き込みバッファが有効な場合は未反映のトグルを重ねる
+        dishes, context["user_liked_dish_ids"] = await like_buffer.aoverlay(
+            request.user,
+            recent_dishes + top_dishes,
+            liked_ids,
         )
-        if limit:
-            return queryset[:limit]
-        return queryset
+        context["recent_dishes"] = dishes[: len(recent_dishes)]
+        context["top_dishes"] = dishes[len(recent_dishes) :]
 
+        return self.render_to_response(context)
 
-def demo_generate_dish(request: HttpRequest) -> JsonResponse:
-    """デモ用の架空料理名生成API."""
-    if request.method == "POST":
-        data = json.loads(request.body)
-        ingredients = data.get("ingredients", [])
+    async def get_recent_dishes(self, limit: int = 3) -> list[GeneratedDish]:
+        """最新料理を取得するメソッド."""
+        queryset = GeneratedDish.objects.order_by("-created_at", "-id").for_listing()
+        return [dish async for dish in queryset[:limit]]
 
-        if len(ingredients) < MIN_INGREDIENTS:
-            return JsonResponse(
-                {
-                    "error": "材料を2つ以上入力してください。",
-                },
-                status=400,
-            )
+    async def get_top_dishes(self, limit: int = 3) -> list[DishCard]:
+        """人気料理を取得するメソッド(いいね数順、ランキングキャッシュから取得)."""
+        return await sync_to_async(leaderboard.top)(limit)
 
-        dish_name = generate_demo_dish_name(ingredients)
 
+def demo_dish_response(body: bytes) -> JsonResponse:
+    """デモ用APIのリクエスト本文から料理名を生成し、レスポンスを返す.
+
+    入力の誤り (不正なJSON・文字列以外の材料・材料不足・生成できない材料) は400を返す。
+    """
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "無効なJSONデータです。"}, status=400)
+    ingredients = data.get("ingredients", []) if isinstance(data, dict) else None
+    if not isinstance(ingredients, list) or not all(isinstance(name, str) for name in ingredients):
+        return JsonResponse({"error": "ingredientsは文字列のリストで指定してください。"}, status=400)
+
+    if len(set(ingredients)) < MIN_INGREDIENTS:
         return JsonResponse(
             {
-                "dish_name": dish_name,
-                "ingredients_used": ingredients,
+                "error": "材料を2つ以上入力してください。",
             },
+            status=400,
         )
 
+    try:
+        dish_name = generate_dish_name(ingredients, template_set="demo")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(
+        {
+            "dish_name": dish_name,
+            "ingredients_used": ingredients,
+        },
+    )
+
+
+def demo_generate_dish(request: HttpRequest) -> JsonResponse:
+    """デモ用の架空料理名生成API."""
+    if request.method == "POST":
+        return demo_dish_response(request.body)
+
     return JsonResponse({"error": "POSTメソッドのみ対応"}, status=405)
 
 
@@ -95,111 +119,106 @@ class DemoGenerateDishView(View):
 
     def post(self, request: HttpRequest) -> JsonResponse:
         """POSTリクエストの処理."""
-        try:
-            data = json.loads(request.body)
-            ingredients = data.get("ingredients", [])
-
-            if len(ingredients) < MIN_INGREDIENTS:
-                return JsonResponse(
-                    {
-                        "error": "材料を2つ以上入力してください。",
-                    },
-                    status=400,
-                )
-
-            dish_name = generate_demo_dish_name(ingredients)
-
-            return JsonResponse(
-                {
-                    "dish_name": dish_name,
-                    "ingredients_used": ingredients,
-                },
-            )
-        except json.JSONDecodeError:
-            return JsonResponse(
-                {
-                    "error": "無効なJSONデータです。",
-                },
-                status=400,
-            )
-        except (ValueError, KeyError):
-            return JsonResponse(
-                {
-                    "error": "サーバーエラーが発生しました。",
-                },
-                status=500,
-            )
+        return demo_dish_response(request.body)
 
     def get(self, _request: HttpRequest) -> JsonResponse:
         """GETリクエストの処理 (エラーレスポンス)."""
         return JsonResponse({"error": "POSTメソッドのみ対応"}, status=405)
 
 
-def generate_demo_dish_name(ingredients: list[str]) -> str:
-    """デモ用の料理名生成ロジック."""
-    templates = [
-        "{0}と{1}の{2}",
-        "{0}入り{1}{2}",
-        "秘伝の{0}{1}{2}",
-        "{0}風{1}の{2}",
-        "幻の{0}{1}{2}",
-        "{0}香る{1}{2}",
-        "謎の{0}{1}{2}",
-        "伝説の{0}と{1}の{2}",
-    ]
-
-    suffixes = [
-        "爆弾",
-        "スープ",
-        "炒め",
-        "煮込み",
-        "焼き",
-        "蒸し",
-        "サラダ",
-        "パスタ",
-        "カレー",
-        "丼",
-        "鍋",
-        "グラタン",
-        "フライ",
-        "天ぷら",
-        "寿司",
-        "おにぎり",
-        "闇鍋",
-        "怪物",
-        "伝説",
-        "奇跡",
-        "魔法",
-        "究極",
-        "至高",
-        "禁断",
-        "混沌",
-        "神秘",
-        "異次元",
-        "宇宙",
-    ]
-
-    selected_ingredients = random.sample(ingredients, min(len(ingredients), 3))
-
-    template = random.choice(templates)  # noqa: S311
-    suffix = random.choice(suffixes)  # noqa: S311
-
-    if len(selected_ingredients) >= MIN_INGREDIENTS:
-        if "{2}" in template:
-            dish_name = template.format(
-                selected_ingredients[0],
-                selected_ingredients[1],
-                suffix,
-            )
-        else:
-            dish_name = (
-                template.format(
-                    selected_ingredients[0],
-                    selected_ingredients[1],
-                )
-                + suffix
+def over_rate_limit(key: str, limit: int, window: int) -> bool:
+    """固定の期間ごとにリクエスト数を数え、上限を超えたか. 共有のキャッシュなら全プロセスで数える."""
+    counter = f"core:rate:{key}:{int(time.time() // window)}"
+    cache.add(counter, 0, window)
+    return cache.incr(counter) > limit
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class BatchGenerateDishView(View):
+    """料理名の一括生成API (NDJSON形式でストリーミング).
+
+    リクエスト: {"ingredients": [...], "count": 1000, "seed": 42, "template_set": "standard"}
+    レスポンス: 1行に1件 {"dish_name": "..."} を出力する。料理名は重複しない。
+    Authorization: Bearer <BATCH_API_TOKEN> で認証し、1分あたりBATCH_API_RATE_LIMIT回まで受け付ける。
+    Cookieではなくヘッダーで認証するため、スクリプトから呼べるようCSRF検証は行わない。
+    """
+
+    def post(self, request: HttpRequest) -> JsonResponse | StreamingHttpResponse:  # noqa: PLR0911
+        """POSTリクエストの処理."""
+        token = settings.BATCH_API_TOKEN
+        if not token or not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return JsonResponse({"error": "APIトークンが正しくありません。"}, status=401)
+        if over_rate_limit("batch_generate_dishes", settings.BATCH_API_RATE_LIMIT, BATCH_RATE_WINDOW):
+            response = JsonResponse(
+                {"error": "リクエストが多すぎます。しばらく待ってから再度お試しください。"},
+                status=429,
             )
-    else:
-        dish_name = f"{selected_ingredients[0]}の{suffix}"
+            response["Retry-After"] = str(BATCH_RATE_WINDOW)
+            return response
+
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "無効なJSONデータです。"}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "無効なJSONデータです。"}, status=400)
+
+        ingredients = data.get("ingredients", [])
+        count = data.get("count", 1)
+        seed = data.get("seed")
+        template_set = data.get("template_set", DEFAULT_TEMPLATE_SET)
+
+        if not isinstance(ingredients, list) or not all(isinstance(name, str) for name in ingredients):
+            return JsonResponse({"error": "ingredientsは文字列のリストで指定してください。"}, status=400)
+        ingredients = list(dict.fromkeys(name.strip() for name in ingredients if name.strip()))
+        if len(ingredients) < MIN_INGREDIENTS:
+            return JsonResponse({"error": "材料を2つ以上入力してください。"}, status=400)
+        if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_BATCH_COUNT:
+            return JsonResponse({"error": f"countは1から{MAX_BATCH_COUNT}までの整数で指定してください。"}, status=400)
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+            return JsonResponse({"error": "seedは整数で指定してください。"}, status=400)
+        try:
+            engine = get_template_set(str(template_set))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        rng = random.Random(seed)  # noqa: S311
+        response = StreamingHttpResponse(
+            self.stream(engine, ingredients, count, rng),
+            content_type="application/x-ndjson; charset=utf-8",
+        )
+        response["X-Combination-Count"] = str(engine.combination_count(len(ingredients)))
+        return response
+
+    def get(self, _request: HttpRequest) -> JsonResponse:
+        """GETリクエストの処理 (エラーレスポンス)."""
+        return JsonResponse({"error": "POSTメソッドのみ対応"}, status=405)
 
-    return dish_name
+    @staticmethod
+    def stream(engine: DishNameEngine, ingredients: list[str], count: int, rng: random.Random) -> Iterator[str]:
+        """生成した重複のない料理名を1行ずつJSONに変換する."""
+        for dish_name in engine.iter_unique_names(ingredients, count, rng):
+            yield json.dumps({"dish_name": dish_name}, ensure_ascii=False) + "\n"
+
+
+class MetricsView(View):
+    """リクエスト計測値のメトリクスビュー (Prometheus形式).
+
+    INSTRUMENTATION=onの場合のみ有効。METRICS_TOKENを設定した場合は
+    Authorization: Bearer <token> で、未設定の場合はスタッフユーザーのみ閲覧できる。
+    """
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """GETリクエストの処理."""
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise Http404
+        if settings.METRICS_TOKEN:
+            authorization = request.headers.get("Authorization", "")
+            if not constant_time_compare(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+                raise PermissionDenied
+        elif not request.user.is_staff:
+            raise PermissionDenied
+        return HttpResponse(
+            request_metrics.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
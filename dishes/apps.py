@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class DishesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dishes"
+
+    def ready(self) -> None:
+        from . import checks, signals  # noqa: F401, PLC0415
+        from .utils import register_template_set  # noqa: PLC0415
+
+        # settings.DISH_TEMPLATE_SETSで定義された独自のテンプレートセットを登録
+        for name, template_set in getattr(settings, "DISH_TEMPLATE_SETS", {}).items():
+            register_template_set(name, **template_set)
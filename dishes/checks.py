@@ -0,0 +1,92 @@
+"""キャッシュ設定のシステムチェック."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.core.checks import Warning as CheckWarning
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from django.apps import AppConfig
+    from django.core.checks import CheckMessage
+
+# プロセスごとに別の内容を持つキャッシュバックエンド. 他のプロセスでの破棄が届かない
+PROCESS_LOCAL_BACKENDS = frozenset(
+    {
+        "django.core.cache.backends.locmem.LocMemCache",
+        "django.core.cache.backends.dummy.DummyCache",
+    },
+)
+
+# 件数の上限 (MAX_ENTRIES) を超えると古い値を捨てるキャッシュバックエンド. 加算も原子的ではない
+CULLING_BACKENDS = frozenset(
+    {
+        "django.core.cache.backends.locmem.LocMemCache",
+        "django.core.cache.backends.filebased.FileBasedCache",
+    },
+)
+
+
+def cache_backend(alias: str) -> str:
+    """キャッシュの別名に設定されたバックエンドのクラス名."""
+    return settings.CACHES.get(alias, {}).get("BACKEND", "")
+
+
+@register(Tags.caches, deploy=True)
+def check_liked_dishes_cache(app_configs: Sequence[AppConfig] | None, **_kwargs: Any) -> list[CheckMessage]:  # noqa: ANN401, ARG001
+    """いいね済み料理IDの集合を、プロセスごとのキャッシュに置いていないか.
+
+    いいねしたプロセス以外では集合が破棄されないため、LIKED_DISHES_CACHE_TIMEOUTの間は古いいいね状態が表示される。
+    """
+    if cache_backend(settings.LIKED_DISHES_CACHE_ALIAS) not in PROCESS_LOCAL_BACKENDS:
+        return []
+    return [
+        CheckWarning(
+            "いいね済み料理IDの集合をプロセスごとのキャッシュに保存しています。"
+            f"複数プロセスで動かすと、他のプロセスでのいいねが最大{settings.LIKED_DISHES_CACHE_TIMEOUT}秒反映されません。",
+            hint="CACHE_BACKEND=redisなど、共有のキャッシュを使ってください。",
+            id="dishes.W001",
+        ),
+    ]
+
+
+@register(Tags.caches, deploy=True)
+def check_leaderboard_cache(app_configs: Sequence[AppConfig] | None, **_kwargs: Any) -> list[CheckMessage]:  # noqa: ANN401, ARG001
+    """いいね数ランキングを、プロセスごとのキャッシュに置いていないか.
+
+    ランキングの差分更新はいいねしたプロセスのキャッシュにしか届かないため、
+    他のプロセスはLEADERBOARD_TIMEOUTの間、それぞれ古い順位を表示する。
+    """
+    if cache_backend(settings.LEADERBOARD_CACHE_ALIAS) not in PROCESS_LOCAL_BACKENDS:
+        return []
+    return [
+        CheckWarning(
+            "いいね数ランキングをプロセスごとのキャッシュに保存しています。"
+            f"複数プロセスで動かすと、プロセスごとに最大{settings.LEADERBOARD_TIMEOUT}秒古いランキングが表示されます。",
+            hint="CACHE_BACKEND=redisなど、共有のキャッシュを使ってください。",
+            id="dishes.W002",
+        ),
+    ]
+
+
+@register(Tags.caches)
+def check_like_buffer_cache(app_configs: Sequence[AppConfig] | None, **_kwargs: Any) -> list[CheckMessage]:  # noqa: ANN401, ARG001
+    """いいねの書き込みバッファを、操作ログが失われるキャッシュで有効にしていないか.
+
+    操作ログが失われるといいねが反映されず、未反映の増減の分だけ表示するいいね数がずれる。
+    """
+    backend = cache_backend(settings.LIKE_BUFFER_CACHE_ALIAS)
+    if not settings.LIKE_BUFFER or backend not in PROCESS_LOCAL_BACKENDS | CULLING_BACKENDS:
+        return []
+    return [
+        Error(
+            f"いいねの書き込みバッファは{backend.rsplit('.', 1)[-1]}では使えません。"
+            "プロセスごとのキャッシュや古い値を捨てるキャッシュでは、未反映のいいねが失われます。",
+            hint="CACHE_BACKEND=redisなど、共有のキャッシュを使ってください。",
+            id="dishes.E001",
+        ),
+    ]
@@ -4,8 +4,13 @@ from typing import Any, ClassVar
 
 from django import forms
 
+from ingredients.cache import IngredientRef, ingredient_cache
+
 from .models import GeneratedDish
 
+# 一括保存で一度に保存できる料理の最大数
+MAX_BULK_SAVE_COUNT = 20
+
 
 class DishGenerationForm(forms.Form):
     """料理名生成フォーム(材料選択なし、ボタンのみ)."""
@@ -36,3 +41,45 @@ class SaveDishForm(forms.ModelForm):
         if commit:
             dish.save()
         return dish
+
+
+class BulkSaveDishForm(forms.Form):
+    """生成された複数の料理をまとめて保存するフォーム."""
+
+    dish_names = forms.Field(
+        widget=forms.MultipleHiddenInput,
+        error_messages={"required": "保存する料理を選択してください。"},
+    )
+    ingredient_ids = forms.Field(
+        widget=forms.MultipleHiddenInput,
+        error_messages={"required": "有効な材料が選択されていません。"},
+    )
+
+    def __init__(self, user_id: int, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401
+        """フォーム初期化時にユーザーを設定."""
+        self.user_id = user_id
+        super().__init__(*args, **kwargs)
+
+    def clean_dish_names(self) -> list[str]:
+        """料理名の空白除去・重複除去と件数・長さのチェック."""
+        names = list(dict.fromkeys(name.strip() for name in self.cleaned_data["dish_names"] if name.strip()))
+        if not names:
+            msg = "保存する料理を選択してください。"
+            raise forms.ValidationError(msg)
+        if len(names) > MAX_BULK_SAVE_COUNT:
+            msg = f"一度に保存できる料理は{MAX_BULK_SAVE_COUNT}件までです。"
+            raise forms.ValidationError(msg)
+        max_length = GeneratedDish._meta.get_field("name").max_length  # noqa: SLF001
+        if any(len(name) > max_length for name in names):  # type: ignore[operator]
+            msg = f"料理名は{max_length}文字以内で指定してください。"
+            raise forms.ValidationError(msg)
+        return names
+
+    def clean_ingredient_ids(self) -> tuple[IngredientRef, ...]:
+        """ユーザーの材料のみに絞り込む. 削除済みの材料を除くため、データベースで確認する."""
+        requested_ids = {int(pk) for pk in self.cleaned_data["ingredient_ids"] if pk.isdigit()}
+        ingredients = ingredient_cache.fetch(self.user_id, requested_ids)
+        if not ingredients:
+            msg = "有効な材料が選択されていません。"
+            raise forms.ValidationError(msg)
+        return ingredients
@@ -0,0 +1,275 @@
+"""いいね数ランキングのキャッシュ.
+
+上位N件の料理をカード (表示に必要な値のみのスナップショット) としてキャッシュに保持し、
+いいねの追加・削除に合わせて差分更新する。キャッシュが空の場合のみデータベースから再構築する。
+
+キャッシュ上の読み取り→書き込みは複数プロセス間で原子的ではないため、
+取りこぼした更新はLEADERBOARD_TIMEOUT経過後の再構築で解消される。
+"""
+
+from __future__ import annotations
+
+import bisect
+import dataclasses
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from datetime import datetime
+
+    from django.core.cache.backends.base import BaseCache
+
+    from .models import GeneratedDish
+
+# ランキングの並び順. dish_ranking_idxと一致させること
+RANKING_ORDERING = ("-likes_count", "-created_at", "-id")
+
+
+@dataclass(frozen=True, slots=True)
+class DishCard:
+    """ランキング表示用の料理スナップショット.
+
+    テンプレートからはGeneratedDishと同じ属性名で参照できる。
+    """
+
+    id: int
+    name: str
+    user_id: int
+    username: str
+    likes_count: int
+    created_at: datetime
+    ingredient_names: tuple[str, ...]
+    info_version: int = 0
+
+    @classmethod
+    def from_dish(cls, dish: GeneratedDish) -> DishCard:
+        """GeneratedDishからカードを作成する."""
+        return cls(
+            id=dish.pk,
+            name=dish.name,
+            user_id=dish.user_id,  # type: ignore[attr-defined]
+            username=dish.username,
+            likes_count=dish.likes_count,
+            created_at=dish.created_at,
+            ingredient_names=tuple(dish.ingredient_names),
+            info_version=dish.info_version,
+        )
+
+    def sort_key(self) -> tuple[int, float, int]:
+        """RANKING_ORDERINGと同じ順序になる昇順ソートキー."""
+        return (-self.likes_count, -self.created_at.timestamp(), -self.id)
+
+
+@dataclass(slots=True)
+class Board:
+    """キャッシュに保存するランキングの中身."""
+
+    entries: list[DishCard]
+    total: int
+
+    def is_complete(self, size: int) -> bool:
+        """全料理がボードに収まっているか."""
+        return len(self.entries) < size or len(self.entries) >= self.total
+
+    def index_of(self, dish_id: int) -> int | None:
+        """料理の位置を返す."""
+        for i, card in enumerate(self.entries):
+            if card.id == dish_id:
+                return i
+        return None
+
+    def insert(self, card: DishCard) -> int:
+        """並び順を保ったままカードを挿入し、その位置を返す."""
+        keys = [entry.sort_key() for entry in self.entries]
+        index = bisect.bisect_left(keys, card.sort_key())
+        self.entries.insert(index, card)
+        return index
+
+
+class Leaderboard:
+    """いいね数ランキングのキャッシュサービス."""
+
+    key = "dishes:leaderboard"
+
+    def __init__(self, alias: str | None = None, size: int | None = None, timeout: int | None = None) -> None:
+        """初期化する. 省略した値は使用時に設定から読むため、override_settingsも反映される."""
+        self._alias = alias
+        self._size = size
+        self._timeout = timeout
+
+    @property
+    def alias(self) -> str:
+        """使用するキャッシュのエイリアス."""
+        return self._alias or settings.LEADERBOARD_CACHE_ALIAS
+
+    @property
+    def size(self) -> int:
+        """キャッシュする上位の件数."""
+        return self._size or settings.LEADERBOARD_SIZE
+
+    @property
+    def timeout(self) -> int:
+        """キャッシュの有効期間. 単位は秒."""
+        return self._timeout or settings.LEADERBOARD_TIMEOUT
+
+    @property
+    def cache(self) -> BaseCache:
+        """使用するキャッシュバックエンド."""
+        return caches[self.alias]
+
+    def _load(self) -> Board | None:
+        return self.cache.get(self.key)
+
+    def _store(self, board: Board) -> None:
+        self.cache.set(self.key, board, self.timeout)
+
+    def _fetch_card(self, dish_id: int) -> DishCard | None:
+        from .models import GeneratedDish  # noqa: PLC0415
+
+        dish = GeneratedDish.objects.for_listing().filter(pk=dish_id).first()
+        return DishCard.from_dish(dish) if dish else None
+
+    def rebuild(self) -> Board:
+        """データベースからランキングを再構築する."""
+        from .models import GeneratedDish  # noqa: PLC0415
+
+        dishes = GeneratedDish.objects.order_by(*RANKING_ORDERING).for_listing()[: self.size]
+        entries = [DishCard.from_dish(dish) for dish in dishes]
+        total = len(entries) if len(entries) < self.size else GeneratedDish.objects.count()
+        board = Board(entries=entries, total=total)
+        self._store(board)
+        return board
+
+    def board(self) -> Board:
+        """ランキングを返す. キャッシュが空の場合はデータベースから再構築する."""
+        return self._load() or self.rebuild()
+
+    def top(self, limit: int) -> list[DishCard]:
+        """上位limit件を返す."""
+        if limit > self.size:
+            msg = f"limitはLEADERBOARD_SIZE ({self.size}) 以下にしてください。"
+            raise ValueError(msg)
+        return self.board().entries[:limit]
+
+    def paginate(self, page_number: Any, per_page: int) -> tuple[Paginator, Page, list[DishCard], bool] | None:  # noqa: ANN401
+        """ListView.paginate_querysetと同じ形式でページを返す.
+
+        キャッシュの範囲外のページや不正なページ番号の場合はNoneを返し、
+        呼び出し側で通常のデータベース検索に任せる。
+        """
+        board = self.board()
+        paginator = Paginator(board.entries, per_page)
+        paginator.count = board.total  # type: ignore[misc]
+        try:
+            page = paginator.page(page_number or 1)
+        except (EmptyPage, PageNotAnInteger):
+            return None
+        if page.end_index() > len(board.entries):
+            return None
+        return (paginator, page, list(page.object_list), page.has_other_pages())
+
+    def apply_likes_delta(self, dish_id: int, delta: int) -> None:
+        """いいね数の増減をランキングに反映する."""
+        board = self._load()
+        if board is None:
+            return
+
+        index = board.index_of(dish_id)
+        if index is None:
+            # ランキング外の料理はいいねが減っても圏外のまま
+            if delta <= 0:
+                return
+            card = self._fetch_card(dish_id)
+            if card is None:
+                return
+            if len(board.entries) >= self.size:
+                if card.sort_key() >= board.entries[-1].sort_key():
+                    return
+                board.entries.pop()
+            board.insert(card)
+            self._store(board)
+            return
+
+        card = board.entries.pop(index)
+        card = dataclasses.replace(card, likes_count=card.likes_count + delta)
+        new_index = board.insert(card)
+        if delta < 0 and new_index == self.size - 1 and not board.is_complete(self.size):
+            # 最下位まで下がった場合、圏外の料理に抜かれている可能性があるため作り直す
+            self.invalidate()
+            return
+        self._store(board)
+
+    def add_dish(self, dish_id: int) -> None:
+        """新しく作成された料理をランキングに反映する."""
+        board = self._load()
+        if board is None:
+            return
+        board.total += 1
+        card = self._fetch_card(dish_id)
+        if card is not None:
+            self._insert_new(board, card)
+        self._store(board)
+
+    def add_dishes(self, dishes: Sequence[GeneratedDish]) -> None:
+        """まとめて作成された料理をランキングに反映する.
+
+        作成時のインスタンスからカードを作るため、データベースには問い合わせない。
+        """
+        board = self._load()
+        if board is None:
+            return
+        board.total += len(dishes)
+        for dish in dishes:
+            self._insert_new(board, DishCard.from_dish(dish))
+        self._store(board)
+
+    def _insert_new(self, board: Board, card: DishCard) -> None:
+        """新しい料理のカードを、上位に入る場合のみ挿入する."""
+        if len(board.entries) < self.size or card.sort_key() < board.entries[-1].sort_key():
+            board.insert(card)
+            del board.entries[self.size :]
+
+    def refresh_dish(self, dish_id: int) -> None:
+        """ランキング内の料理カードを最新の内容に置き換える."""
+        board = self._load()
+        if board is None:
+            return
+        index = board.index_of(dish_id)
+        if index is None:
+            return
+        card = self._fetch_card(dish_id)
+        if card is None:
+            self.invalidate()
+            return
+        board.entries[index] = card
+        self._store(board)
+
+    def remove_dish(self, dish_id: int) -> None:
+        """削除された料理をランキングから取り除く."""
+        board = self._load()
+        if board is None:
+            return
+        complete = board.is_complete(self.size)
+        board.total -= 1
+        index = board.index_of(dish_id)
+        if index is None:
+            self._store(board)
+            return
+        if not complete:
+            # 空いた枠に入る料理が分からないため作り直す
+            self.invalidate()
+            return
+        del board.entries[index]
+        self._store(board)
+
+    def invalidate(self) -> None:
+        """キャッシュを破棄する. 次回の読み取り時に再構築される."""
+        self.cache.delete(self.key)
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,319 @@
+"""いいねの書き込みバッファ (ライトビハインド).
+
+人気の料理にいいねが集中すると、トグルのたびにLikeの行を書き込み、同じGeneratedDishの行を更新するため、
+書き込みがその行 (SQLiteではデータベース全体) のロックで直列化される。
+バッファを有効にすると、トグルはキャッシュに記録するだけですぐに応答し、
+記録したトグルを短い間隔でまとめて1つのトランザクションで反映する。
+
+キャッシュには次の値を保持する。キャッシュの加算・追加は原子的なため、共有のキャッシュなら複数プロセスで使える。
+プロセスごとのキャッシュや、件数の上限で古い値を捨てるキャッシュ (LocMemCache・FileBasedCache) では
+操作ログが失われるため、有効にするとシステムチェックのエラーになる。
+
+- 操作ログ: 連番ごとの (ユーザーID, 料理ID, トグル回数, 世代). フラッシュは反映済みの連番 (カーソル) の続きから読む
+- いいね状態: ユーザー・料理ごとのトグル回数. 奇数ならいいね済み. トグルはこの回数に原子的に1を足すため、
+  同時に押されても反転は1回ずつ数えられ、同じユーザーが何度押してもいいねは1件のまま.
+  反映時も回数が最大の状態に揃えるだけなので、同じ操作を2回反映しても結果は変わらない
+- 未反映の増減: 料理ごとのいいね数の増減. 一覧といいねの応答では、データベースのいいね数にこの値を足して表示する.
+  書き込みのたびに有効期間を延ばすため、未反映の操作ログより先に期限切れになることはない
+- 世代: いいね状態と未反映の増減のキーに含める番号. 操作ログが失われると、その分の増減は差し引かれずに残るため、
+  フラッシュが欠番を飛ばした場合は世代を進め、それまでの値を捨ててデータベースの値から数え直す
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import time
+import uuid
+from collections import Counter
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .leaderboard import leaderboard
+from .liked import liked_dishes
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+    from django.core.cache.backends.base import BaseCache
+
+# 操作ログ・いいね状態・未反映の増減の保持期間. 単位は秒. 最後の書き込みから数える
+# フラッシュが止まってもこの期間は失われない
+ENTRY_TIMEOUT = 60 * 60 * 24
+# フラッシュのロックの有効期間. 単位は秒. フラッシュ中のプロセスが落ちてもこの時間で解放される
+LOCK_TIMEOUT = 60
+# 1回のフラッシュで反映を続ける時間. 単位は秒. ロックが切れて別のプロセスと重ならないよう、LOCK_TIMEOUTより十分短くする
+FLUSH_TIME_LIMIT = LOCK_TIMEOUT / 3
+# 操作ログの欠番を書き込み途中とみなして待つ時間. 単位は秒. これを超えた欠番は飛ばす
+GAP_TIMEOUT = 30
+
+
+class LikeBuffer:
+    """いいねの書き込みバッファのサービス."""
+
+    key_prefix = "dishes:like_buffer"
+
+    def __init__(
+        self,
+        alias: str | None = None,
+        *,
+        enabled: bool | None = None,
+        batch_size: int | None = None,
+        interval: float | None = None,
+    ) -> None:
+        """初期化する. 省略した値は使用時に設定から読むため、override_settingsも反映される."""
+        self._alias = alias
+        self._enabled = enabled
+        self._batch_size = batch_size
+        self._interval = interval
+
+    @property
+    def alias(self) -> str:
+        """使用するキャッシュのエイリアス."""
+        return self._alias or settings.LIKE_BUFFER_CACHE_ALIAS
+
+    @property
+    def enabled(self) -> bool:
+        """バッファが有効か."""
+        return settings.LIKE_BUFFER if self._enabled is None else self._enabled
+
+    @property
+    def batch_size(self) -> int:
+        """1回のトランザクションで反映するトグルの件数."""
+        return self._batch_size or settings.LIKE_BUFFER_BATCH_SIZE
+
+    @property
+    def interval(self) -> float:
+        """リクエストの処理中にフラッシュする間隔. 単位は秒."""
+        return settings.LIKE_BUFFER_FLUSH_INTERVAL if self._interval is None else self._interval
+
+    @property
+    def cache(self) -> BaseCache:
+        """使用するキャッシュバックエンド."""
+        return caches[self.alias]
+
+    def key(self, *parts: object) -> str:
+        """キャッシュキー."""
+        return ":".join([self.key_prefix, *map(str, parts)])
+
+    def _add_to(self, key: str, delta: int, timeout: float | None = None, initial: int = 0) -> int:
+        """キャッシュ上の整数に原子的に加算する. キーがなければinitialから始める.
+
+        incrは有効期間を延ばさないため、timeoutを指定した場合は加算のたびに延ばす。
+        """
+        self.cache.add(key, initial, timeout)
+        value = self.cache.incr(key, delta)
+        if timeout is not None:
+            self.cache.touch(key, timeout)
+        return value
+
+    def generation(self) -> int:
+        """現在の世代."""
+        return self.cache.get(self.key("generation"), 0)
+
+    def toggle(self, user: AbstractBaseUser, dish_id: int) -> bool:
+        """いいねをトグルしてバッファに記録する.
+
+        Args:
+            user: いいねするユーザー
+            dish_id: 対象料理のID
+
+        Returns:
+            トグル後のいいね状態
+        """
+        generation = self.generation()
+        state_key = self.key("state", generation, user.pk, dish_id)
+        # トグル回数の初期値はデータベース上の状態. 同時に初期化しても、先に追加した値だけが使われる
+        initial = 0
+        if self.cache.get(state_key) is None:
+            initial = int(dish_id in liked_dishes.liked_ids(user, [dish_id]))
+        toggles = self._add_to(state_key, 1, ENTRY_TIMEOUT, initial=initial)
+        liked = toggles % 2 == 1
+
+        number = self._add_to(self.key("seq"), 1)
+        self.cache.set(self.key("op", number), (user.pk, dish_id, toggles, generation), ENTRY_TIMEOUT)
+        self._add_to(self.key("delta", generation, dish_id), 1 if liked else -1, ENTRY_TIMEOUT)
+
+        # 前回から間隔が空いていれば、このリクエストで1バッチだけ反映する. 残りは次のリクエストかflush_likesに任せる
+        if self.interval > 0 and self.cache.add(self.key("due"), value=True, timeout=self.interval):
+            self.flush(max_batches=1)
+        return liked
+
+    def pending_delta(self, dish_id: int) -> int:
+        """料理の未反映のいいね数の増減. バッファが無効の場合はキャッシュを参照せずに0."""
+        if not self.enabled:
+            return 0
+        return self.cache.get(self.key("delta", self.generation(), dish_id), 0)
+
+    def pending_count(self) -> int:
+        """未反映のトグルの件数."""
+        return max(self.cache.get(self.key("seq"), 0) - self.cache.get(self.key("cursor"), 0), 0)
+
+    def overlay(
+        self,
+        user: AbstractBaseUser | AnonymousUser,
+        dishes: Sequence[Any],
+        liked_ids: set[int],
+    ) -> tuple[list[Any], set[int]]:
+        """表示する料理に未反映のトグルを重ねる.
+
+        いいね数には未反映の増減を足し、いいね状態はバッファ上の状態で上書きする。
+        キャッシュの読み取りは世代と値の2回. バッファが無効の場合はそのまま返す。
+
+        Args:
+            user: 表示するユーザー
+            dishes: 料理またはランキングのカード
+            liked_ids: データベース上のいいね済み料理ID
+
+        Returns:
+            いいね数を補正した料理と、補正後のいいね済み料理ID
+        """
+        if not self.enabled or not dishes:
+            return list(dishes), liked_ids
+        generation = self.generation()
+        delta_keys = {self.key("delta", generation, dish.id): dish.id for dish in dishes}
+        state_keys = (
+            {self.key("state", generation, user.pk, dish.id): dish.id for dish in dishes}
+            if user.is_authenticated
+            else {}
+        )
+        found = self.cache.get_many([*delta_keys, *state_keys])
+
+        liked_ids = set(liked_ids)
+        for key, dish_id in state_keys.items():
+            if key in found:
+                (liked_ids.add if found[key] % 2 else liked_ids.discard)(dish_id)
+        deltas = {dish_id: found[key] for key, dish_id in delta_keys.items() if found.get(key)}
+        return [with_likes(dish, deltas.get(dish.id, 0)) for dish in dishes], liked_ids
+
+    async def aoverlay(
+        self,
+        user: AbstractBaseUser | AnonymousUser,
+        dishes: Sequence[Any],
+        liked_ids: set[int],
+    ) -> tuple[list[Any], set[int]]:
+        """overlayの非同期版. バッファが無効の場合はスレッドを切り替えない."""
+        if not self.enabled:
+            return list(dishes), liked_ids
+        return await sync_to_async(self.overlay)(user, dishes, liked_ids)
+
+    def flush(self, batch_size: int | None = None, max_batches: int | None = None) -> int:
+        """記録したトグルをデータベースに反映する. 他のプロセスがフラッシュ中の場合は何もしない.
+
+        ロックが切れる前に終わるよう、FLUSH_TIME_LIMITを過ぎたら残りは次回に回す。
+        失われた操作ログや未反映の増減を飛ばした場合は世代を進め、表示するいいね数をデータベースの値から数え直す。
+
+        Args:
+            batch_size: 1回のトランザクションで反映するトグルの件数. 省略時はLIKE_BUFFER_BATCH_SIZE
+            max_batches: 反映するトランザクションの最大数. リクエストの処理中は1にして応答の遅れを抑える
+
+        Returns:
+            反映したトグルの件数
+        """
+        lock_key = self.key("lock")
+        token = uuid.uuid4().hex
+        if not self.cache.add(lock_key, token, timeout=LOCK_TIMEOUT):
+            return 0
+        try:
+            deadline = time.monotonic() + FLUSH_TIME_LIMIT
+            total = lost = batches = 0
+            while time.monotonic() < deadline and (max_batches is None or batches < max_batches):
+                applied, skipped = self._flush_batch(batch_size or self.batch_size)
+                if not applied:
+                    break
+                total += applied
+                lost += skipped
+                batches += 1
+            if lost:
+                self._add_to(self.key("generation"), 1)
+            return total
+        finally:
+            # ロックが切れて他のプロセスが取り直した場合は、そのロックを消さない
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def _flush_batch(self, batch_size: int) -> tuple[int, int]:
+        """カーソルの続きからbatch_size件までのトグルを1つのトランザクションで反映する.
+
+        Returns:
+            カーソルを進めた件数と、失われていた操作ログ・未反映の増減の件数
+        """
+        from .models import Like  # noqa: PLC0415
+
+        cursor = self.cache.get(self.key("cursor"), 0)
+        numbers = range(cursor + 1, min(self.cache.get(self.key("seq"), 0), cursor + batch_size) + 1)
+        found = self.cache.get_many([self.key("op", number) for number in numbers])
+        gaps = self._gaps([number for number in numbers if self.key("op", number) not in found])
+        now = time.time()
+        ops: list[tuple[int, tuple[int, int, int, int] | None]] = []
+        for number in numbers:
+            op = found.get(self.key("op", number))
+            # 連番を取った直後の書き込み途中であれば待ち、GAP_TIMEOUTを過ぎた欠番は失われたものとして飛ばす
+            if op is None and now - gaps[number] < GAP_TIMEOUT:
+                break
+            ops.append((number, op))
+        if not ops:
+            return 0, 0
+
+        # ユーザー・料理ごとに、世代とトグル回数が最大の状態だけを反映する. 同時のトグルでは連番の順と前後する
+        present = sorted((op for _, op in ops if op), key=lambda op: (op[3], op[2]))
+        states = {(user_id, dish_id): toggles % 2 == 1 for user_id, dish_id, toggles, _ in present}
+        with transaction.atomic():
+            added = Like.objects.apply_states(states)  # type: ignore[attr-defined]
+            # 追加分はシグナルが送られないため、キャッシュ層へはここで反映する
+            for dish_id, count in Counter(like.dish_id for like in added).items():
+                transaction.on_commit(partial(leaderboard.apply_likes_delta, dish_id, count))
+            for user_id in {like.user_id for like in added}:
+                liked_dishes.invalidate(user_id)
+                transaction.on_commit(partial(liked_dishes.invalidate, user_id))
+
+        # コミット後に、記録した世代の未反映の増減から差し引き、カーソルを進める
+        deltas = Counter[tuple[int, int]]()
+        for _, dish_id, toggles, generation in present:
+            deltas[generation, dish_id] += 1 if toggles % 2 else -1
+        lost = len(ops) - len(present)
+        for (generation, dish_id), delta in deltas.items():
+            if delta:
+                lost += not self._subtract(self.key("delta", generation, dish_id), delta)
+        last = ops[-1][0]
+        self.cache.set(self.key("cursor"), last, None)
+        self.cache.set(self.key("gaps"), {number: seen for number, seen in gaps.items() if number > last}, None)
+        self.cache.delete_many([self.key("op", number) for number, _ in ops])
+        return len(ops), lost
+
+    def _subtract(self, key: str, delta: int) -> bool:
+        """未反映の増減から反映した分を差し引く. キーが失われていた場合は作り直さずにFalseを返す."""
+        try:
+            self.cache.incr(key, -delta)
+        except ValueError:
+            return False
+        self.cache.touch(key, ENTRY_TIMEOUT)
+        return True
+
+    def _gaps(self, missing: Sequence[int]) -> dict[int, float]:
+        """操作ログの欠番と、それを最初に見つけた時刻. 新しい欠番は現在時刻で記録する."""
+        gaps: dict[int, float] = self.cache.get(self.key("gaps")) or {}
+        if missing:
+            now = time.time()
+            for number in missing:
+                gaps.setdefault(number, now)
+            self.cache.set(self.key("gaps"), gaps, None)
+        return gaps
+
+
+def with_likes(dish: Any, delta: int) -> Any:  # noqa: ANN401
+    """いいね数に増減を足した料理を返す. ランキングのカードは不変のため複製する."""
+    if not delta:
+        return dish
+    if dataclasses.is_dataclass(dish):
+        return dataclasses.replace(dish, likes_count=dish.likes_count + delta)  # type: ignore[type-var]
+    dish.likes_count += delta
+    return dish
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,101 @@
+"""ユーザーがいいねした料理IDの集合のキャッシュ.
+
+トップページ・ランキング・最新の料理では、表示中の料理それぞれについてログインユーザーのいいね状態が必要になる。
+ユーザーがいいねした料理IDの集合をキャッシュし、表示中の料理IDとの積集合で求めるため、
+キャッシュがあればデータベースに問い合わせない。キャッシュが空の場合は集合を1回のクエリで作成する。
+
+いいねの多いユーザーは集合が大きくなるため、LIKED_DISHES_MAX_SIZE件を超える場合は集合の代わりに目印をキャッシュし、
+表示中の料理IDを指定したIN句のクエリ (1回) で求める。
+いいねの追加・削除時にシグナルで破棄される。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+    from django.core.cache.backends.base import BaseCache
+
+# いいねが多すぎて集合をキャッシュしないユーザーの目印
+TOO_MANY = "too_many"
+
+
+class LikedDishCache:
+    """ユーザーがいいねした料理IDの集合のキャッシュサービス."""
+
+    key_prefix = "dishes:liked"
+
+    def __init__(self, alias: str | None = None, timeout: int | None = None, max_size: int | None = None) -> None:
+        """初期化する. 省略した値は使用時に設定から読むため、override_settingsも反映される."""
+        self._alias = alias
+        self._timeout = timeout
+        self._max_size = max_size
+
+    @property
+    def alias(self) -> str:
+        """使用するキャッシュのエイリアス."""
+        return self._alias or settings.LIKED_DISHES_CACHE_ALIAS
+
+    @property
+    def timeout(self) -> int:
+        """キャッシュの有効期間. 単位は秒."""
+        return self._timeout or settings.LIKED_DISHES_CACHE_TIMEOUT
+
+    @property
+    def max_size(self) -> int:
+        """集合をキャッシュするいいね数の上限."""
+        return self._max_size or settings.LIKED_DISHES_MAX_SIZE
+
+    @property
+    def cache(self) -> BaseCache:
+        """使用するキャッシュバックエンド."""
+        return caches[self.alias]
+
+    def key(self, user_id: int) -> str:
+        """ユーザーのキャッシュキー."""
+        return f"{self.key_prefix}:{user_id}"
+
+    def liked_ids(self, user: AbstractBaseUser | AnonymousUser, dish_ids: Iterable[int]) -> set[int]:
+        """dish_idsのうちユーザーがいいねした料理のIDを返す. 未ログインの場合は空集合."""
+        dish_ids = set(dish_ids)
+        if not dish_ids or not user.is_authenticated:
+            return set()
+        liked = self.cache.get(self.key(user.pk))
+        if liked is None:
+            liked = self.rebuild(user.pk)
+        if liked == TOO_MANY:
+            from .models import Like  # noqa: PLC0415
+
+            return set(
+                Like.objects.filter(user_id=user.pk, dish_id__in=dish_ids).order_by().values_list("dish_id", flat=True),
+            )
+        return dish_ids & liked
+
+    async def aliked_ids(self, user: AbstractBaseUser | AnonymousUser, dish_ids: Iterable[int]) -> set[int]:
+        """liked_idsの非同期版."""
+        return await sync_to_async(self.liked_ids)(user, dish_ids)
+
+    def rebuild(self, user_id: int) -> frozenset[int] | str:
+        """データベースからユーザーがいいねした料理IDの集合を作成してキャッシュする."""
+        from .models import Like  # noqa: PLC0415
+
+        dish_ids = list(
+            Like.objects.filter(user_id=user_id).order_by().values_list("dish_id", flat=True)[: self.max_size + 1],
+        )
+        liked = TOO_MANY if len(dish_ids) > self.max_size else frozenset(dish_ids)
+        self.cache.set(self.key(user_id), liked, self.timeout)
+        return liked
+
+    def invalidate(self, user_id: int) -> None:
+        """ユーザーのキャッシュを破棄する. 次回の読み取り時に再作成される."""
+        self.cache.delete(self.key(user_id))
+
+
+liked_dishes = LikedDishCache()
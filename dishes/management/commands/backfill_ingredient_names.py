@@ -0,0 +1,38 @@
+"""ingredient_namesの再計算コマンド."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from dishes.leaderboard import leaderboard
+from dishes.models import GeneratedDish
+
+
+class Command(BaseCommand):
+    """中間テーブルから全料理のingredient_namesを再計算する."""
+
+    help = "料理の材料 (中間テーブル) に合わせてGeneratedDish.ingredient_namesを一括修正します。"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--batch-size", type=int, default=1000, help="1回に処理する料理の件数")
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        batch_size = options["batch_size"]
+        fixed = 0
+        last_pk = 0
+        while True:
+            # 主キー順に区切って処理し、一度に読み込む行数を抑える
+            pks = list(
+                GeneratedDish.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size],
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                fixed += GeneratedDish.objects.filter(pk__in=pks).refresh_ingredient_names()
+            last_pk = pks[-1]
+        if fixed:
+            leaderboard.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"{fixed}件の料理の材料名を修正しました。"))
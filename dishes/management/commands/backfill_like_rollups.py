@@ -0,0 +1,22 @@
+"""期間別いいね数の再構築コマンド."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from dishes.models import DishLikeRollup
+
+
+class Command(BaseCommand):
+    """Likeテーブルから期間別いいね数 (日・週・月) を作り直す."""
+
+    help = "Likeテーブルの作成日時から期間別いいね数 (DishLikeRollup) を作り直します。"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--batch-size", type=int, default=10000, help="1回に読み込むいいねの件数")
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        total = DishLikeRollup.objects.rebuild(batch_size=options["batch_size"])  # type: ignore[attr-defined]
+        self.stdout.write(self.style.SUCCESS(f"{total}件のいいねから期間別いいね数を作り直しました。"))
@@ -0,0 +1,119 @@
+"""料理名生成のマイクロベンチマーク."""
+
+import random
+import timeit
+from collections.abc import Callable
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from dishes.utils import (
+    DEMO_DISH_NAME_TEMPLATES,
+    DEMO_DISH_TYPES,
+    DISH_NAME_TEMPLATES,
+    DISH_TYPE_PROBABILITY,
+    DISH_TYPES,
+    generate_dish_name,
+    generate_multiple_dish_names,
+)
+
+LEGACY_MAX_ATTEMPTS_MULTIPLIER = 10
+
+
+def legacy_generate_dish_name(ingredient_names: list[str]) -> str:
+    """旧実装: 呼び出しごとにテンプレートを走査して1件生成する."""
+    num_ingredients = min(random.randint(2, 4), len(ingredient_names))  # noqa: S311
+    selected = random.sample(ingredient_names, num_ingredients)
+    template = random.choice(DISH_NAME_TEMPLATES)  # noqa: S311
+    if "{2}" in template:
+        return template.format(selected[0], selected[1], random.choice(DISH_TYPES))  # noqa: S311
+    if "{1}" in template:
+        if random.random() < DISH_TYPE_PROBABILITY:  # noqa: S311
+            return template.format(selected[0], random.choice(DISH_TYPES))  # noqa: S311
+        return template.format(selected[0], selected[1])
+    return template.format(selected[0])
+
+
+def legacy_generate_multiple_dish_names(ingredient_names: list[str], count: int) -> list[str]:
+    """旧実装: 重複しなくなるまで1件ずつ再試行する."""
+    generated_names: set[str] = set()
+    attempts = 0
+    while len(generated_names) < count and attempts < count * LEGACY_MAX_ATTEMPTS_MULTIPLIER:
+        generated_names.add(legacy_generate_dish_name(ingredient_names))
+        attempts += 1
+    return list(generated_names)
+
+
+def legacy_generate_demo_dish_name(ingredients: list[str]) -> str:
+    """旧実装: 呼び出しごとにテンプレートと接尾語のリストを作り直す."""
+    templates = list(DEMO_DISH_NAME_TEMPLATES)
+    suffixes = list(DEMO_DISH_TYPES)
+    selected = random.sample(ingredients, min(len(ingredients), 3))
+    template = random.choice(templates)  # noqa: S311
+    suffix = random.choice(suffixes)  # noqa: S311
+    return template.format(selected[0], selected[1], suffix)
+
+
+class Command(BaseCommand):
+    """旧実装と生成エンジンの1件あたりの生成コストを比較する."""
+
+    help = "料理名生成の旧実装とテンプレートエンジンの1件あたりの生成時間を比較します。"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--ingredients", type=int, default=5, help="材料の数")
+        parser.add_argument("--count", type=int, default=1000, help="一括生成で要求する件数")
+        parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (最良値を採用)")
+        parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        random.seed(options["seed"])
+        names = [f"材料{i}" for i in range(options["ingredients"])]
+        count = options["count"]
+        repeat = options["repeat"]
+
+        self.stdout.write(f"材料数: {len(names)}, 一括生成件数: {count}\n")
+        self._compare(
+            "単発生成 (standard)",
+            lambda: legacy_generate_dish_name(names),
+            lambda: generate_dish_name(names),
+            1,
+            repeat,
+        )
+        self._compare(
+            "単発生成 (demo)",
+            lambda: legacy_generate_demo_dish_name(names),
+            lambda: generate_dish_name(names, template_set="demo"),
+            1,
+            repeat,
+        )
+        self._compare(
+            "一括生成 (standard)",
+            lambda: legacy_generate_multiple_dish_names(names, count),
+            lambda: generate_multiple_dish_names(names, count),
+            count,
+            repeat,
+        )
+
+    def _compare(
+        self,
+        label: str,
+        before: Callable[[], Any],
+        after: Callable[[], Any],
+        count: int,
+        repeat: int,
+    ) -> None:
+        """旧実装と新実装の1件あたりの時間と生成件数を表示する."""
+        number = max(1, 2000 // count)
+        results = []
+        for func in (before, after):
+            seconds = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+            produced = len(func()) if count > 1 else 1
+            results.append((seconds / max(produced, 1), produced))
+
+        (before_per_name, before_count), (after_per_name, after_count) = results
+        self.stdout.write(
+            f"{label}: 旧 {before_per_name * 1e6:.2f}µs/件 ({before_count}件) → "
+            f"新 {after_per_name * 1e6:.2f}µs/件 ({after_count}件)",
+        )
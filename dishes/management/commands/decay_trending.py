@@ -0,0 +1,34 @@
+"""トレンドスコアの減衰コマンド."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from dishes.models import GeneratedDish
+
+
+class Command(BaseCommand):
+    """全料理のトレンドスコアを現在時刻まで一括で減衰させる.
+
+    いいねのない料理のスコアは更新されず古い時刻の値のまま並ぶため、
+    cronなどで定期的 (急上昇ランキングの時定数より十分短い間隔, 例: 10分ごと) に実行する。
+    """
+
+    help = "全料理のトレンドスコア (急上昇・デイリー・ウィークリー) を現在時刻まで減衰させます。"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="減衰ではなくLikeテーブルからスコアを再計算します (データの一括投入後など)",
+        )
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        if options["rebuild"]:
+            rebuilt = GeneratedDish.objects.rebuild_trending_scores()  # type: ignore[attr-defined]
+            self.stdout.write(self.style.SUCCESS(f"{rebuilt}件の料理のトレンドスコアを再計算しました。"))
+            return
+        decayed = GeneratedDish.objects.decay_trending_scores()  # type: ignore[attr-defined]
+        self.stdout.write(self.style.SUCCESS(f"{decayed}件の料理のトレンドスコアを減衰させました。"))
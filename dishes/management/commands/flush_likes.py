@@ -0,0 +1,43 @@
+"""いいねの書き込みバッファのフラッシュコマンド."""
+
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from dishes.like_buffer import like_buffer
+
+
+class Command(BaseCommand):
+    """書き込みバッファに記録されたいいねのトグルをデータベースに反映する.
+
+    --intervalを指定すると、その間隔で反映し続ける常駐プロセスとして動く。
+    リクエストの処理中はLIKE_BUFFER_FLUSH_INTERVALごとに1バッチだけ反映されるため、
+    このコマンドはそれを超えるトグルの反映や、アクセスが途絶えた後の反映、リクエスト側での反映を無効にした場合に使う。
+    """
+
+    help = "いいねの書き込みバッファ (LIKE_BUFFER=on) に記録されたトグルをまとめてデータベースに反映します。"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """引数の定義."""
+        parser.add_argument("--batch-size", type=int, default=None, help="1回のトランザクションで反映する件数")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="指定した秒数ごとに反映し続けます (省略時は1回だけ反映して終了)",
+        )
+
+    def handle(self, *_args: Any, **options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        while True:
+            flushed = like_buffer.flush(batch_size=options["batch_size"])
+            if flushed or not options["interval"]:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{flushed}件のトグルを反映しました (未反映: {like_buffer.pending_count()}件)。",
+                    ),
+                )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,23 @@
+"""likes_countの再集計コマンド."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dishes.leaderboard import leaderboard
+from dishes.models import GeneratedDish
+
+
+class Command(BaseCommand):
+    """Likeテーブルから全料理のlikes_countを一括で再計算する."""
+
+    help = "Likeテーブルの実数に合わせてGeneratedDish.likes_countを一括修正します。"
+
+    def handle(self, *_args: Any, **_options: Any) -> None:  # noqa: ANN401
+        """コマンドの実行."""
+        with transaction.atomic():
+            fixed = GeneratedDish.objects.reconcile_likes_count()
+        if fixed:
+            leaderboard.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"{fixed}件の料理のいいね数を修正しました。"))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0001_initial'),
+        ('ingredients', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generateddish',
+            index=models.Index(fields=['-likes_count', '-created_at', '-id'], name='dish_ranking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generateddish',
+            index=models.Index(fields=['-created_at', '-id'], name='dish_recent_idx'),
+        ),
+    ]
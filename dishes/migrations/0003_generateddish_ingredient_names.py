@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:26
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_ingredient_names(apps, schema_editor):
+    GeneratedDish = apps.get_model('dishes', 'GeneratedDish')
+    Through = GeneratedDish.ingredients.through
+    names = defaultdict(list)
+    rows = Through.objects.order_by('-ingredient__created_at').values_list('generateddish_id', 'ingredient__name')
+    for dish_id, name in rows.iterator():
+        names[dish_id].append(name)
+    dishes = [GeneratedDish(pk=dish_id, ingredient_names=dish_names) for dish_id, dish_names in names.items()]
+    GeneratedDish.objects.bulk_update(dishes, ['ingredient_names'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0002_generateddish_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateddish',
+            name='ingredient_names',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='使用材料名のスナップショット (一覧表示用)', verbose_name='材料名'),
+        ),
+        migrations.RunPython(backfill_ingredient_names, migrations.RunPython.noop),
+    ]
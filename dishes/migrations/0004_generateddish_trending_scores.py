@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:49
+
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# 作成時点の時定数 (秒)
+TIME_CONSTANTS = {'hot_score': 3 * 60 * 60, 'daily_score': 24 * 60 * 60, 'weekly_score': 7 * 24 * 60 * 60}
+MIN_SCORE = 1e-3
+
+
+def backfill_trending_scores(apps, schema_editor):
+    GeneratedDish = apps.get_model('dishes', 'GeneratedDish')
+    Like = apps.get_model('dishes', 'Like')
+    now = timezone.now()
+    clock = now.timestamp()
+    horizon = timedelta(seconds=max(TIME_CONSTANTS.values()) * math.log(1 / MIN_SCORE))
+    liked_at = defaultdict(list)
+    for dish_id, created_at in Like.objects.filter(created_at__gte=now - horizon).values_list('dish_id', 'created_at').iterator():
+        liked_at[dish_id].append(created_at.timestamp())
+    dishes = []
+    for dish_id, times in liked_at.items():
+        scores = {}
+        for field, time_constant in TIME_CONSTANTS.items():
+            score = sum(math.exp(min(at - clock, 0) / time_constant) for at in times)
+            scores[field] = score if score >= MIN_SCORE else 0.0
+        dishes.append(GeneratedDish(pk=dish_id, trending_at=clock, **scores))
+    GeneratedDish.objects.bulk_update(dishes, [*TIME_CONSTANTS, 'trending_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0003_generateddish_ingredient_names'),
+        ('ingredients', '0002_ingredient_name_ci_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateddish',
+            name='daily_score',
+            field=models.FloatField(default=0.0, editable=False, help_text='時定数1日で減衰するいいねの重みの合計', verbose_name='デイリースコア'),
+        ),
+        migrations.AddField(
+            model_name='generateddish',
+            name='hot_score',
+            field=models.FloatField(default=0.0, editable=False, help_text='時定数3時間で減衰するいいねの重みの合計', verbose_name='急上昇スコア'),
+        ),
+        migrations.AddField(
+            model_name='generateddish',
+            name='trending_at',
+            field=models.FloatField(default=0.0, editable=False, help_text='トレンドスコアが表す時点のUNIX時刻', verbose_name='スコア基準時刻'),
+        ),
+        migrations.AddField(
+            model_name='generateddish',
+            name='weekly_score',
+            field=models.FloatField(default=0.0, editable=False, help_text='時定数1週間で減衰するいいねの重みの合計', verbose_name='ウィークリースコア'),
+        ),
+        migrations.AddIndex(
+            model_name='generateddish',
+            index=models.Index(fields=['-hot_score', '-created_at', '-id'], name='dish_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generateddish',
+            index=models.Index(fields=['-daily_score', '-created_at', '-id'], name='dish_daily_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generateddish',
+            index=models.Index(fields=['-weekly_score', '-created_at', '-id'], name='dish_weekly_idx'),
+        ),
+        migrations.RunPython(backfill_trending_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:55
+
+from collections import Counter
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_like_rollups(apps, schema_editor):
+    Like = apps.get_model('dishes', 'Like')
+    DishLikeRollup = apps.get_model('dishes', 'DishLikeRollup')
+    counts = Counter()
+    for dish_id, created_at in Like.objects.values_list('dish_id', 'created_at').iterator():
+        day = timezone.localdate(created_at)
+        counts['day', day, dish_id] += 1
+        counts['week', day - timedelta(days=day.weekday()), dish_id] += 1
+        counts['month', day.replace(day=1), dish_id] += 1
+    DishLikeRollup.objects.bulk_create(
+        [
+            DishLikeRollup(period=period, bucket=bucket, dish_id=dish_id, likes=likes)
+            for (period, bucket, dish_id), likes in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0004_generateddish_trending_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishLikeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', '今日'), ('week', '今週'), ('month', '今月')], max_length=10, verbose_name='期間')),
+                ('bucket', models.DateField(help_text='集計期間の初日', verbose_name='バケット')),
+                ('likes', models.IntegerField(default=0, help_text='集計期間内に付けられたいいねの数', verbose_name='いいね数')),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_rollups', to='dishes.generateddish', verbose_name='対象料理')),
+            ],
+            options={
+                'verbose_name': '期間別いいね数',
+                'verbose_name_plural': '期間別いいね数',
+                'indexes': [models.Index(fields=['period', 'bucket', '-likes', '-dish'], name='dish_rollup_ranking_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'dish'), name='dish_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_like_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0005_dishlikerollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateddish',
+            name='info_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='ingredient_namesの同期で加算される、フラグメントキャッシュのキー', verbose_name='表示内容のバージョン'),
+        ),
+    ]
@@ -1,12 +1,213 @@
-from typing import ClassVar
+import itertools
+from collections import Counter, defaultdict
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import TYPE_CHECKING, ClassVar
 
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_delete, post_save
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
 from ingredients.models import Ingredient
 
+from . import rollups, trending
+
+if TYPE_CHECKING:
+    from ingredients.cache import IngredientRef
+
+# 一覧のカード表示に必要な列
+LISTING_FIELDS = (
+    "id",
+    "name",
+    "likes_count",
+    "created_at",
+    "ingredient_names",
+    "info_version",
+    "user_id",
+    "user__username",
+)
+# 期間別ランキングの並び順. dish_rollup_ranking_idxと一致させること
+ROLLUP_RANKING_ORDERING = ("-likes", "-dish_id")
+# 期間別いいね数を1文で加算する行数
+ROLLUP_BATCH_SIZE = 500
+# いいねをまとめて反映する際に1文でINSERTする行数
+LIKE_BATCH_SIZE = 500
+
+
+class GeneratedDishQuerySet(models.QuerySet["GeneratedDish"]):
+    """生成料理のクエリセット."""
+
+    def for_listing(self, *fields: str) -> "GeneratedDishQuerySet":
+        """一覧表示用に必要な列だけを取得する.
+
+        作成ユーザー名はJOINで同じクエリから取得し、材料名は非正規化した列を使うため
+        中間テーブルは参照しない。ページ全体で1回のクエリで済む。
+
+        Args:
+            fields: 追加で取得する列 (キーセット方式のカーソルに使う並び替えキーなど)
+        """
+        return self.select_related("user").only(*LISTING_FIELDS, *fields)
+
+    def refresh_ingredient_names(self) -> int:
+        """ingredient_namesを中間テーブルの内容で再計算する.
+
+        変更があった料理のみをbulk_updateで更新するため、post_saveシグナルは発生しない。
+        更新した料理はinfo_versionを加算し、カードのフラグメントキャッシュを作り直させる。
+
+        Returns:
+            更新された行数
+        """
+        through = self.model.ingredients.through
+        names: defaultdict[int, list[str]] = defaultdict(list)
+        rows = (
+            through.objects.filter(generateddish__in=self.values("pk"))
+            # Ingredientの既定の並び順 (新しい順) に合わせる
+            .order_by("-ingredient__created_at", "-ingredient__id")
+            .values_list("generateddish_id", "ingredient__name")
+        )
+        for dish_id, name in rows:
+            names[dish_id].append(name)
+
+        changed = []
+        for dish in self.order_by().only("pk", "ingredient_names", "info_version"):
+            if dish.ingredient_names != names[dish.pk]:
+                dish.ingredient_names = names[dish.pk]
+                dish.info_version += 1
+                changed.append(dish)
+        return self.model.objects.bulk_update(changed, ["ingredient_names", "info_version"])
+
+    def bulk_create_with_ingredients(
+        self,
+        user: User,
+        names: Sequence[str],
+        ingredients: Sequence["IngredientRef"],
+    ) -> list["GeneratedDish"]:
+        """同じ材料を使う複数の料理をまとめて作成する.
+
+        料理と中間テーブルの行をそれぞれ1回のbulk_createで作成するため、
+        件数によらずクエリ数は一定になる。bulk_createではシグナルが発生しないため、
+        ingredient_namesは作成時に設定し、ランキングへの反映もここで行う。
+
+        Args:
+            user: 作成ユーザー
+            names: 料理名のリスト
+            ingredients: 使用材料 (IDと名前)
+
+        Returns:
+            作成された料理のリスト
+        """
+        from .leaderboard import leaderboard  # noqa: PLC0415
+
+        ingredient_names = [ingredient.name for ingredient in ingredients]
+        through = self.model.ingredients.through
+        with transaction.atomic(using=self.db):
+            dishes = self.bulk_create(
+                [self.model(name=name, user=user, ingredient_names=ingredient_names) for name in names],
+            )
+            through.objects.using(self.db).bulk_create(
+                [
+                    through(generateddish_id=dish.pk, ingredient_id=ingredient.id)
+                    for dish in dishes
+                    for ingredient in ingredients
+                ],
+            )
+            transaction.on_commit(partial(leaderboard.add_dishes, dishes), using=self.db)
+        return dishes
+
+    def adjust_likes_count(self, dish_id: int, delta: int, liked_at: datetime | None = None) -> int:
+        """likes_countとトレンドスコアをデータベース側で原子的に増減する.
+
+        読み取り→保存ではなく単一のUPDATE文で加算するため、
+        同時にいいねされても更新が失われない。
+
+        Args:
+            dish_id: 対象料理のID
+            delta: 増減値 (追加時は1、削除時は-1)
+            liked_at: いいねの作成時刻. 省略時は現在時刻
+
+        Returns:
+            更新された行数
+        """
+        now = trending.timestamp()
+        return self.filter(pk=dish_id).update(
+            likes_count=F("likes_count") + delta,
+            **trending.like_updates(delta, trending.timestamp(liked_at) if liked_at else now, now),
+        )
+
+    def decay_trending_scores(self, now: datetime | None = None) -> int:
+        """トレンドスコアが残っている全行を同じ時刻まで減衰させる.
+
+        単一のUPDATE文で行うため、並行するいいねの更新とは行ロックで順序付けられ、どちらも失われない。
+
+        Args:
+            now: 減衰させる時刻. 省略時は現在時刻
+
+        Returns:
+            更新された行数
+        """
+        longest = trending.LONGEST_PERIOD.field
+        return self.filter(**{f"{longest}__gt": 0}).update(**trending.decay_updates(trending.timestamp(now)))
+
+    def rebuild_trending_scores(self, now: datetime | None = None) -> int:
+        """トレンドスコアをLikeテーブルから再計算する.
+
+        重みがMIN_SCORE以上残る期間のいいねだけを読み、スコアが残っている行を0に戻してから
+        いいねのある料理のみをbulk_updateで更新する。
+
+        Args:
+            now: 計算する時刻. 省略時は現在時刻
+
+        Returns:
+            スコアが設定された料理の数
+        """
+        now = now or timezone.now()
+        clock = trending.timestamp(now)
+        liked_at: defaultdict[int, list[float]] = defaultdict(list)
+        likes = Like.objects.filter(
+            dish__in=self.values("pk"),
+            created_at__gte=now - timedelta(seconds=trending.LONGEST_PERIOD.horizon),
+        ).values_list("dish_id", "created_at")
+        for dish_id, created_at in likes.iterator(chunk_size=10000):
+            liked_at[dish_id].append(created_at.timestamp())
+
+        fields = [period.field for period in trending.TRENDING_PERIODS.values()]
+        with transaction.atomic(using=self.db):
+            self.filter(**{f"{trending.LONGEST_PERIOD.field}__gt": 0}).update(
+                **dict.fromkeys(fields, 0.0),
+                **{trending.CLOCK_FIELD: clock},
+            )
+            dishes = [
+                self.model(pk=dish_id, **trending.like_scores(times, clock), **{trending.CLOCK_FIELD: clock})
+                for dish_id, times in liked_at.items()
+            ]
+            self.model.objects.using(self.db).bulk_update(dishes, [*fields, trending.CLOCK_FIELD], batch_size=1000)
+        return len(dishes)
+
+    def reconcile_likes_count(self) -> int:
+        """likes_countをLikeテーブルの実数で一括再計算する.
+
+        集計サブクエリを使った単一のUPDATE文で、ずれている行のみを更新する。
+
+        Returns:
+            修正された行数
+        """
+        actual = Coalesce(
+            Subquery(
+                Like.objects.filter(dish=OuterRef("pk"))
+                .order_by()
+                .values("dish")
+                .annotate(count=Count("pk"))
+                .values("count"),
+            ),
+            Value(0),
+        )
+        return self.exclude(likes_count=actual).update(likes_count=actual)
+
 
 class GeneratedDish(models.Model):
     """生成された架空料理モデル."""
@@ -37,15 +238,172 @@ class GeneratedDish(models.Model):
         auto_now_add=True,
         verbose_name="作成日時",
     )
+    # 一覧表示用に非正規化した材料名. ingredientsの変更時にシグナルで同期する
+    ingredient_names = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name="材料名",
+        help_text="使用材料名のスナップショット (一覧表示用)",
+    )
+    # カードの表示内容 (料理名・作成者・材料名) のバージョン. ingredient_namesの同期時に加算し、
+    # フラグメントキャッシュのキーに使う
+    info_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="表示内容のバージョン",
+        help_text="ingredient_namesの同期で加算される、フラグメントキャッシュのキー",
+    )
+
+    # 時間減衰するトレンドスコア. いいねの追加・削除時に差分更新し、decay_trendingコマンドで定期的に減衰させる
+    hot_score = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name="急上昇スコア",
+        help_text="時定数3時間で減衰するいいねの重みの合計",
+    )
+    daily_score = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name="デイリースコア",
+        help_text="時定数1日で減衰するいいねの重みの合計",
+    )
+    weekly_score = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name="ウィークリースコア",
+        help_text="時定数1週間で減衰するいいねの重みの合計",
+    )
+    trending_at = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name="スコア基準時刻",
+        help_text="トレンドスコアが表す時点のUNIX時刻",
+    )
+
+    objects = GeneratedDishQuerySet.as_manager()
 
     class Meta:
         verbose_name = "生成料理"
         verbose_name_plural = "生成料理"
         ordering: ClassVar[list[str]] = ["-created_at"]
+        indexes: ClassVar[list[models.Index]] = [
+            # ランキング (いいね数順) 用
+            models.Index(fields=["-likes_count", "-created_at", "-id"], name="dish_ranking_idx"),
+            # 最新料理一覧用
+            models.Index(fields=["-created_at", "-id"], name="dish_recent_idx"),
+            # トレンドランキング用. TrendingPeriod.orderingと一致させる
+            models.Index(fields=["-hot_score", "-created_at", "-id"], name="dish_hot_idx"),
+            models.Index(fields=["-daily_score", "-created_at", "-id"], name="dish_daily_idx"),
+            models.Index(fields=["-weekly_score", "-created_at", "-id"], name="dish_weekly_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} (by {self.user.username})"
 
+    @property
+    def username(self) -> str:
+        """作成ユーザー名 (テンプレート表示用)."""
+        return self.user.username
+
+
+class LikeQuerySet(models.QuerySet["Like"]):
+    """いいねのクエリセット."""
+
+    def toggle(self, dish_id: int, user: User) -> bool:
+        """いいねを切り替える. Likeの追加・削除とlikes_countなどの更新を同一トランザクションで行う.
+
+        Args:
+            dish_id: 対象料理のID
+            user: いいねするユーザー
+
+        Returns:
+            切り替え後のいいね状態
+        """
+        with transaction.atomic(using=self.db):
+            like, created = self.get_or_create(dish_id=dish_id, user=user)
+            if not created:
+                # 既にいいねしていた場合は削除. 同時に取り消された場合は二重に数えない
+                self.remove(like)
+        return created
+
+    def remove(self, like: "Like") -> bool:
+        """いいねを1件削除する. 実際に行を削除できた場合のみpre_delete・post_deleteシグナルが送られる.
+
+        同じいいねを同時に取り消すと、両方のリクエストが削除前の行を読んでいても、行を削除できるのは一方のみ。
+        Model.deleteは削除できた行数によらずシグナルを送り、likes_countなどを二重に減らしてしまうため、
+        トランザクション内でSELECT ... FOR UPDATEで行をロックして読み直し、読めた行を削除する。
+        後から取り消したリクエストは先のリクエストのコミットを待ち、行が残っていなければ何も削除せず、
+        シグナルも送られない。
+
+        Args:
+            like: 削除するいいね
+
+        Returns:
+            行を削除できたか
+        """
+        with transaction.atomic(using=self.db):
+            locked = self.select_for_update().filter(pk=like.pk).first()
+            if locked is None:
+                return False
+            deleted, _ = locked.delete()
+        return deleted > 0
+
+    def apply_states(self, states: Mapping[tuple[int, int], bool]) -> list["Like"]:
+        """(ユーザーID, 料理ID) ごとのいいね状態をまとめてデータベースに反映する.
+
+        既にその状態になっている組は何もしないため、同じ状態を何度反映しても結果は変わらない。
+        追加するいいねはbulk_createでまとめて作成し、likes_count・トレンドスコアは料理ごとに1回のUPDATE、
+        期間別いいね数は1回のINSERT ... ON CONFLICTでまとめて加算する。
+        取り消すいいねはremoveで1件ずつ削除する (シグナルで各集計を更新)。
+        削除済みのユーザー・料理の組は無視する。全体を1つのトランザクションで行う。
+
+        Args:
+            states: (ユーザーID, 料理ID) ごとのいいね状態. Trueでいいね、Falseで取り消し
+
+        Returns:
+            追加したいいね. シグナルは送られないため、キャッシュ層への反映は呼び出し側で行う
+        """
+        if not states:
+            return []
+        user_ids = {user_id for user_id, _ in states}
+        dish_ids = {dish_id for _, dish_id in states}
+        with transaction.atomic(using=self.db):
+            existing = {
+                (like.user_id, like.dish_id): like  # type: ignore[attr-defined]
+                for like in self.filter(user_id__in=user_ids, dish_id__in=dish_ids).only(
+                    "pk",
+                    "user_id",
+                    "dish_id",
+                    "created_at",
+                )
+            }
+            live_users = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+            live_dishes = set(GeneratedDish.objects.filter(pk__in=dish_ids).values_list("pk", flat=True))
+            added = self.bulk_create(
+                [
+                    self.model(user_id=user_id, dish_id=dish_id)
+                    for (user_id, dish_id), liked in states.items()
+                    if liked and (user_id, dish_id) not in existing and user_id in live_users and dish_id in live_dishes
+                ],
+                batch_size=LIKE_BATCH_SIZE,
+            )
+            for key, liked in states.items():
+                if not liked and key in existing:
+                    self.remove(existing[key])
+
+            now = timezone.now()
+            for dish_id, count in Counter(like.dish_id for like in added).items():  # type: ignore[attr-defined]
+                GeneratedDish.objects.adjust_likes_count(dish_id, count, now)  # type: ignore[attr-defined]
+            DishLikeRollup.objects.add_likes(  # type: ignore[attr-defined]
+                Counter(
+                    (period, bucket, like.dish_id)  # type: ignore[attr-defined]
+                    for like in added
+                    for period, bucket in rollups.buckets(like.created_at)
+                ),
+            )
+        return added
+
 
 class Like(models.Model):
     """いいねモデル."""
@@ -67,6 +425,8 @@ class Like(models.Model):
         verbose_name="いいね日時",
     )
 
+    objects = LikeQuerySet.as_manager()
+
     class Meta:
         # 同じユーザーが同じ料理に複数回いいねできないようにする
         unique_together: ClassVar[list[str]] = ["dish", "user"]
@@ -78,7 +438,147 @@ class Like(models.Model):
         return f"{self.user.username} → {self.dish.name}"
 
 
+class DishLikeRollupQuerySet(models.QuerySet["DishLikeRollup"]):
+    """期間別いいね数のクエリセット."""
+
+    def add_likes(self, counts: Mapping[tuple[str, date, int], int]) -> int:
+        """バケットごとのいいね数を加算する. 行がなければ作成する.
+
+        INSERT ... ON CONFLICT DO UPDATEで加算するため (SQLite・PostgreSQLで共通の構文)、
+        同じバケットに同時にいいねされても更新が失われない。
+
+        Args:
+            counts: (期間, バケット, 料理ID) ごとの加算するいいね数
+
+        Returns:
+            処理した行数
+        """
+        connection = connections[self.db]
+        opts = self.model._meta  # noqa: SLF001
+        quote_name = connection.ops.quote_name
+        table = quote_name(opts.db_table)
+        key_columns = ", ".join(quote_name(opts.get_field(name).column) for name in ("period", "bucket", "dish"))
+        likes = quote_name(opts.get_field("likes").column)
+        rows = [
+            (period, connection.ops.adapt_datefield_value(bucket), dish_id, count)
+            for (period, bucket, dish_id), count in counts.items()
+            if count
+        ]
+        with connection.cursor() as cursor:
+            for batch in itertools.batched(rows, ROLLUP_BATCH_SIZE):
+                values = ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+                cursor.execute(
+                    f"INSERT INTO {table} ({key_columns}, {likes}) VALUES {values} "  # noqa: S608
+                    f"ON CONFLICT ({key_columns}) DO UPDATE SET {likes} = {table}.{likes} + excluded.{likes}",
+                    [value for row in batch for value in row],
+                )
+        return len(rows)
+
+    def adjust_likes(self, dish_id: int, liked_at: datetime, delta: int) -> int:
+        """いいね1件の追加・削除を、その作成日時が属する全てのバケットに反映する.
+
+        削除時は、いいねが数えられているバケットの行が必ず存在するためUPDATEのみを行う。
+        料理の削除に伴うカスケード削除中に、削除対象外の行を新たに作らないためでもある。
+
+        Args:
+            dish_id: 対象料理のID
+            liked_at: いいねの作成日時
+            delta: 増減値 (追加時は1、削除時は-1)
+
+        Returns:
+            処理した行数
+        """
+        if delta > 0:
+            return self.add_likes({(period, bucket, dish_id): delta for period, bucket in rollups.buckets(liked_at)})
+        in_buckets = Q.create(
+            [Q(period=period, bucket=bucket) for period, bucket in rollups.buckets(liked_at)],
+            connector=Q.OR,
+        )
+        return self.filter(in_buckets, dish_id=dish_id).update(likes=F("likes") + delta)
+
+    def ranking(self, period: str) -> "DishLikeRollupQuerySet":
+        """現在のバケットでいいねされた料理を取得する. 並び順はROLLUP_RANKING_ORDERINGで指定する."""
+        return self.filter(period=period, bucket=rollups.current_bucket(period), likes__gt=0)
+
+    def rebuild(self, batch_size: int = 10000) -> int:
+        """Likeテーブルから全てのバケットを作り直す.
+
+        いいねを主キー順にbatch_size件ずつ読み、バケットごとに数えて加算するため、
+        いいねの件数によらずメモリ使用量は一定になる。全体を1つのトランザクションで行う。
+
+        Returns:
+            読み込んだいいねの件数
+        """
+        total = 0
+        last_pk = 0
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            while True:
+                likes = list(
+                    Like.objects.using(self.db)
+                    .filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", "dish_id", "created_at")[:batch_size],
+                )
+                if not likes:
+                    break
+                counts: Counter[tuple[str, date, int]] = Counter()
+                for _pk, dish_id, created_at in likes:
+                    for period, bucket in rollups.buckets(created_at):
+                        counts[period, bucket, dish_id] += 1
+                self.add_likes(counts)
+                total += len(likes)
+                last_pk = likes[-1][0]
+        return total
+
+
+class DishLikeRollup(models.Model):
+    """料理の期間別いいね数モデル.
+
+    いいねの作成日時が属する日・週・月のバケットごとに1行を持ち、
+    いいねの追加・削除時にシグナルで増減する。
+    """
+
+    period = models.CharField(
+        max_length=10,
+        choices=rollups.RollupPeriod.choices,
+        verbose_name="期間",
+    )
+    bucket = models.DateField(
+        verbose_name="バケット",
+        help_text="集計期間の初日",
+    )
+    dish = models.ForeignKey(
+        GeneratedDish,
+        on_delete=models.CASCADE,
+        verbose_name="対象料理",
+        related_name="like_rollups",
+    )
+    likes = models.IntegerField(
+        default=0,
+        verbose_name="いいね数",
+        help_text="集計期間内に付けられたいいねの数",
+    )
+
+    objects = DishLikeRollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "期間別いいね数"
+        verbose_name_plural = "期間別いいね数"
+        constraints: ClassVar[list[models.BaseConstraint]] = [
+            models.UniqueConstraint(fields=["period", "bucket", "dish"], name="dish_rollup_unique"),
+        ]
+        indexes: ClassVar[list[models.Index]] = [
+            # 期間別ランキング用. ROLLUP_RANKING_ORDERINGと一致させる
+            models.Index(fields=["period", "bucket", "-likes", "-dish"], name="dish_rollup_ranking_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_period_display()} {self.bucket}: {self.dish_id} ({self.likes})"  # type: ignore[attr-defined]
+
+
 # いいねが追加・削除された時にlikes_countを自動更新
+# シグナルはLikeのINSERT/DELETEと同じトランザクション内で実行される
 @receiver(post_save, sender=Like)
 def update_likes_count_on_add(
     *,
@@ -88,8 +588,7 @@ def update_likes_count_on_add(
 ) -> None:
     """いいね追加時にlikes_countを更新."""
     if created:
-        instance.dish.likes_count = instance.dish.likes.count()  # type: ignore[attr-defined]
-        instance.dish.save(update_fields=["likes_count"])
+        GeneratedDish.objects.adjust_likes_count(instance.dish_id, 1)  # type: ignore[attr-defined]
 
 
 @receiver(post_delete, sender=Like)
@@ -98,6 +597,73 @@ def update_likes_count_on_delete(
     instance: Like,
     **_kwargs: object,
 ) -> None:
-    """いいね削除時にlikes_countを更新."""
-    instance.dish.likes_count = instance.dish.likes.count()  # type: ignore[attr-defined]
-    instance.dish.save(update_fields=["likes_count"])
+    """いいね削除時にlikes_countを更新. トレンドスコアからは作成時刻から減衰させた重みを引く."""
+    GeneratedDish.objects.adjust_likes_count(instance.dish_id, -1, instance.created_at)  # type: ignore[attr-defined]
+
+
+@receiver(post_save, sender=Like)
+def update_like_rollups_on_add(
+    *,
+    instance: Like,
+    created: bool,
+    **_kwargs: object,
+) -> None:
+    """いいね追加時に期間別いいね数を更新."""
+    if created:
+        DishLikeRollup.objects.adjust_likes(instance.dish_id, instance.created_at, 1)  # type: ignore[attr-defined]
+
+
+@receiver(post_delete, sender=Like)
+def update_like_rollups_on_delete(
+    *,
+    instance: Like,
+    **_kwargs: object,
+) -> None:
+    """いいね削除時に期間別いいね数を更新."""
+    DishLikeRollup.objects.adjust_likes(instance.dish_id, instance.created_at, -1)  # type: ignore[attr-defined]
+
+
+# 料理の材料が変更された時にingredient_namesを同期
+@receiver(m2m_changed, sender=GeneratedDish.ingredients.through)
+def sync_ingredient_names_on_change(
+    *,
+    instance: GeneratedDish | Ingredient,
+    action: str,
+    reverse: bool,
+    pk_set: set[int] | None,
+    **_kwargs: object,
+) -> None:
+    """料理の材料の追加・削除をingredient_namesに反映."""
+    if not reverse:
+        if action.startswith("post_"):
+            GeneratedDish.objects.filter(pk=instance.pk).refresh_ingredient_names()  # type: ignore[attr-defined]
+        return
+
+    # 材料側から変更された場合. clearはpk_setが渡されないため事前に対象の料理を控えておく
+    if action == "pre_clear":
+        instance._cleared_dish_ids = list(instance.dishes.values_list("pk", flat=True))  # type: ignore[union-attr]  # noqa: SLF001
+    elif action == "post_clear":
+        dish_ids = getattr(instance, "_cleared_dish_ids", [])
+        GeneratedDish.objects.filter(pk__in=dish_ids).refresh_ingredient_names()  # type: ignore[attr-defined]
+    elif action in {"post_add", "post_remove"}:
+        GeneratedDish.objects.filter(pk__in=pk_set or []).refresh_ingredient_names()  # type: ignore[attr-defined]
+
+
+@receiver(post_save, sender=Ingredient)
+def sync_ingredient_names_on_rename(*, instance: Ingredient, created: bool, **_kwargs: object) -> None:
+    """材料名の変更を、その材料を使う料理のingredient_namesに反映."""
+    if not created:
+        GeneratedDish.objects.filter(ingredients=instance).refresh_ingredient_names()  # type: ignore[attr-defined]
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_dishes_on_ingredient_delete(*, instance: Ingredient, **_kwargs: object) -> None:
+    """材料の削除で中間テーブルの行が消える前に、対象の料理を控えておく."""
+    instance._deleted_dish_ids = list(instance.dishes.values_list("pk", flat=True))  # type: ignore[attr-defined]  # noqa: SLF001
+
+
+@receiver(post_delete, sender=Ingredient)
+def sync_ingredient_names_on_delete(*, instance: Ingredient, **_kwargs: object) -> None:
+    """削除された材料をingredient_namesから取り除く."""
+    dish_ids = getattr(instance, "_deleted_dish_ids", [])
+    GeneratedDish.objects.filter(pk__in=dish_ids).refresh_ingredient_names()  # type: ignore[attr-defined]
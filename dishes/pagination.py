@@ -0,0 +1,266 @@
+"""キーセット (カーソル) 方式のページネーション.
+
+OFFSET方式では深いページほど読み飛ばす行が増え、さらに毎回COUNT(*)が発生する。
+キーセット方式では直前のページ末尾の並び替えキーより後ろをインデックスで探すため、
+何ページ目でも1ページ目と同じコストで取得できる。
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Q, QuerySet
+from django.http import Http404
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+CURSOR_QUERY_PARAM = "cursor"
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """カーソル用のJSONエンコーダー.
+
+    DjangoJSONEncoderは日時をミリ秒に切り捨てるため、同じミリ秒内の行がカーソルの前後で読み飛ばされる。
+    日時はマイクロ秒まで含めて出力する。
+    """
+
+    def default(self, o: object) -> Any:  # noqa: ANN401
+        """日時は精度を落とさずにISO 8601形式にする."""
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+@dataclass
+class KeysetPage:
+    """キーセット方式の1ページ分の結果.
+
+    テンプレートからはDjangoのPageと同じ感覚で扱えるようにしている。
+    """
+
+    object_list: list[Any]
+    offset: int = 0
+    next_cursor: str | None = None
+    is_keyset: ClassVar[bool] = True
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        """次のページがあるか."""
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        """前のページがあるか."""
+        return self.offset > 0
+
+    def has_other_pages(self) -> bool:
+        """他のページがあるか."""
+        return self.has_next() or self.has_previous()
+
+    def start_index(self) -> int:
+        """ページ先頭の通し番号 (1始まり)."""
+        return self.offset + 1 if self.object_list else 0
+
+    def end_index(self) -> int:
+        """ページ末尾の通し番号."""
+        return self.offset + len(self.object_list)
+
+
+def encode_cursor(obj: Model, ordering: Sequence[str], offset: int) -> str:
+    """オブジェクトの並び替えキーからカーソル文字列を作成する.
+
+    Args:
+        obj: ページ末尾のオブジェクト
+        ordering: 並び順 (例: ["-likes_count", "-created_at", "-id"])
+        offset: このカーソルより前にある件数 (順位表示用)
+
+    Returns:
+        URLに埋め込めるカーソル文字列
+    """
+    keys = [getattr(obj, name.lstrip("-")) for name in ordering]
+    payload = json.dumps({"k": keys, "o": offset}, cls=CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(queryset: QuerySet, ordering: Sequence[str], cursor: str) -> tuple[list[Any], int]:
+    """カーソル文字列を並び替えキーの値とオフセットに戻す.
+
+    Raises:
+        Http404: カーソルが不正な場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        raw_keys = payload["k"]
+        offset = int(payload["o"])
+        if len(raw_keys) != len(ordering) or offset < 0:
+            raise ValueError  # noqa: TRY301
+        opts = queryset.model._meta  # noqa: SLF001
+        keys = [
+            opts.get_field(name.lstrip("-")).to_python(value)  # type: ignore[union-attr]
+            for name, value in zip(ordering, raw_keys, strict=True)
+        ]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError, ValidationError) as e:
+        msg = "無効なカーソルです。"
+        raise Http404(msg) from e
+    return keys, offset
+
+
+def keyset_filter(ordering: Sequence[str], keys: Sequence[Any]) -> Q:
+    """カーソル位置より後ろの行を表す条件を作成する.
+
+    (a, b, c) > (x, y, z) を (a > x) OR (a = x AND b > y) OR ... に展開する。
+    """
+    condition = Q()
+    for i, name in enumerate(ordering):
+        column = name.lstrip("-")
+        lookup = "lt" if name.startswith("-") else "gt"
+        term = Q(**{f"{column}__{lookup}": keys[i]})
+        for prev_name, prev_key in zip(ordering[:i], keys[:i], strict=True):
+            term &= Q(**{prev_name.lstrip("-"): prev_key})
+        condition |= term
+    return condition
+
+
+def paginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    cursor: str,
+    page_size: int,
+) -> KeysetPage:
+    """キーセット方式で1ページ分を取得する.
+
+    COUNT(*)は発行せず、1件多く取得して次ページの有無を判定する。
+
+    Args:
+        queryset: 対象のクエリセット
+        ordering: 並び順。最後は一意な列 (id) にすること
+        cursor: カーソル文字列。空文字の場合は先頭ページ
+        page_size: 1ページの件数
+
+    Returns:
+        取得したページ
+    """
+    queryset, offset = _seek(queryset, ordering, cursor)
+    return _build_keyset_page(list(queryset[: page_size + 1]), ordering, offset, page_size)
+
+
+async def apaginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    cursor: str,
+    page_size: int,
+) -> KeysetPage:
+    """paginate_keysetの非同期版."""
+    queryset, offset = _seek(queryset, ordering, cursor)
+    rows = [obj async for obj in queryset[: page_size + 1]]
+    return _build_keyset_page(rows, ordering, offset, page_size)
+
+
+def _seek(queryset: QuerySet, ordering: Sequence[str], cursor: str) -> tuple[QuerySet, int]:
+    """カーソル位置より後ろに絞り込んだクエリセットとオフセットを返す."""
+    queryset = queryset.order_by(*ordering)
+    if not cursor:
+        return queryset, 0
+    keys, offset = decode_cursor(queryset, ordering, cursor)
+    return queryset.filter(keyset_filter(ordering, keys)), offset
+
+
+def _build_keyset_page(rows: list[Any], ordering: Sequence[str], offset: int, page_size: int) -> KeysetPage:
+    """page_size + 1件の取得結果からページを作成する."""
+    object_list = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = encode_cursor(object_list[-1], ordering, offset + page_size)
+    return KeysetPage(object_list=object_list, offset=offset, next_cursor=next_cursor)
+
+
+async def apaginate(
+    queryset: QuerySet,
+    page_number: Any,  # noqa: ANN401
+    per_page: int,
+) -> tuple[Paginator, Page, list[Any], bool]:
+    """ページ番号方式のページングを非同期ORMで行う.
+
+    ListView.paginate_querysetと同じ形式の値を返す。
+
+    Raises:
+        Http404: ページ番号が不正な場合
+    """
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()  # type: ignore[misc]
+    try:
+        number = paginator.num_pages if page_number == "last" else int(page_number or 1)
+        number = paginator.validate_number(number)
+    except (ValueError, InvalidPage) as e:
+        msg = "無効なページです。"
+        raise Http404(msg) from e
+    bottom = (number - 1) * per_page
+    object_list = [obj async for obj in queryset[bottom : bottom + per_page]]
+    page = Page(object_list, number, paginator)
+    return (paginator, page, object_list, page.has_other_pages())
+
+
+class KeysetPaginationMixin:
+    """ListViewにキーセット方式のページネーションを追加するMixin.
+
+    `?cursor=` が指定された場合はキーセット方式、それ以外は通常のページ番号方式で動作する。
+    どちらの場合も「次へ」リンク用のカーソルをコンテキストに追加する。
+    """
+
+    keyset_ordering: ClassVar[tuple[str, ...]] = ()
+    # 非同期ビューで事前に取得したページング結果
+    pagination: tuple[Any, Any, Any, bool] | None = None
+    request: Any
+    kwargs: Any
+    page_kwarg: str
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple[Any, Any, Any, bool]:
+        """カーソル指定時はキーセット方式でページングする."""
+        if self.pagination is not None:
+            return self.pagination
+        if CURSOR_QUERY_PARAM not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)  # type: ignore[misc]
+        page = paginate_keyset(
+            queryset,
+            self.keyset_ordering,
+            self.request.GET[CURSOR_QUERY_PARAM],
+            page_size,
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    async def apaginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple[Any, Any, Any, bool]:
+        """paginate_querysetの非同期版."""
+        if CURSOR_QUERY_PARAM not in self.request.GET:
+            page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg)
+            return await apaginate(queryset, page_number, page_size)
+        page = await apaginate_keyset(
+            queryset,
+            self.keyset_ordering,
+            self.request.GET[CURSOR_QUERY_PARAM],
+            page_size,
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs: object) -> dict[str, Any]:
+        """次ページへのカーソルを追加."""
+        context = super().get_context_data(**kwargs)  # type: ignore[misc]
+        page = context.get("page_obj")
+        if isinstance(page, KeysetPage):
+            context["next_cursor"] = page.next_cursor
+        elif page is not None and page.has_next():
+            context["next_cursor"] = encode_cursor(page[-1], self.keyset_ordering, page.end_index())
+        return context
@@ -0,0 +1,43 @@
+"""期間別いいね数の集計 (ロールアップ).
+
+いいねを作成日時 (Like.created_at) で日・週・月の区切り (バケット) に振り分け、料理ごとのいいね数を
+DishLikeRollupに保持する。いいねの追加・削除のたびに該当するバケットの行を増減するため、
+期間別ランキングは集計を行わず、(期間, バケット, いいね数) のインデックスを範囲で1回読むだけで済む。
+
+バケットはTIME_ZONEの暦で区切り、週は月曜始まりとする。
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+from django.db import models
+from django.utils import timezone
+
+
+class RollupPeriod(models.TextChoices):
+    """集計の区切り."""
+
+    DAY = "day", "今日"
+    WEEK = "week", "今週"
+    MONTH = "month", "今月"
+
+
+def bucket_start(period: str, day: date) -> date:
+    """dayを含むバケットの初日を返す."""
+    if period == RollupPeriod.WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == RollupPeriod.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def buckets(liked_at: datetime) -> list[tuple[str, date]]:
+    """いいねの作成日時が属する全ての (期間, バケット) を返す."""
+    day = timezone.localdate(liked_at)
+    return [(period.value, bucket_start(period, day)) for period in RollupPeriod]
+
+
+def current_bucket(period: str) -> date:
+    """現在のバケットの初日を返す."""
+    return bucket_start(period, timezone.localdate())
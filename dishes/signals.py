@@ -0,0 +1,81 @@
+"""キャッシュ層を更新するシグナルハンドラ.
+
+likes_count自体の更新はmodels.pyのハンドラで行い、
+ここではコミット後にランキングキャッシュへ反映し、いいね済み料理IDの集合を破棄する。
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from ingredients.models import Ingredient
+
+from .leaderboard import leaderboard
+from .liked import liked_dishes
+from .models import GeneratedDish, Like
+
+
+@receiver(post_save, sender=Like)
+def update_leaderboard_on_like_add(*, instance: Like, created: bool, **_kwargs: object) -> None:
+    """いいね追加をランキングに反映."""
+    if created:
+        transaction.on_commit(partial(leaderboard.apply_likes_delta, instance.dish_id, 1))  # type: ignore[attr-defined]
+
+
+@receiver(post_delete, sender=Like)
+def update_leaderboard_on_like_delete(*, instance: Like, **_kwargs: object) -> None:
+    """いいね削除をランキングに反映."""
+    transaction.on_commit(partial(leaderboard.apply_likes_delta, instance.dish_id, -1))  # type: ignore[attr-defined]
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def invalidate_liked_dishes(*, instance: Like, created: bool = True, **_kwargs: object) -> None:
+    """いいねの追加・削除でユーザーのいいね済み料理IDの集合を破棄."""
+    if not created:
+        return
+    # コミット前に再作成されても古い内容が残らないよう、コミット後にも破棄する
+    liked_dishes.invalidate(instance.user_id)  # type: ignore[attr-defined]
+    transaction.on_commit(partial(liked_dishes.invalidate, instance.user_id))  # type: ignore[attr-defined]
+
+
+@receiver(post_save, sender=GeneratedDish)
+def update_leaderboard_on_dish_save(*, instance: GeneratedDish, created: bool, **_kwargs: object) -> None:
+    """料理の作成・更新をランキングに反映."""
+    if created:
+        transaction.on_commit(partial(leaderboard.add_dish, instance.pk))
+    else:
+        transaction.on_commit(partial(leaderboard.refresh_dish, instance.pk))
+
+
+@receiver(post_delete, sender=GeneratedDish)
+def update_leaderboard_on_dish_delete(*, instance: GeneratedDish, **_kwargs: object) -> None:
+    """料理の削除をランキングに反映."""
+    transaction.on_commit(partial(leaderboard.remove_dish, instance.pk))
+
+
+@receiver(m2m_changed, sender=GeneratedDish.ingredients.through)
+def update_leaderboard_on_ingredients_change(
+    *,
+    instance: GeneratedDish | Ingredient,
+    action: str,
+    reverse: bool,
+    **_kwargs: object,
+) -> None:
+    """料理の材料変更をランキングに反映."""
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        transaction.on_commit(leaderboard.invalidate)
+    else:
+        transaction.on_commit(partial(leaderboard.refresh_dish, instance.pk))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def update_leaderboard_on_ingredient_change(*, created: bool = False, **_kwargs: object) -> None:
+    """材料名の変更・削除でランキング内の材料表示が変わるためキャッシュを破棄."""
+    if not created:
+        transaction.on_commit(leaderboard.invalidate)
@@ -1,3 +1,1178 @@
-from django.test import TestCase
+import base64
+import math
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, date, datetime, timedelta
+from io import StringIO
+from typing import ClassVar
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from core.testing import QueryBudget, QueryBudgetMixin
+from ingredients.cache import ingredient_cache
+from ingredients.models import Ingredient
+
+from . import rollups
+from .checks import check_leaderboard_cache, check_like_buffer_cache, check_liked_dishes_cache
+from .forms import MAX_BULK_SAVE_COUNT, BulkSaveDishForm
+from .leaderboard import RANKING_ORDERING, leaderboard
+from .like_buffer import FLUSH_TIME_LIMIT, GAP_TIMEOUT, LikeBuffer, like_buffer
+from .liked import LikedDishCache, liked_dishes
+from .models import DishLikeRollup, GeneratedDish, Like
+from .pagination import decode_cursor, encode_cursor, keyset_filter, paginate_keyset
+from .rollups import RollupPeriod
+from .trending import TRENDING_PERIODS
+from .utils import (
+    STANDARD_ENGINE,
+    DishNameEngine,
+    generate_dish_name,
+    generate_multiple_dish_names,
+    get_template_set,
+    register_template_set,
+    shuffled_range,
+    template_set_names,
+)
+from .views import DishListView, PeriodRankingListView, RankingListView, RecentDishesView, TrendingListView
+
+
+class ListingQueryCountTests(TestCase):
+    """公開料理一覧のクエリ数が料理の件数に依存しないことを確認する."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """複数ユーザー・複数材料の料理を作成."""
+        for i in range(3):
+            user = User.objects.create_user(username=f"user{i}")
+            ingredients = [Ingredient.objects.create(name=f"材料{j}", user=user) for j in range(3)]
+            for k in range(15):
+                dish = GeneratedDish.objects.create(name=f"料理{i}-{k}", user=user)
+                dish.ingredients.set(ingredients)
+
+    def setUp(self) -> None:
+        """ランキングキャッシュを空にする."""
+        cache.clear()
+
+    def test_ranking_cold_cache(self) -> None:
+        """キャッシュが空の場合は料理の1クエリのみ (全件がキャッシュに収まるためCOUNTなし)."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("dishes:ranking"))
+        self.assertContains(response, "user2")
+        self.assertContains(response, "材料0")
+
+    def test_ranking_warm_cache(self) -> None:
+        """キャッシュ済みの場合はデータベースに問い合わせない."""
+        self.client.get(reverse("dishes:ranking"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("dishes:ranking"))
+
+    def test_ranking_cursor_page(self) -> None:
+        """カーソル指定時は料理の1クエリのみ (COUNTなし)."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("dishes:ranking"), {"cursor": ""})
+        self.assertContains(response, "材料0")
+
+    def test_recent_dishes(self) -> None:
+        """最新の料理は件数 + 料理の2クエリ."""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("dishes:recent"), {"page": 2})
+        self.assertContains(response, "材料0")
+
+
+class DishNameEngineTests(TestCase):
+    """料理名の一括生成エンジン."""
+
+    def test_negative_count(self) -> None:
+        """負の生成数はエラー."""
+        with self.assertRaises(ValueError):
+            generate_multiple_dish_names(["卵", "ネギ", "チーズ"], -1)
+
+    def test_colliding_combinations_are_topped_up(self) -> None:
+        """異なる組み合わせが同じ文字列になっても、作れる限りcount件の重複のない料理名を返す."""
+        # "{0}{1}"と"{1}{0}"は4通りの組み合わせから2通りの文字列しか作らない
+        engine = DishNameEngine(["{0}{1}", "{1}{0}"], [])
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                names = engine.generate(["卵", "ネギ"], 2, random.Random(seed))  # noqa: S311
+                self.assertCountEqual(names, ["卵ネギ", "ネギ卵"])
+                names = engine.generate(["卵", "ネギ"], 3, random.Random(seed))  # noqa: S311
+                self.assertCountEqual(names, ["卵ネギ", "ネギ卵"])
+
+    def test_shuffled_range_is_permutation(self) -> None:
+        """shuffled_rangeは0からsize-1までを重複なく全て返す."""
+        for size in (0, 1, 2, 7, 64, 100):
+            with self.subTest(size=size):
+                values = list(shuffled_range(size, random.Random(size)))  # noqa: S311
+                self.assertEqual(sorted(values), list(range(size)))
+
+    def test_combinations_are_unique_and_capped(self) -> None:
+        """組み合わせは重複せず、生成数は組み合わせの総数で頭打ちになる."""
+        # 区切り文字で組み合わせごとに異なる文字列になるテンプレート
+        engine = DishNameEngine(["{0}/{1}/{2}", "{0}+{1}"], ["丼", "鍋"])
+        ingredients = ["卵", "ネギ", "チーズ"]
+        total = engine.combination_count(len(ingredients))
+        self.assertEqual(total, 24)
+        for count in (10, total, total + 10):
+            with self.subTest(count=count):
+                names = list(engine.iter_names(ingredients, count, random.Random(count)))  # noqa: S311
+                self.assertEqual(len(names), min(count, total))
+                self.assertEqual(len(set(names)), len(names))
+
+    def test_same_seed_is_deterministic(self) -> None:
+        """同じシードの乱数生成器からは同じ料理名を同じ順に生成する."""
+        ingredients = ["卵", "ネギ", "チーズ", "トマト"]
+        first = generate_multiple_dish_names(ingredients, 20, random.Random(42))  # noqa: S311
+        second = generate_multiple_dish_names(ingredients, 20, random.Random(42))  # noqa: S311
+        self.assertEqual(first, second)
+        self.assertEqual(len(set(first)), 20)
+
+    def test_streaming_memory_is_flat(self) -> None:
+        """生成数によらず、生成中のメモリ使用量がほぼ一定."""
+        ingredients = [f"材料{i}" for i in range(30)]
+        peaks = []
+        for count in (1000, 100000):
+            tracemalloc.start()
+            for _ in STANDARD_ENGINE.iter_names(ingredients, count, random.Random(1)):  # noqa: S311
+                pass
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 2)
+
+
+class TemplateSetTests(TestCase):
+    """テンプレートセットの登録簿."""
+
+    def test_builtin_sets_are_registered(self) -> None:
+        """標準とデモのテンプレートセットが登録され、省略時は標準を使う."""
+        self.assertLessEqual({"demo", "standard"}, set(template_set_names()))
+        self.assertIs(get_template_set(), STANDARD_ENGINE)
+        self.assertIsNot(get_template_set("demo"), STANDARD_ENGINE)
+
+    def test_unknown_set_is_rejected(self) -> None:
+        """未登録の名前はValueError."""
+        with self.assertRaises(ValueError):
+            get_template_set("unknown")
+        with self.assertRaises(ValueError):
+            generate_dish_name(["卵", "ネギ"], template_set="unknown")
+
+    @mock.patch.dict("dishes.utils._template_sets")
+    def test_registered_set_is_used(self) -> None:
+        """登録したテンプレートセットで料理名を生成し、同じ名前の登録は上書きする."""
+        register_template_set("custom", ["{0}丼"], [])
+        engine = register_template_set("custom", ["{0}の{1}"], [])
+        self.assertIs(get_template_set("custom"), engine)
+        self.assertIn(generate_dish_name(["卵", "ネギ"], template_set="custom"), {"卵のネギ", "ネギの卵"})
+        names = generate_multiple_dish_names(["卵", "ネギ"], 5, template_set="custom")
+        self.assertCountEqual(names, ["卵のネギ", "ネギの卵"])
+
+    @mock.patch.dict("dishes.utils._template_sets")
+    def test_set_without_combinations_is_rejected(self) -> None:
+        """材料から料理名を作れないテンプレートセットはValueError."""
+        # 料理タイプがないため、料理タイプを使う3つ目のプレースホルダーを埋められない
+        register_template_set("empty", ["{0}と{1}の{2}"], [])
+        with self.assertRaises(ValueError):
+            generate_dish_name(["卵", "ネギ"], template_set="empty")
+
+
+class LeaderboardTests(TestCase):
+    """いいね数ランキングのキャッシュ."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """材料付きの料理を作成."""
+        cls.owner = User.objects.create_user(username="owner")
+        cls.likers = [User.objects.create_user(username=f"liker{i}") for i in range(2)]
+        ingredients = [Ingredient.objects.create(name=f"材料{i}", user=cls.owner) for i in range(2)]
+        for i in range(3):
+            dish = GeneratedDish.objects.create(name=f"料理{i}", user=cls.owner)
+            dish.ingredients.set(ingredients)
+
+    def setUp(self) -> None:
+        """ランキングキャッシュを空にする."""
+        cache.clear()
+
+    def cached_ranking(self) -> list[tuple[int, int]]:
+        """キャッシュ上のランキング (料理ID, いいね数)."""
+        board = leaderboard.cache.get(leaderboard.key)
+        self.assertIsNotNone(board)
+        return [(card.id, card.likes_count) for card in board.entries]
+
+    def expected_ranking(self) -> list[tuple[int, int]]:
+        """データベースから求めた上位LEADERBOARD_SIZE件."""
+        dishes = GeneratedDish.objects.order_by(*RANKING_ORDERING)[: leaderboard.size]
+        return list(dishes.values_list("pk", "likes_count"))
+
+    def like(self, dish: GeneratedDish, user: User) -> Like:
+        """コミット後のシグナルまで実行していいねを追加する."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return Like.objects.create(dish=dish, user=user)
+
+    def test_likes_reorder_board_without_rebuild(self) -> None:
+        """いいねの増減はキャッシュ上で並べ替え、データベースの順位と一致し続ける."""
+        leaderboard.board()
+        last = GeneratedDish.objects.order_by(*RANKING_ORDERING).last()
+        with self.assertNumQueries(0):
+            leaderboard.apply_likes_delta(last.pk, 1)
+        self.assertEqual(self.cached_ranking()[0], (last.pk, 1))
+
+        cache.clear()
+        leaderboard.board()
+        like = self.like(last, self.likers[0])
+        self.like(last, self.likers[1])
+        self.assertEqual(self.cached_ranking(), self.expected_ranking())
+        with self.captureOnCommitCallbacks(execute=True):
+            like.delete()
+        self.assertEqual(self.cached_ranking()[0], (last.pk, 1))
+        self.assertEqual(self.cached_ranking(), self.expected_ranking())
+
+    @override_settings(LEADERBOARD_SIZE=2)
+    def test_dish_outside_board_enters_when_liked(self) -> None:
+        """圏外の料理はいいねで上位に入り、最下位の料理が押し出される."""
+        outside = GeneratedDish.objects.order_by(*RANKING_ORDERING).last()
+        self.assertNotIn(outside.pk, [card.id for card in leaderboard.board().entries])
+        self.like(outside, self.likers[0])
+        self.assertEqual(self.cached_ranking(), self.expected_ranking())
+        self.assertEqual(self.cached_ranking()[0], (outside.pk, 1))
+        self.assertEqual(leaderboard.board().total, 3)
+
+    @override_settings(LEADERBOARD_SIZE=2)
+    def test_drop_to_last_place_invalidates_incomplete_board(self) -> None:
+        """圏外の料理がある状態で最下位まで下がった場合はキャッシュを破棄して作り直す."""
+        # 2位の料理にいいねして首位にし、取り消すと最下位 (2位) に戻る
+        second = GeneratedDish.objects.order_by(*RANKING_ORDERING)[1]
+        like = self.like(second, self.likers[0])
+        leaderboard.board()
+        with self.captureOnCommitCallbacks(execute=True):
+            like.delete()
+        self.assertIsNone(leaderboard.cache.get(leaderboard.key))
+        self.assertEqual([(card.id, card.likes_count) for card in leaderboard.board().entries], self.expected_ranking())
+
+    def test_dish_create_and_delete_update_board(self) -> None:
+        """料理の作成・削除はキャッシュ上の件数と並びに反映される."""
+        leaderboard.board()
+        with self.captureOnCommitCallbacks(execute=True):
+            dish = GeneratedDish.objects.create(name="新しい料理", user=self.owner)
+        self.assertEqual(leaderboard.board().total, 4)
+        self.assertEqual(self.cached_ranking(), self.expected_ranking())
+        self.assertEqual(self.cached_ranking()[0], (dish.pk, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dish.delete()
+        self.assertEqual(leaderboard.board().total, 3)
+        self.assertEqual(self.cached_ranking(), self.expected_ranking())
+
+    @override_settings(LEADERBOARD_SIZE=2)
+    def test_top_and_paginate_stay_within_cache(self) -> None:
+        """topはLEADERBOARD_SIZEを超える件数を拒否し、キャッシュ外のページはNoneを返す."""
+        with self.assertRaises(ValueError):
+            leaderboard.top(3)
+        self.assertEqual([card.id for card in leaderboard.top(2)], [pk for pk, _ in self.expected_ranking()])
+
+        paginator, page, entries, is_paginated = leaderboard.paginate(1, 2)
+        self.assertEqual(page.number, 1)
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(len(entries), 2)
+        self.assertTrue(is_paginated)
+        self.assertIsNone(leaderboard.paginate(2, 2))
+        self.assertIsNone(leaderboard.paginate("x", 2))
+
+    def test_settings_are_read_lazily(self) -> None:
+        """override_settingsで変更したLEADERBOARD_SIZEが反映される."""
+        with override_settings(LEADERBOARD_SIZE=2):
+            self.assertEqual(leaderboard.size, 2)
+            self.assertEqual(len(leaderboard.board().entries), 2)
+
+    def test_process_local_cache_is_reported(self) -> None:
+        """プロセスごとのキャッシュにランキングを保存する設定はcheck --deployで警告する."""
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"}}
+        with override_settings(CACHES=redis):
+            shared = check_leaderboard_cache(None)
+        local = check_leaderboard_cache(None)
+        self.assertEqual([message.id for message in shared + local], ["dishes.W002"])
+
+    def test_cards_render_author_and_ingredients(self) -> None:
+        """キャッシュのカードでも作成者と材料を表示し、自分の料理にはいいねボタンを出さない."""
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("dishes:ranking"))
+        self.assertContains(response, "作成者: owner")
+        self.assertContains(response, "材料: 材料1, 材料0")
+        self.assertNotContains(response, "like-btn")
+
+    def test_card_fragments_are_shared_across_users(self) -> None:
+        """カードのフラグメントは全ユーザーで共有し、いいねボタンの状態はユーザーごとに描画する."""
+        dish = GeneratedDish.objects.order_by(*RANKING_ORDERING).first()
+        Like.objects.create(dish=dish, user=self.likers[0])
+        self.client.force_login(self.likers[0])
+        response = self.client.get(reverse("dishes:ranking"))
+        self.assertContains(response, "like-btn liked", count=1)
+        key = make_template_fragment_key("ranking_dish_info", [dish.pk, dish.info_version])
+        self.assertIsNotNone(cache.get(key))
+
+        # 表示内容のバージョンを上げない更新は、別のユーザーにもキャッシュ済みのフラグメントで表示される
+        GeneratedDish.objects.update(name="キャッシュされない料理")
+        self.client.force_login(self.likers[1])
+        response = self.client.get(reverse("dishes:ranking"))
+        self.assertNotContains(response, "キャッシュされない料理")
+        self.assertNotContains(response, "like-btn liked")
+        self.assertContains(response, "like-btn", count=3)
+
+    def test_card_fragments_follow_info_version(self) -> None:
+        """カードのフラグメントキャッシュは料理IDと表示内容のバージョンで引き、材料名の同期で作り直す."""
+        self.client.get(reverse("dishes:recent"))
+        # バージョンを上げない更新はキャッシュ済みの表示のまま
+        GeneratedDish.objects.update(name="キャッシュされない料理")
+        self.assertNotContains(self.client.get(reverse("dishes:recent")), "キャッシュされない料理")
+
+        ingredient = Ingredient.objects.get(name="材料0")
+        ingredient.name = "新しい材料"
+        ingredient.save()
+        response = self.client.get(reverse("dishes:recent"))
+        self.assertContains(response, "材料: 材料1, 新しい材料", count=3)
+        self.assertContains(response, "キャッシュされない料理", count=3)
+
+
+class IngredientNamesSyncTests(TestCase):
+    """材料の変更に合わせたingredient_namesの同期."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """材料3件と料理2件を作成. 材料の並び順は新しい順 (材料2, 材料1, 材料0)."""
+        owner = User.objects.create_user(username="owner")
+        cls.ingredients = [Ingredient.objects.create(name=f"材料{i}", user=owner) for i in range(3)]
+        cls.dishes = [GeneratedDish.objects.create(name=f"料理{i}", user=owner) for i in range(2)]
+
+    def names(self) -> list[list[str]]:
+        """各料理のingredient_names (データベースの値)."""
+        values = dict(GeneratedDish.objects.values_list("pk", "ingredient_names"))
+        return [values[dish.pk] for dish in self.dishes]
+
+    def test_dish_side_add_remove_clear(self) -> None:
+        """料理側からの追加・削除・全削除・置き換え."""
+        dish = self.dishes[0]
+        dish.ingredients.add(self.ingredients[0], self.ingredients[1])
+        self.assertEqual(self.names(), [["材料1", "材料0"], []])
+        dish.ingredients.remove(self.ingredients[1])
+        self.assertEqual(self.names(), [["材料0"], []])
+        dish.ingredients.set([self.ingredients[2], self.ingredients[1]])
+        self.assertEqual(self.names(), [["材料2", "材料1"], []])
+        dish.ingredients.clear()
+        self.assertEqual(self.names(), [[], []])
+
+    def test_ingredient_side_add_remove_clear(self) -> None:
+        """材料側からの追加・削除・全削除. 全削除は事前に控えた料理を同期する."""
+        first, second, _ = self.ingredients
+        first.dishes.add(*self.dishes)
+        second.dishes.add(self.dishes[1])
+        self.assertEqual(self.names(), [["材料0"], ["材料1", "材料0"]])
+        first.dishes.remove(self.dishes[0])
+        self.assertEqual(self.names(), [[], ["材料1", "材料0"]])
+        first.dishes.add(self.dishes[0])
+        first.dishes.clear()
+        self.assertEqual(self.names(), [[], ["材料1"]])
+
+    def test_rename_and_delete(self) -> None:
+        """材料名の変更と材料の削除を、その材料を使う料理だけに反映する."""
+        for dish in self.dishes:
+            dish.ingredients.set(self.ingredients[:2])
+        self.dishes[1].ingredients.add(self.ingredients[2])
+
+        self.ingredients[0].name = "新しい材料"
+        self.ingredients[0].save()
+        self.assertEqual(self.names(), [["材料1", "新しい材料"], ["材料2", "材料1", "新しい材料"]])
+
+        self.ingredients[1].delete()
+        self.assertEqual(self.names(), [["新しい材料"], ["材料2", "新しい材料"]])
+
+
+class KeysetPaginationTests(TestCase):
+    """キーセット方式のページング."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """作成日時がマイクロ秒まで同じ料理を作成."""
+        owner = User.objects.create_user(username="owner")
+        GeneratedDish.objects.bulk_create([GeneratedDish(name=f"料理{i}", user=owner) for i in range(7)])
+        GeneratedDish.objects.update(created_at=datetime(2026, 1, 1, 12, 0, 0, 123456, tzinfo=UTC))
+
+    def test_ties_are_paged_exactly_once(self) -> None:
+        """同じ作成日時の料理も、どのページでも漏れや重複なく1回ずつ現れる."""
+        ordering = ("-created_at", "-id")
+        seen = []
+        cursor = ""
+        while True:
+            page = paginate_keyset(GeneratedDish.objects.all(), ordering, cursor, 2)
+            seen += [dish.pk for dish in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(GeneratedDish.objects.order_by(*ordering).values_list("pk", flat=True)))
+
+    def test_cursor_round_trip(self) -> None:
+        """カーソルは並び替えキーの値を型ごと、オフセットとともに復元する."""
+        dish = GeneratedDish.objects.order_by("pk").first()
+        cursor = encode_cursor(dish, RANKING_ORDERING, 20)
+        self.assertEqual(
+            decode_cursor(GeneratedDish.objects.all(), RANKING_ORDERING, cursor),
+            ([dish.likes_count, dish.created_at, dish.pk], 20),
+        )
+
+    def test_invalid_cursor_is_not_found(self) -> None:
+        """壊れたカーソルや並び順と合わないカーソルは404."""
+        dish = GeneratedDish.objects.first()
+        cursors = [
+            "!!!",
+            base64.urlsafe_b64encode(b"not json").decode(),
+            base64.urlsafe_b64encode(b'{"k": [1, "2026-01-01T00:00:00+00:00", 1]}').decode(),
+            base64.urlsafe_b64encode(b'{"k": [1, "2026-01-01T00:00:00+00:00", 1], "o": -1}').decode(),
+            base64.urlsafe_b64encode(b'{"k": [1, "not a date", 1], "o": 0}').decode(),
+            encode_cursor(dish, ("-created_at", "-id"), 0),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse("dishes:ranking"), {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+        encoded = encode_cursor(dish, RANKING_ORDERING, 0)
+        self.assertEqual(self.client.get(reverse("dishes:recent"), {"cursor": encoded}).status_code, 404)
+
+    def test_views_follow_next_cursor(self) -> None:
+        """次へのカーソルをたどると、順位を引き継いで全件を1回ずつ表示する."""
+        seen = []
+        start_indexes = []
+        params = {}
+        with mock.patch.object(RankingListView, "paginate_by", 3):
+            while True:
+                response = self.client.get(reverse("dishes:ranking"), params)
+                page = response.context["page_obj"]
+                seen += [dish.id for dish in page.object_list]
+                start_indexes.append(page.start_index())
+                if not response.context.get("next_cursor"):
+                    break
+                params = {"cursor": response.context["next_cursor"]}
+        self.assertEqual(seen, list(GeneratedDish.objects.order_by(*RANKING_ORDERING).values_list("pk", flat=True)))
+        self.assertEqual(start_indexes, [1, 4, 7])
+
+    def test_cursor_page_uses_listing_index(self) -> None:
+        """カーソル以降の取得は並び順と同じ複合インデックスを使う."""
+        dish = GeneratedDish.objects.order_by(*RANKING_ORDERING).first()
+        keys, _ = decode_cursor(GeneratedDish.objects.all(), RANKING_ORDERING, encode_cursor(dish, RANKING_ORDERING, 0))
+        queryset = GeneratedDish.objects.order_by(*RANKING_ORDERING).filter(keyset_filter(RANKING_ORDERING, keys))
+        self.assertIn("dish_ranking_idx", queryset[:10].explain())
+
+
+class AsyncListingViewTests(TestCase):
+    """公開料理一覧の非同期ビュー."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理2件と、そのうち1件にいいねしたユーザーを作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.liker = User.objects.create_user(username="liker")
+        cls.dishes = [GeneratedDish.objects.create(name=f"料理{i}", user=owner) for i in range(2)]
+        Like.objects.create(dish=cls.dishes[0], user=cls.liker)
+
+    def setUp(self) -> None:
+        """キャッシュを空にする."""
+        cache.clear()
+
+    def test_listing_views_are_async(self) -> None:
+        """一覧ビューは非同期ビューとして登録される."""
+        for view in (RankingListView, RecentDishesView, TrendingListView, PeriodRankingListView):
+            with self.subTest(view=view.__name__):
+                self.assertTrue(view.view_is_async)
+        self.assertFalse(DishListView.view_is_async)
+
+    async def test_liked_state_is_rendered(self) -> None:
+        """非同期ビューでもログインユーザーのいいね状態を表示する."""
+        await self.async_client.aforce_login(self.liker)
+        for name in ("dishes:ranking", "dishes:recent"):
+            with self.subTest(name=name):
+                response = await self.async_client.get(reverse(name))
+                self.assertEqual(response.context["user"], self.liker)
+                self.assertEqual(response.context["user_liked_dish_ids"], {self.dishes[0].pk})
+                self.assertContains(response, "like-btn liked", count=1)
+
+    async def test_anonymous_user_sees_no_like_buttons(self) -> None:
+        """未ログインのユーザーにはいいね済みの料理がない."""
+        response = await self.async_client.get(reverse("dishes:ranking"))
+        self.assertEqual(response.context["user_liked_dish_ids"], set())
+        self.assertNotContains(response, "like-btn liked")
+
+
+class LikesCountTests(TestCase):
+    """likes_countの原子的な更新と再集計."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理1件といいねするユーザーを作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.dish = GeneratedDish.objects.create(name="料理", user=owner)
+        cls.likers = [User.objects.create_user(username=f"liker{i}") for i in range(3)]
+
+    def likes_count(self) -> int:
+        """料理の現在のlikes_count."""
+        return GeneratedDish.objects.values_list("likes_count", flat=True).get(pk=self.dish.pk)
+
+    def test_adjust_is_relative_to_database_value(self) -> None:
+        """読み込んだ値ではなくデータベース上の値に加算するため、更新が失われない."""
+        stale = GeneratedDish.objects.get(pk=self.dish.pk)
+        GeneratedDish.objects.adjust_likes_count(self.dish.pk, 1)
+        GeneratedDish.objects.adjust_likes_count(stale.pk, 1)
+        self.assertEqual(self.likes_count(), 2)
+
+    def test_like_and_unlike(self) -> None:
+        """いいねの追加・削除でlikes_countが増減する."""
+        like = Like.objects.create(dish=self.dish, user=self.likers[0])
+        Like.objects.create(dish=self.dish, user=self.likers[1])
+        self.assertEqual(self.likes_count(), 2)
+        Like.objects.remove(like)
+        self.assertEqual(self.likes_count(), 1)
+
+    def test_concurrent_unlike_counts_once(self) -> None:
+        """同じいいねを2回取り消しても、行を削除した1回分だけ減る."""
+        like = Like.objects.create(dish=self.dish, user=self.likers[0])
+        stale = Like.objects.get(pk=like.pk)
+        removed = [Like.objects.remove(like), Like.objects.remove(stale)]
+        self.assertEqual(removed, [True, False])
+        self.assertEqual(self.likes_count(), 0)
+
+    def test_toggle(self) -> None:
+        """toggleはいいねしていなければ追加し、いいね済みなら取り消す."""
+        self.assertTrue(Like.objects.toggle(self.dish.pk, self.likers[0]))
+        self.assertEqual(self.likes_count(), 1)
+        self.assertFalse(Like.objects.toggle(self.dish.pk, self.likers[0]))
+        self.assertEqual(self.likes_count(), 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_reconcile_likes_count(self) -> None:
+        """シグナルを経由しないいいねも再集計でlikes_countに反映される."""
+        Like.objects.bulk_create([Like(dish=self.dish, user=liker) for liker in self.likers])
+        self.assertEqual(self.likes_count(), 0)
+        fixed = [GeneratedDish.objects.reconcile_likes_count(), GeneratedDish.objects.reconcile_likes_count()]
+        self.assertEqual(fixed, [1, 0])
+        self.assertEqual(self.likes_count(), 3)
+
+    def test_reconcile_likes_command(self) -> None:
+        """reconcile_likesコマンドでずれた料理を修正する."""
+        GeneratedDish.objects.filter(pk=self.dish.pk).update(likes_count=5)
+        stdout = StringIO()
+        call_command("reconcile_likes", stdout=stdout)
+        self.assertIn("1件", stdout.getvalue())
+        self.assertEqual(self.likes_count(), 0)
+
+
+class TrendingScoreTests(TestCase):
+    """トレンドスコアの差分更新と減衰."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理1件といいねするユーザーを作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.dish = GeneratedDish.objects.create(name="料理", user=owner)
+        cls.likers = [User.objects.create_user(username=f"liker{i}") for i in range(3)]
+
+    def scores(self) -> dict[str, float]:
+        """料理の現在のスコア."""
+        fields = [period.field for period in TRENDING_PERIODS.values()]
+        return GeneratedDish.objects.values(*fields).get(pk=self.dish.pk)
+
+    def assert_score(self, actual: float, expected: float) -> None:
+        """スコアが期待値とほぼ等しい."""
+        self.assertAlmostEqual(actual, expected, delta=1e-3)
+
+    def test_like_adds_one_to_every_score(self) -> None:
+        """いいね直後は全てのスコアがいいね数とほぼ等しい."""
+        for liker in self.likers:
+            Like.objects.create(dish=self.dish, user=liker)
+        for field, score in self.scores().items():
+            with self.subTest(field=field):
+                self.assert_score(score, 3)
+
+    def test_unlike_removes_contribution(self) -> None:
+        """いいねを取り消すと、そのいいねの分だけが引かれる."""
+        likes = [Like.objects.create(dish=self.dish, user=liker) for liker in self.likers]
+        likes[0].delete()
+        for field, score in self.scores().items():
+            with self.subTest(field=field):
+                self.assert_score(score, 2)
+
+    def test_unlike_old_like_keeps_fresh_like(self) -> None:
+        """1週間前のいいねを取り消しても、新しいいいねの分は残る."""
+        old_like = Like.objects.create(dish=self.dish, user=self.likers[0])
+        Like.objects.filter(pk=old_like.pk).update(created_at=timezone.now() - timedelta(weeks=1))
+        GeneratedDish.objects.rebuild_trending_scores()
+        Like.objects.create(dish=self.dish, user=self.likers[1])
+
+        Like.objects.remove(Like.objects.get(pk=old_like.pk))
+        for field, score in self.scores().items():
+            with self.subTest(field=field):
+                self.assert_score(score, 1)
+
+    def test_decay_orders_recent_likes_first(self) -> None:
+        """古いいいねは減衰し、最近いいねされた料理が急上昇の上位になる."""
+        old_like = Like.objects.create(dish=self.dish, user=self.likers[0])
+        for liker in self.likers[1:]:
+            Like.objects.create(dish=self.dish, user=liker)
+        # 1日前に3件いいねされた状態にする
+        day_ago = timezone.now() - timedelta(days=1)
+        Like.objects.filter(dish=self.dish).update(created_at=day_ago)
+        GeneratedDish.objects.rebuild_trending_scores()
+        fresh = GeneratedDish.objects.create(name="新しい料理", user=old_like.user)
+        Like.objects.create(dish=fresh, user=self.likers[1])
+
+        GeneratedDish.objects.decay_trending_scores()
+        scores = self.scores()
+        self.assert_score(scores["hot_score"], 3 * math.exp(-8))
+        self.assert_score(scores["daily_score"], 3 * math.exp(-1))
+        self.assert_score(scores["weekly_score"], 3 * math.exp(-1 / 7))
+
+        response = self.client.get(reverse("dishes:trending", args=["hot"]))
+        self.assertQuerySetEqual(response.context["dishes"], [fresh, self.dish])
+        response = self.client.get(reverse("dishes:trending", args=["weekly"]))
+        self.assertQuerySetEqual(response.context["dishes"], [self.dish, fresh])
+
+    def test_unknown_period(self) -> None:
+        """未定義のランキングは404."""
+        response = self.client.get(reverse("dishes:trending", args=["monthly"]))
+        self.assertContains(response, "", status_code=404)
+
+
+class LikeRollupTests(TestCase):
+    """期間別いいね数の差分更新と再構築."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理2件といいねするユーザーを作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.dishes = [GeneratedDish.objects.create(name=f"料理{i}", user=owner) for i in range(2)]
+        cls.likers = [User.objects.create_user(username=f"liker{i}") for i in range(3)]
+
+    def rollups(self) -> list[tuple[str, date, int, int]]:
+        """全ての期間別いいね数."""
+        return list(
+            DishLikeRollup.objects.order_by("dish_id", "period", "bucket").values_list(
+                "period",
+                "bucket",
+                "dish_id",
+                "likes",
+            ),
+        )
+
+    def test_like_and_unlike_update_every_bucket(self) -> None:
+        """いいねは日・週・月のバケットに加算され、取り消すと減算される."""
+        likes = [Like.objects.create(dish=self.dishes[0], user=liker) for liker in self.likers]
+        today = timezone.localdate()
+        expected = {
+            (RollupPeriod.DAY, today),
+            (RollupPeriod.WEEK, today - timedelta(days=today.weekday())),
+            (RollupPeriod.MONTH, today.replace(day=1)),
+        }
+        self.assertEqual({(period, bucket) for period, bucket, _dish, _likes in self.rollups()}, expected)
+        self.assertEqual([likes for *_key, likes in self.rollups()], [3, 3, 3])
+
+        likes[0].delete()
+        self.assertEqual([likes for *_key, likes in self.rollups()], [2, 2, 2])
+
+    def test_unlike_updates_buckets_of_like_date(self) -> None:
+        """いいねの取り消しは、いいねした日のバケットから減算される."""
+        like = Like.objects.create(dish=self.dishes[0], user=self.likers[0])
+        Like.objects.filter(pk=like.pk).update(created_at=like.created_at - timedelta(days=40))
+        DishLikeRollup.objects.rebuild()
+        like.refresh_from_db()
+        Like.objects.create(dish=self.dishes[0], user=self.likers[1])
+
+        like.delete()
+        remaining = [(period, bucket, likes) for period, bucket, _dish, likes in self.rollups() if likes]
+        self.assertCountEqual(remaining, [(period, rollups.current_bucket(period), 1) for period in RollupPeriod])
+
+    def test_rebuild_matches_incremental(self) -> None:
+        """再構築の結果は差分更新の結果と一致する."""
+        for dish in self.dishes:
+            for liker in self.likers[: dish.pk % 3 + 1]:
+                Like.objects.create(dish=dish, user=liker)
+        Like.objects.filter(user=self.likers[0]).delete()
+        incremental = [row for row in self.rollups() if row[3]]
+
+        DishLikeRollup.objects.rebuild(batch_size=1)
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_period_ranking(self) -> None:
+        """期間別ランキングは期間内のいいね数順で、1クエリで取得する."""
+        for liker in self.likers:
+            Like.objects.create(dish=self.dishes[1], user=liker)
+        Like.objects.create(dish=self.dishes[0], user=self.likers[0])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("dishes:period_ranking", args=["week"]))
+        self.assertQuerySetEqual(response.context["dishes"], [self.dishes[1], self.dishes[0]])
+        self.assertContains(response, "+3")
+
+        response = self.client.get(reverse("dishes:period_ranking", args=["year"]))
+        self.assertContains(response, "", status_code=404)
+
+
+class LikedDishCacheTests(TestCase):
+    """いいね済み料理IDの集合のキャッシュ."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理3件と、そのうち2件にいいねしたユーザーを作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.dishes = [GeneratedDish.objects.create(name=f"料理{i}", user=owner) for i in range(3)]
+        cls.user = User.objects.create_user(username="liker")
+        for dish in cls.dishes[:2]:
+            Like.objects.create(dish=dish, user=cls.user)
+
+    def setUp(self) -> None:
+        """キャッシュを空にする."""
+        cache.clear()
+
+    def test_cached_set_skips_query(self) -> None:
+        """2回目以降はデータベースに問い合わせない."""
+        dish_ids = [dish.pk for dish in self.dishes]
+        with self.assertNumQueries(1):
+            liked = liked_dishes.liked_ids(self.user, dish_ids)
+        with self.assertNumQueries(0):
+            cached = liked_dishes.liked_ids(self.user, dish_ids)
+        self.assertEqual(cached, liked)
+        self.assertEqual(liked, {self.dishes[0].pk, self.dishes[1].pk})
+
+    def test_toggle_like_invalidates(self) -> None:
+        """いいねの追加・取り消しで集合が作り直される."""
+        self.client.force_login(self.user)
+        dish_ids = [dish.pk for dish in self.dishes]
+        liked_dishes.liked_ids(self.user, dish_ids)
+
+        self.client.post(reverse("dishes:toggle_like", args=[self.dishes[2].pk]))
+        self.client.post(reverse("dishes:toggle_like", args=[self.dishes[0].pk]))
+        liked = liked_dishes.liked_ids(self.user, dish_ids)
+        self.assertEqual(liked, {self.dishes[1].pk, self.dishes[2].pk})
+
+    def test_too_many_likes_falls_back_to_query(self) -> None:
+        """上限を超えるユーザーは集合をキャッシュせず、表示中の料理IDで問い合わせる."""
+        service = LikedDishCache(max_size=1)
+        service.liked_ids(self.user, [self.dishes[0].pk])
+        with self.assertNumQueries(1):
+            liked = service.liked_ids(self.user, [self.dishes[1].pk, self.dishes[2].pk])
+        self.assertEqual(liked, {self.dishes[1].pk})
+
+    def test_settings_are_read_lazily(self) -> None:
+        """override_settingsで変更した設定が反映される."""
+        with override_settings(LIKED_DISHES_MAX_SIZE=1, LIKED_DISHES_CACHE_TIMEOUT=5):
+            self.assertEqual(liked_dishes.max_size, 1)
+            self.assertEqual(liked_dishes.timeout, 5)
+
+    def test_process_local_cache_is_reported(self) -> None:
+        """プロセスごとのキャッシュに集合を保存する設定はcheck --deployで警告する."""
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"}}
+        with override_settings(CACHES=redis):
+            shared = check_liked_dishes_cache(None)
+        local = check_liked_dishes_cache(None)
+        self.assertEqual([message.id for message in shared + local], ["dishes.W001"])
+
+    def test_anonymous_user(self) -> None:
+        """未ログインの場合は問い合わせずに空集合."""
+        with self.assertNumQueries(0):
+            liked = liked_dishes.liked_ids(AnonymousUser(), [self.dishes[0].pk])
+        self.assertEqual(liked, set())
+
+
+class ToggleLikeJsonTests(TestCase):
+    """いいねのトグルのJSON応答."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理とその作成者・いいねするユーザーを作成."""
+        cls.owner = User.objects.create_user(username="owner")
+        cls.dish = GeneratedDish.objects.create(name="料理", user=cls.owner)
+        cls.user = User.objects.create_user(username="liker")
+
+    def toggle(self, dish_id: int) -> HttpResponse:
+        """JSONを求めてトグルする."""
+        return self.client.post(
+            reverse("dishes:toggle_like", args=[dish_id]),
+            headers={"Accept": "application/json"},
+        )
+
+    def test_returns_like_state_and_count(self) -> None:
+        """いいね・取り消しのたびに新しい状態といいね数を返す."""
+        self.client.force_login(self.user)
+        self.assertJSONEqual(self.toggle(self.dish.pk).content, {"liked": True, "likes_count": 1})
+        self.assertJSONEqual(self.toggle(self.dish.pk).content, {"liked": False, "likes_count": 0})
+        self.assertFalse(Like.objects.filter(dish=self.dish).exists())
+
+    def test_own_dish(self) -> None:
+        """自分の料理にはいいねできない."""
+        self.client.force_login(self.owner)
+        response = self.toggle(self.dish.pk)
+        self.assertContains(response, "error", status_code=400)
+        self.assertFalse(Like.objects.filter(dish=self.dish).exists())
+
+    def test_anonymous_user(self) -> None:
+        """未ログインの場合はリダイレクトせずに401."""
+        response = self.toggle(self.dish.pk)
+        self.assertContains(response, "error", status_code=401)
+
+    def test_html_request_redirects(self) -> None:
+        """通常のフォーム送信ではリファラーへリダイレクトする."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("dishes:toggle_like", args=[self.dish.pk]),
+            headers={"Accept": "text/html,application/xhtml+xml,*/*;q=0.8", "Referer": "/dishes/recent/"},
+        )
+        self.assertRedirects(response, "/dishes/recent/", fetch_redirect_response=False)
+
+
+class LikeBufferTests(TestCase):
+    """いいねの書き込みバッファ."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """料理1件と、いいねするユーザー3人を作成."""
+        owner = User.objects.create_user(username="owner")
+        cls.dish = GeneratedDish.objects.create(name="料理", user=owner)
+        cls.likers = [User.objects.create_user(username=f"liker{i}") for i in range(3)]
+
+    def setUp(self) -> None:
+        """キャッシュを空にし、リクエスト中にはフラッシュしないバッファを用意する."""
+        cache.clear()
+        self.buffer = LikeBuffer(enabled=True, interval=0)
+
+    def flush(self) -> int:
+        """コミット後の処理も含めてフラッシュする."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.buffer.flush()
+
+    def test_toggles_are_deferred_and_batched(self) -> None:
+        """トグルはデータベースに書き込まず、フラッシュ時にまとめて反映する."""
+        for liker in self.likers:
+            self.buffer.toggle(liker, self.dish.pk)
+        self.assertFalse(Like.objects.filter(dish=self.dish).exists())
+        self.assertEqual(self.buffer.pending_delta(self.dish.pk), 3)
+        self.assertEqual(self.buffer.pending_count(), 3)
+
+        self.flush()
+        self.dish.refresh_from_db()
+        self.assertQuerySetEqual(
+            Like.objects.filter(dish=self.dish).values_list("user_id", flat=True),
+            [liker.pk for liker in self.likers],
+            ordered=False,
+        )
+        self.assertEqual(self.dish.likes_count, 3)
+        self.assertEqual(round(self.dish.hot_score), 3)
+        self.assertEqual(self.buffer.pending_delta(self.dish.pk), 0)
+        self.assertQuerySetEqual(
+            DishLikeRollup.objects.filter(dish=self.dish).values_list("likes", flat=True),
+            [3, 3, 3],
+            ordered=False,
+        )
+
+    def test_repeated_toggles_are_idempotent(self) -> None:
+        """同じユーザーのトグルは最後の状態だけが反映される."""
+        for _ in range(3):
+            self.buffer.toggle(self.likers[0], self.dish.pk)
+        self.buffer.toggle(self.likers[1], self.dish.pk)
+        self.buffer.toggle(self.likers[1], self.dish.pk)
+        self.assertEqual(self.buffer.pending_delta(self.dish.pk), 1)
+
+        self.flush()
+        self.dish.refresh_from_db()
+        self.assertQuerySetEqual(
+            Like.objects.filter(dish=self.dish).values_list("user", flat=True),
+            [self.likers[0].pk],
+        )
+        self.assertEqual(self.dish.likes_count, 1)
+
+    def test_unlike_existing_like(self) -> None:
+        """データベース上のいいねは取り消しとして記録され、フラッシュで削除される."""
+        Like.objects.create(dish=self.dish, user=self.likers[0])
+        liked = self.buffer.toggle(self.likers[0], self.dish.pk)
+        self.assertFalse(liked)
+        self.assertEqual(self.buffer.pending_delta(self.dish.pk), -1)
+
+        self.flush()
+        self.dish.refresh_from_db()
+        self.assertFalse(Like.objects.filter(dish=self.dish).exists())
+        self.assertEqual(self.dish.likes_count, 0)
+
+    def test_overlay_pending_toggles(self) -> None:
+        """表示する料理のいいね数といいね状態に未反映のトグルを重ねる."""
+        self.buffer.toggle(self.likers[0], self.dish.pk)
+        self.buffer.toggle(self.likers[1], self.dish.pk)
+        dishes, liked_ids = self.buffer.overlay(self.likers[0], [self.dish], set())
+        self.assertEqual(dishes[0].likes_count, 2)
+        self.assertEqual(liked_ids, {self.dish.pk})
+
+    def test_lost_ops_are_skipped_in_one_pass_and_counts_reconciled(self) -> None:
+        """GAP_TIMEOUTを過ぎた欠番は1回のフラッシュでまとめて飛ばし、いいね数をデータベースの値から数え直す."""
+        for liker in self.likers:
+            self.buffer.toggle(liker, self.dish.pk)
+        # 先頭2件の操作ログが失われた状態にする
+        cache.delete_many([self.buffer.key("op", 1), self.buffer.key("op", 2)])
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.buffer.pending_count(), 3)
+
+        later = time.time() + GAP_TIMEOUT
+        with mock.patch("dishes.like_buffer.time", time=lambda: later, monotonic=time.monotonic):
+            flushed = self.flush()
+        self.dish.refresh_from_db()
+        dishes, liked_ids = self.buffer.overlay(self.likers[0], [self.dish], set())
+        self.assertEqual(flushed, 3)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(self.buffer.generation(), 1)
+        self.assertEqual(dishes[0].likes_count, 1)
+        self.assertEqual(liked_ids, set())
+        self.assertQuerySetEqual(Like.objects.values_list("user", flat=True), [self.likers[2].pk])
+
+    def test_flush_stops_before_lock_expires(self) -> None:
+        """FLUSH_TIME_LIMITを過ぎたら残りは次回に回し、他のプロセスが取り直したロックは消さない."""
+        for liker in self.likers:
+            self.buffer.toggle(liker, self.dish.pk)
+        lock_key = self.buffer.key("lock")
+        clock = mock.Mock(side_effect=[0, 0, FLUSH_TIME_LIMIT])
+        with mock.patch("dishes.like_buffer.time", time=time.time, monotonic=clock):
+            flushed = self.buffer.flush(batch_size=1)
+        self.assertEqual(flushed, 1)
+        self.assertEqual(self.buffer.pending_count(), 2)
+        self.assertIsNone(cache.get(lock_key))
+
+        original = self.buffer._flush_batch  # noqa: SLF001
+
+        def flush_batch_after_lock_expired(batch_size: int) -> tuple[int, int]:
+            cache.set(lock_key, "other")
+            return original(batch_size)
+
+        with mock.patch.object(self.buffer, "_flush_batch", side_effect=flush_batch_after_lock_expired):
+            self.buffer.flush()
+        self.assertEqual(cache.get(lock_key), "other")
+
+    def test_culling_cache_is_refused(self) -> None:
+        """プロセスごとのキャッシュや古い値を捨てるキャッシュで有効にするとエラーになる."""
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"}}
+        with override_settings(LIKE_BUFFER=True):
+            local = check_like_buffer_cache(None)
+            with override_settings(CACHES=redis):
+                shared = check_like_buffer_cache(None)
+        disabled = check_like_buffer_cache(None)
+        self.assertEqual([message.id for message in local + shared + disabled], ["dishes.E001"])
+
+    def test_concurrent_toggles_flip_once_each(self) -> None:
+        """同じユーザーの同時のトグルは、両方が初期状態を読んでいても1回ずつ反転し、増減は打ち消し合う."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def liked_ids_after_both_read(*_args: object) -> set[int]:
+            barrier.wait()
+            return set()
+
+        with (
+            mock.patch.object(liked_dishes, "liked_ids", side_effect=liked_ids_after_both_read),
+            ThreadPoolExecutor(2) as executor,
+        ):
+            results = list(executor.map(lambda _: self.buffer.toggle(self.likers[0], self.dish.pk), range(2)))
+        self.assertCountEqual(results, [True, False])
+        self.assertEqual(self.buffer.pending_delta(self.dish.pk), 0)
+
+        self.flush()
+        _, liked_ids = self.buffer.overlay(self.likers[0], [self.dish], set())
+        self.assertEqual(liked_ids, set())
+        self.assertFalse(Like.objects.filter(dish=self.dish).exists())
+
+    def test_request_flushes_one_batch(self) -> None:
+        """リクエストの処理中のフラッシュは1バッチだけで、残りは後に回す."""
+        for liker in self.likers:
+            self.buffer.toggle(liker, self.dish.pk)
+        LikeBuffer(enabled=True, batch_size=1, interval=60).toggle(self.likers[0], self.dish.pk)
+        self.assertEqual(self.buffer.pending_count(), 3)
+        self.assertEqual(Like.objects.filter(dish=self.dish).count(), 1)
+
+    def test_lost_delta_is_not_recreated(self) -> None:
+        """未反映の増減が失われていた場合は負の値で作り直さず、世代を進めてデータベースの値から数え直す."""
+        self.buffer.toggle(self.likers[0], self.dish.pk)
+        delta_key = self.buffer.key("delta", 0, self.dish.pk)
+        cache.delete(delta_key)
+        self.assertEqual(self.flush(), 1)
+        self.assertIsNone(cache.get(delta_key))
+        self.assertEqual(self.buffer.generation(), 1)
+        self.assertEqual(self.buffer.pending_delta(self.dish.pk), 0)
+        self.assertEqual(Like.objects.filter(dish=self.dish).count(), 1)
+
+    def test_settings_are_read_lazily(self) -> None:
+        """override_settingsで変更した設定が反映される."""
+        with override_settings(LIKE_BUFFER=True, LIKE_BUFFER_BATCH_SIZE=7, LIKE_BUFFER_FLUSH_INTERVAL=0):
+            self.assertTrue(like_buffer.enabled)
+            self.assertEqual(like_buffer.batch_size, 7)
+            self.assertEqual(like_buffer.interval, 0)
+        self.assertFalse(like_buffer.enabled)
+
+    def test_toggle_view_uses_buffer(self) -> None:
+        """有効な場合、いいねのJSON応答には未反映のいいねを含むいいね数を返す."""
+        self.client.force_login(self.likers[0])
+        with override_settings(LIKE_BUFFER=True, LIKE_BUFFER_FLUSH_INTERVAL=0):
+            like_buffer.toggle(self.likers[1], self.dish.pk)
+            response = self.client.post(
+                reverse("dishes:toggle_like", args=[self.dish.pk]),
+                headers={"Accept": "application/json"},
+            )
+        self.assertJSONEqual(response.content, {"liked": True, "likes_count": 2})
+        self.assertFalse(Like.objects.filter(dish=self.dish).exists())
+
+
+class SaveDishTests(TestCase):
+    """生成した料理の保存."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """材料2件を持つユーザーを作成."""
+        cls.user = User.objects.create_user(username="cook")
+        cls.ingredients = [Ingredient.objects.create(name=f"材料{i}", user=cls.user) for i in range(2)]
+
+    def setUp(self) -> None:
+        """キャッシュを空にしてログインする."""
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_bulk_save_creates_dishes_with_ingredients(self) -> None:
+        """料理名ごとに料理を作成し、材料・材料名・ランキングに反映する."""
+        leaderboard.board()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("dishes:bulk_save"),
+                {"dish_names": ["料理A", "料理B", " 料理A "], "ingredient_ids": [ing.pk for ing in self.ingredients]},
+            )
+
+        dishes = GeneratedDish.objects.order_by("name")
+        self.assertQuerySetEqual(
+            dishes.values_list("name", "user", "ingredient_names"),
+            [
+                ("料理A", self.user.pk, ["材料1", "材料0"]),
+                ("料理B", self.user.pk, ["材料1", "材料0"]),
+            ],
+        )
+        for dish in dishes:
+            self.assertQuerySetEqual(dish.ingredients.all(), self.ingredients, ordered=False)
+        # 作成時のインスタンスから、データベースに問い合わせずにランキングへ追加する
+        board = leaderboard.board()
+        self.assertCountEqual([card.id for card in board.entries], dishes.values_list("pk", flat=True))
+        self.assertEqual(board.total, 2)
+
+    def test_bulk_save_form_validation(self) -> None:
+        """料理名の件数・長さと、自分の材料であることを検証する."""
+        ingredient_ids = [str(ing.pk) for ing in self.ingredients]
+        others = Ingredient.objects.create(name="他人の材料", user=User.objects.create_user("other"))
+        cases = {
+            "空の料理名": ([" ", ""], ingredient_ids, "dish_names"),
+            "件数超過": ([f"料理{i}" for i in range(MAX_BULK_SAVE_COUNT + 1)], ingredient_ids, "dish_names"),
+            "長すぎる料理名": (["あ" * 1000], ingredient_ids, "dish_names"),
+            "他人の材料": (["料理A"], [str(others.pk), "x"], "ingredient_ids"),
+        }
+        for label, (names, ids, field) in cases.items():
+            with self.subTest(label):
+                form = BulkSaveDishForm(self.user.pk, MultiValueDict({"dish_names": names, "ingredient_ids": ids}))
+                self.assertFalse(form.is_valid())
+                self.assertEqual(list(form.errors), [field])
+
+        # 上限ちょうどの件数は受け付け、空白と重複を除く
+        names = [f"料理{i}" for i in range(MAX_BULK_SAVE_COUNT)] + [" 料理0 "]
+        form = BulkSaveDishForm(self.user.pk, MultiValueDict({"dish_names": names, "ingredient_ids": ingredient_ids}))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["dish_names"], names[:-1])
+
+    def test_bulk_create_query_count_is_constant(self) -> None:
+        """料理の件数によらず、料理と中間テーブルの行をそれぞれ1文で作成する."""
+        ingredients = ingredient_cache.get(self.user.pk)
+        for count in (1, 20):
+            with self.assertNumQueries(4):
+                GeneratedDish.objects.bulk_create_with_ingredients(
+                    self.user,
+                    [f"料理{i}" for i in range(count)],
+                    ingredients,
+                )
+        self.assertEqual(GeneratedDish.ingredients.through.objects.count(), 42)
+
+    def delete_behind_snapshot(self) -> Ingredient:
+        """材料を削除し、他のプロセスのように削除前のスナップショットをキャッシュに残す."""
+        stale = ingredient_cache.get(self.user.pk)
+        deleted = self.ingredients[0]
+        Ingredient.objects.filter(pk=deleted.pk).delete()
+        cache.set(ingredient_cache.key(self.user.pk), stale)
+        return deleted
+
+    def test_save_ignores_ingredient_deleted_behind_snapshot(self) -> None:
+        """スナップショットに残った削除済みの材料は保存しない."""
+        deleted = self.delete_behind_snapshot()
+        kept = self.ingredients[1]
+        self.client.post(reverse("dishes:save"), {"dish_name": "料理", "ingredient_ids": [deleted.pk, kept.pk]})
+        self.client.post(reverse("dishes:save"), {"dish_name": "削除済みのみ", "ingredient_ids": [deleted.pk]})
+
+        dish = GeneratedDish.objects.get()
+        self.assertQuerySetEqual(dish.ingredients.all(), [kept])
+        self.assertEqual(dish.ingredient_names, [kept.name])
+
+    def test_bulk_save_ignores_ingredient_deleted_behind_snapshot(self) -> None:
+        """一括保存でもスナップショットに残った削除済みの材料は保存しない."""
+        deleted = self.delete_behind_snapshot()
+        response = self.client.post(
+            reverse("dishes:bulk_save"),
+            {"dish_names": ["料理"], "ingredient_ids": [deleted.pk]},
+        )
+        self.assertRedirects(response, reverse("dishes:generate"), fetch_redirect_response=False)
+        self.assertFalse(GeneratedDish.objects.exists())
+
+
+class DishQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """料理アプリの全URLのクエリ数の上限."""
+
+    urlconf = "dishes.urls"
+    budgets: ClassVar[list[QueryBudget]] = [
+        QueryBudget("list", 0, 5, paginated_view=DishListView),
+        QueryBudget("generate", 0, 3),
+        QueryBudget("generate", 0, 3, method="post"),
+        QueryBudget(
+            "save",
+            0,
+            7,
+            method="post",
+            data=lambda t: {"dish_name": "新しい料理", "ingredient_ids": [t.ingredient.pk]},
+        ),
+        QueryBudget(
+            "bulk_save",
+            0,
+            7,
+            method="post",
+            data=lambda t: {"dish_names": ["新しい料理1", "新しい料理2"], "ingredient_ids": [t.ingredient.pk]},
+        ),
+        QueryBudget("ranking", 1, 4, paginated_view=RankingListView),
+        QueryBudget("trending", 1, 4, kwargs=lambda _t: {"period": "hot"}, paginated_view=TrendingListView),
+        QueryBudget(
+            "period_ranking",
+            1,
+            4,
+            kwargs=lambda _t: {"period": "week"},
+            paginated_view=PeriodRankingListView,
+        ),
+        QueryBudget("recent", 2, 5, paginated_view=RecentDishesView),
+        # 取り消しは行をロックして読み直すため、SAVEPOINT・SELECT ... FOR UPDATE・RELEASEの3クエリが加わる
+        QueryBudget("toggle_like", 0, 12, method="post", kwargs=lambda t: {"dish_id": t.other_dish.pk}),
+        QueryBudget(
+            "toggle_like",
+            0,
+            13,
+            method="post",
+            kwargs=lambda t: {"dish_id": t.other_dish.pk},
+            headers={"Accept": "application/json"},
+        ),
+        QueryBudget("delete", 0, 4, kwargs=lambda t: {"dish_id": t.dish.pk}),
+        QueryBudget("delete", 0, 10, method="post", kwargs=lambda t: {"dish_id": t.dish.pk}),
+        QueryBudget("demo", 0, 2),
+        QueryBudget("demo", 0, 2, method="post", data=lambda _t: {"ingredients": "卵,ネギ,チーズ"}),
+    ]
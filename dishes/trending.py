@@ -0,0 +1,115 @@
+"""時間減衰するトレンドスコア.
+
+いいね1件の重みを経過時間に応じて指数関数的に減らしたスコアで、急上昇・デイリー・ウィークリーの
+ランキングを作る。スコアはGeneratedDishの列に保持し、いいねのたびに単一のUPDATE文で差分更新するため、
+ランキングの表示時にLikeテーブルを集計する必要はなく、インデックスを1回読むだけで済む。
+
+各行のスコアは、その行のtrending_at (UNIX時刻) 時点の値を表す。いいねされた行は更新時に現在時刻まで
+減衰させるが、いいねのない行は古い時刻のまま残り、実際より高い値で並ぶ。
+decay_trendingコマンドで定期的に全行を同じ時刻まで減衰させ、このずれを実行間隔以内に抑える。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, NamedTuple
+
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Exp
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from django.db.models import Expression
+
+# これ未満になったスコアは0にする. ランキングから外れ、定期的な減衰の対象からも外れる
+MIN_SCORE = 1e-3
+# スコアの基準時刻の列
+CLOCK_FIELD = "trending_at"
+
+
+class TrendingPeriod(NamedTuple):
+    """トレンドランキングの種類."""
+
+    # スコアの列名
+    field: str
+    title: str
+    description: str
+    # 時定数. 単位は秒. いいね1件の重みがこの時間で1/eになる
+    time_constant: float
+
+    @property
+    def ordering(self) -> tuple[str, ...]:
+        """ランキングの並び順. 対応するインデックスと一致させること."""
+        return (f"-{self.field}", "-created_at", "-id")
+
+    @property
+    def horizon(self) -> float:
+        """いいね1件の重みがMIN_SCORE未満になるまでの時間 (秒)."""
+        return self.time_constant * math.log(1 / MIN_SCORE)
+
+
+TRENDING_PERIODS: dict[str, TrendingPeriod] = {
+    "hot": TrendingPeriod("hot_score", "急上昇", "ここ数時間でいいねが集まっている料理", 3 * 60 * 60),
+    "daily": TrendingPeriod("daily_score", "デイリー", "直近1日ほどでいいねが集まっている料理", 24 * 60 * 60),
+    "weekly": TrendingPeriod(
+        "weekly_score",
+        "ウィークリー",
+        "直近1週間ほどでいいねが集まっている料理",
+        7 * 24 * 60 * 60,
+    ),
+}
+# 最も時定数が長いスコア. 他のスコアより小さくなることはないため、残っている行の判定に使う
+LONGEST_PERIOD = max(TRENDING_PERIODS.values(), key=lambda period: period.time_constant)
+
+
+def timestamp(value: datetime | None = None) -> float:
+    """日時をスコアの基準時刻 (UNIX時刻) に変換する. 省略時は現在時刻."""
+    return (value or timezone.now()).timestamp()
+
+
+def decayed(period: TrendingPeriod, now: float) -> Expression:
+    """行のスコアをnow時点まで減衰させた値を表す式."""
+    return F(period.field) * Exp((F(CLOCK_FIELD) - now) / period.time_constant)
+
+
+def floored(expression: Expression) -> Expression:
+    """MIN_SCORE未満を0にする式. 浮動小数点の誤差による負の値も0になる."""
+    return Case(When(GreaterThanOrEqual(expression, MIN_SCORE), then=expression), default=Value(0.0))
+
+
+def decay_updates(now: float) -> dict[str, Expression | float]:
+    """全スコアをnow時点まで減衰させるUPDATEの値."""
+    return {period.field: floored(decayed(period, now)) for period in TRENDING_PERIODS.values()} | {CLOCK_FIELD: now}
+
+
+def like_updates(delta: int, liked_at: float, now: float) -> dict[str, Expression | float]:
+    """いいねの追加・削除をスコアに反映するUPDATEの値.
+
+    スコアをnow時点まで減衰させてから、いいね1件のnow時点での重みを加減する。
+    削除時はいいねの作成時刻から減衰させた重みを引くため、追加時に足した分だけが取り除かれる。
+
+    Args:
+        delta: 追加時は1、削除時は-1
+        liked_at: いいねの作成時刻 (UNIX時刻)
+        now: 現在時刻 (UNIX時刻)
+    """
+    updates: dict[str, Expression | float] = {
+        period.field: floored(
+            decayed(period, now) + delta * math.exp(min(liked_at - now, 0) / period.time_constant),
+        )
+        for period in TRENDING_PERIODS.values()
+    }
+    updates[CLOCK_FIELD] = now
+    return updates
+
+
+def like_scores(liked_at: list[float], now: float) -> dict[str, float]:
+    """いいねの作成時刻の一覧から、now時点の各スコアを計算する."""
+    scores = {}
+    for period in TRENDING_PERIODS.values():
+        score = sum(math.exp(min(at - now, 0) / period.time_constant) for at in liked_at)
+        scores[period.field] = score if score >= MIN_SCORE else 0.0
+    return scores
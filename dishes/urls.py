@@ -10,7 +10,10 @@ urlpatterns = [
     path("", views.DishListView.as_view(), name="list"),
     path("generate/", views.DishGenerateView.as_view(), name="generate"),
     path("save/", views.SaveDishView.as_view(), name="save"),
+    path("save/bulk/", views.BulkSaveDishView.as_view(), name="bulk_save"),
     path("ranking/", views.RankingListView.as_view(), name="ranking"),
+    path("ranking/<slug:period>/", views.TrendingListView.as_view(), name="trending"),
+    path("ranking/period/<slug:period>/", views.PeriodRankingListView.as_view(), name="period_ranking"),
     path("recent/", views.RecentDishesView.as_view(), name="recent"),
     path("<int:dish_id>/like/", views.ToggleLikeView.as_view(), name="toggle_like"),
     path("<int:dish_id>/delete/", views.DishDeleteView.as_view(), name="delete"),
@@ -2,14 +2,20 @@
 
 from __future__ import annotations
 
+import itertools
+import math
 import random  # 暗号学的用途ではないため問題なし
+import string
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
 
 # 定数定義
-MIN_INGREDIENTS = 2
-MAX_INGREDIENTS = 4
 MIN_INGREDIENTS_FOR_PAIR = 2
 DISH_TYPE_PROBABILITY = 0.3  # 料理タイプを使用する確率 (30%)
-MAX_ATTEMPTS_MULTIPLIER = 10  # 無限ループを防ぐ試行回数の倍率
+ALLOCATION_DRAW_SIZE = 1024  # 生成数の割り当てで1回に抽選する件数 (生成数によらずメモリ使用量を一定にする)
 
 # 料理名生成テンプレート
 DISH_NAME_TEMPLATES = [
@@ -70,78 +76,373 @@ DISH_TYPES = [
     "ポシェ",
 ]
 
+# デモ用のテンプレートと接尾語. トップページのデモAPIで使用する
+DEMO_DISH_NAME_TEMPLATES = [
+    "{0}と{1}の{2}",
+    "{0}入り{1}{2}",
+    "秘伝の{0}{1}{2}",
+    "{0}風{1}の{2}",
+    "幻の{0}{1}{2}",
+    "{0}香る{1}{2}",
+    "謎の{0}{1}{2}",
+    "伝説の{0}と{1}の{2}",
+]
+
+DEMO_DISH_TYPES = [
+    "爆弾",
+    "スープ",
+    "炒め",
+    "煮込み",
+    "焼き",
+    "蒸し",
+    "サラダ",
+    "パスタ",
+    "カレー",
+    "丼",
+    "鍋",
+    "グラタン",
+    "フライ",
+    "天ぷら",
+    "寿司",
+    "おにぎり",
+    "闇鍋",
+    "怪物",
+    "伝説",
+    "奇跡",
+    "魔法",
+    "究極",
+    "至高",
+    "禁断",
+    "混沌",
+    "神秘",
+    "異次元",
+    "宇宙",
+]
+
+DEFAULT_TEMPLATE_SET = "standard"
+
+
+@dataclass(frozen=True, slots=True)
+class TemplateSlots:
+    """テンプレートと、そのプレースホルダーへの割り当て方の組み合わせ.
+
+    プレースホルダーは先頭から材料で埋め、type_slotsが1の場合は最後の1つを料理タイプで埋める。
+    """
+
+    template: str
+    ingredient_slots: int
+    type_slots: int
+    weight: float
+
+    def size(self, ingredient_count: int, type_count: int) -> int:
+        """この組み合わせで作れる料理名の数 (材料は重複なしの順列)."""
+        return math.perm(ingredient_count, self.ingredient_slots) * type_count**self.type_slots
+
+    def decode(self, index: int, ingredient_names: Sequence[str], dish_types: Sequence[str]) -> str:
+        """0 <= index < size の通し番号を料理名に変換する."""
+        args: list[str] = []
+        if self.type_slots:
+            index, type_index = divmod(index, len(dish_types))
+        picked: list[int] = []
+        for position in range(self.ingredient_slots):
+            index, rank = divmod(index, len(ingredient_names) - position)
+            # 未使用の材料の中でrank番目のものを選ぶ
+            for used in sorted(picked):
+                if rank >= used:
+                    rank += 1
+            picked.append(rank)
+            args.append(ingredient_names[rank])
+        if self.type_slots:
+            args.append(dish_types[type_index])
+        return self.template.format(*args)
+
+
+def shuffled_range(size: int, rng: random.Random) -> Iterator[int]:
+    """0からsize-1までの整数を重複なくランダムな順で返す.
+
+    2のべき乗の範囲上の全単射 (乗算とxorshiftの組み合わせ) で番号を並べ替え、
+    範囲外の値を読み飛ばす。リストを作らないため件数によらずメモリ使用量は一定。
+    """
+    bits = max(size - 1, 1).bit_length()
+    mask = (1 << bits) - 1
+    shift = max(bits // 2, 1)
+    multiplier1 = rng.getrandbits(bits) | 1
+    offset = rng.getrandbits(bits)
+    multiplier2 = rng.getrandbits(bits) | 1
+    for i in range(mask + 1):
+        x = (i * multiplier1 + offset) & mask
+        x ^= x >> shift
+        x = (x * multiplier2) & mask
+        x ^= x >> shift
+        if x < size:
+            yield x
+
+
+def template_arity(template: str) -> int:
+    """テンプレート内のプレースホルダーの数を返す."""
+    return len({field for _, field, _, _ in string.Formatter().parse(template) if field is not None})
+
+
+class DishNameEngine:
+    """料理名の一括生成エンジン.
+
+    テンプレートはプレースホルダー数ごとに事前に解析しておき、
+    (テンプレート, 材料の順列, 料理タイプ) の組み合わせ全体に通し番号を振る。
+    各組み合わせへの生成数を先に一括で割り当て、通し番号を重複なしで取り出すことで、
+    再試行なしで重複のない組み合わせを返す。異なる組み合わせが同じ文字列になった分はgenerateで補う。
+    """
+
+    def __init__(
+        self,
+        templates: Sequence[str],
+        dish_types: Sequence[str],
+        dish_type_probability: float = DISH_TYPE_PROBABILITY,
+    ) -> None:
+        """テンプレートを解析して組み合わせ表を作成する."""
+        self.dish_types = tuple(dish_types)
+        self.templates_by_arity: dict[int, tuple[str, ...]] = {
+            arity: tuple(group)
+            for arity, group in itertools.groupby(sorted(templates, key=template_arity), key=template_arity)
+        }
+        template_weight = 1 / len(templates) if templates else 0
+        slots: list[TemplateSlots] = []
+        for arity, group in self.templates_by_arity.items():
+            for template in group:
+                if arity >= 3:  # noqa: PLR2004
+                    slots.append(TemplateSlots(template, arity - 1, 1, template_weight))
+                elif arity == 2:  # noqa: PLR2004
+                    # 2つ目を材料にするか料理タイプにするかをDISH_TYPE_PROBABILITYで振り分ける
+                    slots.append(TemplateSlots(template, 2, 0, template_weight * (1 - dish_type_probability)))
+                    slots.append(TemplateSlots(template, 1, 1, template_weight * dish_type_probability))
+                else:
+                    slots.append(TemplateSlots(template, arity, 0, template_weight))
+        if not self.dish_types:
+            slots = [slot for slot in slots if not slot.type_slots]
+        self.slots = tuple(slot for slot in slots if slot.weight > 0)
+        self.cum_weights = tuple(itertools.accumulate(slot.weight for slot in self.slots))
+
+    def combination_count(self, ingredient_count: int) -> int:
+        """材料数に対して生成可能な料理名の総数を返す."""
+        return sum(slot.size(ingredient_count, len(self.dish_types)) for slot in self.slots)
+
+    def _allocate(self, sizes: list[int], count: int, rng: random.Random) -> list[int]:
+        """生成数を重みに従って各組み合わせへ割り当てる (各組み合わせの総数が上限).
+
+        抽選はALLOCATION_DRAW_SIZE件ずつ行い、生成数に比例するリストを作らない。
+        """
+        if count >= sum(sizes):
+            return list(sizes)
+        allocation = [0] * len(sizes)
+        remaining = max(count, 0)
+        while remaining:
+            candidates = [i for i, size in enumerate(sizes) if allocation[i] < size]
+            weights = [self.slots[i].weight for i in candidates]
+            for i in rng.choices(candidates, weights=weights, k=min(remaining, ALLOCATION_DRAW_SIZE)):
+                if allocation[i] < sizes[i]:
+                    allocation[i] += 1
+                    remaining -= 1
+        return allocation
+
+    def iter_names(
+        self,
+        ingredient_names: Sequence[str],
+        count: int,
+        rng: random.Random | None = None,
+    ) -> Iterator[str]:
+        """料理名を最大count件、順に生成する.
+
+        (テンプレート, 材料, 料理タイプ) の組み合わせは重複しない。
+        組み合わせの総数がcount未満の場合は総数分だけ生成する。
 
-def generate_dish_name(ingredient_names: list[str]) -> str:
+        Args:
+            ingredient_names: 使用する材料名のリスト (重複なし)
+            count: 生成する料理名の数
+            rng: 乱数生成器 (シード固定で再現したい場合に指定)
+
+        Yields:
+            生成された料理名
+
+        Raises:
+            ValueError: countが負の場合
+        """
+        if count < 0:
+            msg = "生成する料理名の数は0以上で指定してください。"
+            raise ValueError(msg)
+        rng = rng or random.Random()  # noqa: S311
+        sizes = [slot.size(len(ingredient_names), len(self.dish_types)) for slot in self.slots]
+        allocation = self._allocate(sizes, count, rng)
+
+        # 組み合わせごとに通し番号を重複なしのランダム順で取り出す
+        pools = [itertools.islice(shuffled_range(size, rng), k) for size, k in zip(sizes, allocation, strict=True)]
+        remaining = list(allocation)
+        total = sum(remaining)
+        while total:
+            # 残り件数に比例して次に出す組み合わせを選ぶ. 結果として全体がシャッフルされる
+            pick = rng.randrange(total)
+            for i, k in enumerate(remaining):  # noqa: B007
+                if pick < k:
+                    break
+                pick -= k
+            remaining[i] -= 1
+            total -= 1
+            yield self.slots[i].decode(next(pools[i]), ingredient_names, self.dish_types)
+
+    def pick(self, ingredient_names: Sequence[str], rng: random.Random | None = None) -> str | None:
+        """料理名を1件だけ生成する (一括生成の割り当て処理を省いた高速版).
+
+        Returns:
+            生成された料理名。生成できる組み合わせがない場合はNone
+        """
+        rng = rng or _default_rng
+        if self.slots:
+            slot = rng.choices(self.slots, cum_weights=self.cum_weights)[0]
+            size = slot.size(len(ingredient_names), len(self.dish_types))
+            if size:
+                return slot.decode(rng.randrange(size), ingredient_names, self.dish_types)
+        # 材料が少なく選ばれた組み合わせが作れない場合は作れるものから選ぶ
+        return next(self.iter_names(ingredient_names, 1, rng), None)
+
+    def generate(
+        self,
+        ingredient_names: Sequence[str],
+        count: int,
+        rng: random.Random | None = None,
+    ) -> list[str]:
+        """重複のない料理名のリストを最大count件返す. 重複の除き方はiter_unique_namesと同じ.
+
+        Raises:
+            ValueError: countが負の場合
+        """
+        return list(self.iter_unique_names(ingredient_names, count, rng))
+
+    def iter_unique_names(
+        self,
+        ingredient_names: Sequence[str],
+        count: int,
+        rng: random.Random | None = None,
+    ) -> Iterator[str]:
+        """重複のない料理名を最大count件、順に生成する.
+
+        異なるテンプレートの組み合わせが同じ文字列になることがあるため、生成済みの料理名を覚えて重複を除き、
+        不足した分は全ての組み合わせをランダムな順に見て補う。重複のない料理名がcount件作れない場合は作れる分だけ生成する。
+        生成済みの料理名を保持するため、メモリ使用量はcountに比例する。
+
+        Raises:
+            ValueError: countが負の場合
+        """
+        rng = rng or random.Random()  # noqa: S311
+        unique_names = list(dict.fromkeys(ingredient_names))
+        if count <= 0:
+            yield from self.iter_names(unique_names, count, rng)
+            return
+        # 補う分の生成器は最初の生成器を使い切ってから乱数を使い始める
+        candidates = itertools.chain(
+            self.iter_names(unique_names, count, rng),
+            self.iter_names(unique_names, self.combination_count(len(unique_names)), rng),
+        )
+        seen: set[str] = set()
+        for name in candidates:
+            if name in seen:
+                continue
+            seen.add(name)
+            yield name
+            if len(seen) == count:
+                return
+
+
+_default_rng = random.Random()  # noqa: S311
+
+# テンプレートセットの登録簿 (名前 -> 解析済みエンジン)
+_template_sets: dict[str, DishNameEngine] = {}
+
+
+def register_template_set(
+    name: str,
+    templates: Sequence[str],
+    dish_types: Sequence[str],
+    dish_type_probability: float = DISH_TYPE_PROBABILITY,
+) -> DishNameEngine:
+    """テンプレートセットを解析して登録する.
+
+    同じ名前で登録した場合は上書きする。settings.DISH_TEMPLATE_SETSに定義したセットは
+    アプリ起動時にこの関数で登録される。
+
+    Returns:
+        登録したエンジン
+    """
+    engine = DishNameEngine(templates, dish_types, dish_type_probability)
+    _template_sets[name] = engine
+    return engine
+
+
+def get_template_set(name: str = DEFAULT_TEMPLATE_SET) -> DishNameEngine:
+    """登録済みのテンプレートセットを返す.
+
+    Raises:
+        ValueError: 未登録の名前が指定された場合
+    """
+    try:
+        return _template_sets[name]
+    except KeyError:
+        msg = f"テンプレートセット「{name}」は登録されていません。"
+        raise ValueError(msg) from None
+
+
+def template_set_names() -> list[str]:
+    """登録済みのテンプレートセット名を返す."""
+    return sorted(_template_sets)
+
+
+STANDARD_ENGINE = register_template_set(DEFAULT_TEMPLATE_SET, DISH_NAME_TEMPLATES, DISH_TYPES)
+DEMO_ENGINE = register_template_set("demo", DEMO_DISH_NAME_TEMPLATES, DEMO_DISH_TYPES)
+
+
+def generate_dish_name(ingredient_names: list[str], template_set: str = DEFAULT_TEMPLATE_SET) -> str:
     """材料名から架空の料理名を生成する.
 
     Args:
         ingredient_names: 使用する材料名のリスト
+        template_set: 使用するテンプレートセット名
 
     Returns:
         生成された料理名
 
     Raises:
-        ValueError: 材料が不足している場合
+        ValueError: 材料が不足している場合、材料から料理名を生成できない場合、またはテンプレートセットが未登録の場合
     """
-    if len(ingredient_names) < MIN_INGREDIENTS_FOR_PAIR:
+    if len(set(ingredient_names)) < MIN_INGREDIENTS_FOR_PAIR:
         msg = "料理を生成するには少なくとも2つの材料が必要です。"
         raise ValueError(msg)
 
-    # 材料を2-4個ランダムに選択(最大で利用可能な材料数まで)
-    num_ingredients = min(random.randint(MIN_INGREDIENTS, MAX_INGREDIENTS), len(ingredient_names))  # noqa: S311
-    selected_ingredient_names = random.sample(ingredient_names, num_ingredients)
-
-    # テンプレートをランダム選択
-    template = random.choice(DISH_NAME_TEMPLATES)  # noqa: S311
-
-    # テンプレートに応じて料理名を生成
-    if "{2}" in template:
-        # 3つのプレースホルダーがある場合
-        if len(selected_ingredient_names) >= MIN_INGREDIENTS_FOR_PAIR:
-            dish_type = random.choice(DISH_TYPES)  # noqa: S311
-            return template.format(selected_ingredient_names[0], selected_ingredient_names[1], dish_type)
-        return template.format(selected_ingredient_names[0], selected_ingredient_names[0], random.choice(DISH_TYPES))  # noqa: S311
-
-    if "{1}" in template:
-        # 2つのプレースホルダーがある場合
-        if len(selected_ingredient_names) >= MIN_INGREDIENTS_FOR_PAIR:
-            # 時々料理タイプを2番目の材料の代わりに使用
-            if random.random() < DISH_TYPE_PROBABILITY:  # noqa: S311
-                return template.format(selected_ingredient_names[0], random.choice(DISH_TYPES))  # noqa: S311
-            return template.format(selected_ingredient_names[0], selected_ingredient_names[1])
-        return template.format(selected_ingredient_names[0], random.choice(DISH_TYPES))  # noqa: S311
-
-    # 1つのプレースホルダーまたはプレースホルダーなし
-    return template.format(selected_ingredient_names[0])
+    dish_name = get_template_set(template_set).pick(list(dict.fromkeys(ingredient_names)))
+    if dish_name is None:
+        msg = "この材料からは料理名を生成できません。"
+        raise ValueError(msg)
+    return dish_name
 
 
 def generate_multiple_dish_names(
     ingredient_names: list[str],
     count: int = 3,
+    rng: random.Random | None = None,
+    template_set: str = DEFAULT_TEMPLATE_SET,
 ) -> list[str]:
     """複数の料理名を生成する.
 
     Args:
         ingredient_names: 使用する材料名のリスト
         count: 生成する料理名の数
+        rng: 乱数生成器 (シード固定で再現したい場合に指定)
+        template_set: 使用するテンプレートセット名
 
     Returns:
-        生成された料理名のリスト
+        重複のない料理名のリスト (重複のない料理名がcount件作れない場合は作れる分だけ)
+
+    Raises:
+        ValueError: 材料が不足している場合、countが負の場合、またはテンプレートセットが未登録の場合
     """
-    if len(ingredient_names) < MIN_INGREDIENTS_FOR_PAIR:
+    if len(set(ingredient_names)) < MIN_INGREDIENTS_FOR_PAIR:
         msg = "料理を生成するには少なくとも2つの材料が必要です。"
         raise ValueError(msg)
 
-    generated_names = set()
-    max_attempts = count * MAX_ATTEMPTS_MULTIPLIER  # 無限ループを防ぐ
-    attempts = 0
-
-    while len(generated_names) < count and attempts < max_attempts:
-        try:
-            name = generate_dish_name(ingredient_names)
-            generated_names.add(name)
-        except ValueError:
-            break
-        attempts += 1
-
-    return list(generated_names)
+    return get_template_set(template_set).generate(ingredient_names, count, rng)
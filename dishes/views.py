@@ -2,20 +2,27 @@
 
 from typing import Any
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.generic import (
     ListView,
     View,
 )
 
-from ingredients.models import Ingredient
+from ingredients.cache import ingredient_cache
 
-from .forms import DishGenerationForm
-from .models import GeneratedDish, Like
+from .forms import BulkSaveDishForm, DishGenerationForm
+from .leaderboard import RANKING_ORDERING, leaderboard
+from .like_buffer import like_buffer
+from .liked import liked_dishes
+from .models import LISTING_FIELDS, ROLLUP_RANKING_ORDERING, DishLikeRollup, GeneratedDish, Like
+from .pagination import CURSOR_QUERY_PARAM, KeysetPaginationMixin, apaginate_keyset
+from .rollups import RollupPeriod
+from .trending import TRENDING_PERIODS, TrendingPeriod
 from .utils import generate_multiple_dish_names
 
 
@@ -34,39 +41,168 @@ class DishListView(LoginRequiredMixin, ListView):
         )
 
 
-class RankingListView(ListView):
+class AsyncDishListView(KeysetPaginationMixin, ListView):
+    """公開料理一覧の非同期ビュー(ログイン不要).
+
+    ページングといいね情報の取得を非同期ORMで行い、ワーカースレッドを占有しない。
+    """
+
+    async def get(self, request: HttpRequest, *_args: object, **_kwargs: object) -> HttpResponse:
+        """GETリクエストの処理."""
+        # テンプレート描画時に同期側で再取得しないよう、取得済みのユーザーを設定
+        request.user = await request.auser()
+        self.object_list = self.get_queryset()
+        self.pagination = await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        context = self.get_context_data()
+        liked_ids = await liked_dishes.aliked_ids(request.user, [dish.id for dish in context["dishes"]])
+        # いいねの書き込みバッファが有効な場合は未反映のトグルを重ねる
+        context["dishes"], context["user_liked_dish_ids"] = await like_buffer.aoverlay(
+            request.user,
+            context["dishes"],
+            liked_ids,
+        )
+        return self.render_to_response(context)
+
+
+class RankingListView(AsyncDishListView):
     """料理ランキングビュー(ログイン不要)."""
 
     model = GeneratedDish
     template_name = "dishes/ranking.html"
     context_object_name = "dishes"
     paginate_by = 10
+    keyset_ordering = RANKING_ORDERING
 
     def get_queryset(self) -> QuerySet[GeneratedDish]:
         """いいね数順で料理を取得."""
         return GeneratedDish.objects.order_by(
-            "-likes_count",
-            "-created_at",
-        ).prefetch_related(
-            "ingredients",
-            "user",
+            *self.keyset_ordering,
+        ).for_listing()
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet[GeneratedDish],
+        page_size: int,
+    ) -> tuple[Any, Any, Any, bool]:
+        """ランキングキャッシュの範囲内のページはキャッシュから返す."""
+        if CURSOR_QUERY_PARAM not in self.request.GET:
+            cached = await sync_to_async(leaderboard.paginate)(self.request.GET.get(self.page_kwarg), page_size)
+            if cached is not None:
+                return cached
+        return await super().apaginate_queryset(queryset, page_size)
+
+
+class TrendingListView(AsyncDishListView):
+    """トレンドランキングビュー(ログイン不要).
+
+    急上昇・デイリー・ウィークリーの時間減衰スコア順に表示する。
+    スコアは列に保持しているため、ページ番号方式 (COUNT + OFFSET) は使わず常にキーセット方式でページングし、
+    どのページもスコアのインデックスを1回読むだけで済む。
+    """
+
+    model = GeneratedDish
+    template_name = "dishes/ranking.html"
+    context_object_name = "dishes"
+    paginate_by = 10
+    period: TrendingPeriod | None = None
+
+    def setup(self, request: HttpRequest, *args: object, **kwargs: object) -> None:
+        """URLで指定されたランキングの種類を設定."""
+        super().setup(request, *args, **kwargs)
+        self.period = TRENDING_PERIODS.get(str(kwargs["period"]))
+        if self.period is not None:
+            self.keyset_ordering = self.period.ordering
+
+    async def get(self, request: HttpRequest, *args: object, **kwargs: object) -> HttpResponse:
+        """GETリクエストの処理."""
+        if self.period is None:
+            msg = "ランキングの種類が見つかりません。"
+            raise Http404(msg)
+        return await super().get(request, *args, **kwargs)
+
+    def get_queryset(self) -> QuerySet[GeneratedDish]:
+        """トレンドスコア順で料理を取得."""
+        return GeneratedDish.objects.order_by(*self.keyset_ordering).for_listing(self.period.field)  # type: ignore[union-attr]
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet[GeneratedDish],
+        page_size: int,
+    ) -> tuple[Any, Any, Any, bool]:
+        """カーソルの有無によらずキーセット方式でページングする."""
+        page = await apaginate_keyset(
+            queryset,
+            self.keyset_ordering,
+            self.request.GET.get(CURSOR_QUERY_PARAM, ""),
+            page_size,
         )
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs: object) -> dict[str, Any]:
-        """コンテキストデータを追加."""
+        """ランキングの種類を追加."""
         context = super().get_context_data(**kwargs)
+        context["trending_period"] = self.period
+        return context
 
-        # ユーザーのいいね情報を取得
-        if self.request.user.is_authenticated:
-            dishes = context["dishes"]
-            liked_dish_ids = Like.objects.filter(
-                user=self.request.user,
-                dish__in=dishes,
-            ).values_list("dish_id", flat=True)
-            context["user_liked_dish_ids"] = list(liked_dish_ids)
-        else:
-            context["user_liked_dish_ids"] = []
 
+class PeriodRankingListView(AsyncDishListView):
+    """期間別ランキングビュー(ログイン不要).
+
+    今日・今週・今月に付いたいいねの数順に表示する。期間別いいね数の行を
+    (期間, バケット, いいね数) のインデックスで範囲として読み、料理と作成ユーザーは同じクエリのJOINで取得する。
+    トレンドランキングと同様に常にキーセット方式でページングする。
+    """
+
+    template_name = "dishes/ranking.html"
+    context_object_name = "dishes"
+    paginate_by = 10
+    keyset_ordering = ROLLUP_RANKING_ORDERING
+    period: RollupPeriod | None = None
+
+    def setup(self, request: HttpRequest, *args: object, **kwargs: object) -> None:
+        """URLで指定された期間を設定."""
+        super().setup(request, *args, **kwargs)
+        if kwargs["period"] in RollupPeriod.values:
+            self.period = RollupPeriod(kwargs["period"])
+
+    async def get(self, request: HttpRequest, *args: object, **kwargs: object) -> HttpResponse:
+        """GETリクエストの処理."""
+        if self.period is None:
+            msg = "ランキングの期間が見つかりません。"
+            raise Http404(msg)
+        return await super().get(request, *args, **kwargs)
+
+    def get_queryset(self) -> QuerySet[DishLikeRollup]:
+        """期間内のいいね数順で料理を取得."""
+        return (
+            DishLikeRollup.objects.ranking(self.period)  # type: ignore[attr-defined]
+            .select_related("dish__user")
+            .only("likes", "dish_id", *(f"dish__{field}" for field in LISTING_FIELDS))
+        )
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet[DishLikeRollup],
+        page_size: int,
+    ) -> tuple[Any, Any, Any, bool]:
+        """キーセット方式でページングし、表示用に料理のリストに置き換える."""
+        page = await apaginate_keyset(
+            queryset,
+            self.keyset_ordering,
+            self.request.GET.get(CURSOR_QUERY_PARAM, ""),
+            page_size,
+        )
+        dishes = []
+        for rollup in page.object_list:
+            rollup.dish.period_likes = rollup.likes
+            dishes.append(rollup.dish)
+        page.object_list = dishes
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs: object) -> dict[str, Any]:
+        """期間を追加."""
+        context = super().get_context_data(**kwargs)
+        context["rollup_period"] = self.period
         return context
 
 
@@ -79,23 +215,20 @@ class DishGenerateView(LoginRequiredMixin, View):
     def get(self, request: HttpRequest) -> HttpResponse:
         """GETリクエストの処理."""
         form = self.form_class()
-        user_ingredients = Ingredient.objects.filter(user=request.user)
+        user_ingredients = ingredient_cache.get(request.user.pk)
         context = {
             "form": form,
             "user_ingredients": user_ingredients,
-            "ingredients_count": user_ingredients.count(),
+            "ingredients_count": len(user_ingredients),
         }
         return render(request, self.template_name, context)
 
     def post(self, request: HttpRequest) -> HttpResponse:
         """POSTリクエストの処理."""
         form = self.form_class(request.POST)
+        # ユーザーの材料をキャッシュ済みのスナップショットから取得
+        user_ingredients = ingredient_cache.get(request.user.pk)
         if form.is_valid():
-            # ユーザーの材料を取得
-            user_ingredients = list(
-                Ingredient.objects.filter(user=request.user),
-            )
-
             if len(user_ingredients) < 2:  # noqa: PLR2004
                 messages.error(
                     request,
@@ -112,6 +245,7 @@ class DishGenerateView(LoginRequiredMixin, View):
                     "form": form,
                     "generated_dishes": dish_names,
                     "user_ingredients": user_ingredients,
+                    "ingredients_count": len(user_ingredients),
                 }
                 return render(request, self.template_name, context)
             except ValueError as e:
@@ -119,11 +253,10 @@ class DishGenerateView(LoginRequiredMixin, View):
                 return redirect("dishes:generate")
 
         # フォームが無効な場合
-        user_ingredients = Ingredient.objects.filter(user=request.user)
         context = {
             "form": form,
             "user_ingredients": user_ingredients,
-            "ingredients_count": user_ingredients.count(),
+            "ingredients_count": len(user_ingredients),
         }
         return render(request, self.template_name, context)
 
@@ -140,47 +273,84 @@ class SaveDishView(LoginRequiredMixin, View):
             messages.error(request, "料理名が指定されていません。")
             return redirect("dishes:generate")
 
-        # 材料を取得, ユーザーの材料のみ
-        ingredients = Ingredient.objects.filter(
-            id__in=ingredient_ids,
-            user=request.user,
-        )
+        # 材料を絞り込み, ユーザーの材料のみ. スナップショットは古い可能性があるため、データベースで確認する
+        requested_ids = {int(pk) for pk in ingredient_ids if pk.isdigit()}
+        ingredients = ingredient_cache.fetch(request.user.pk, requested_ids)
 
-        if not ingredients.exists():
+        if not ingredients:
             messages.error(request, "有効な材料が選択されていません。")
             return redirect("dishes:generate")
 
         # 料理を保存
-        dish = GeneratedDish.objects.create(
-            name=dish_name,
-            user=request.user,
-        )
-        dish.ingredients.set(ingredients)
+        GeneratedDish.objects.bulk_create_with_ingredients(request.user, [dish_name], ingredients)
 
         messages.success(request, f"「{dish_name}」を保存しました!")
         return redirect("dishes:list")
 
 
+class BulkSaveDishView(LoginRequiredMixin, View):
+    """生成された複数の料理をまとめて保存するビュー."""
+
+    form_class = BulkSaveDishForm
+
+    def post(self, request: HttpRequest) -> HttpResponse:
+        """POSTリクエストの処理."""
+        form = self.form_class(request.user.pk, request.POST)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                messages.error(request, errors[0])
+            return redirect("dishes:generate")
+
+        dishes = GeneratedDish.objects.bulk_create_with_ingredients(
+            request.user,
+            form.cleaned_data["dish_names"],
+            form.cleaned_data["ingredient_ids"],
+        )
+
+        messages.success(request, f"{len(dishes)}件の料理を保存しました!")
+        return redirect("dishes:list")
+
+
 class ToggleLikeView(LoginRequiredMixin, View):
-    """いいねのトグルビュー."""
+    """いいねのトグルビュー.
+
+    Acceptヘッダーでapplication/jsonを優先するリクエスト (いいねボタンのスクリプト) には、
+    ページを再描画させずに新しいいいね状態といいね数をJSONで返す。それ以外はリファラーへリダイレクトする。
+    """
+
+    def wants_json(self) -> bool:
+        """JSONでの応答を求めるリクエストか."""
+        return self.request.get_preferred_type(["text/html", "application/json"]) == "application/json"
+
+    def handle_no_permission(self) -> HttpResponse:
+        """未ログインの場合. JSONを求めるリクエストにはログインページへのリダイレクトの代わりに401を返す."""
+        if self.wants_json():
+            return JsonResponse({"error": "ログインが必要です。"}, status=401)
+        return super().handle_no_permission()
 
     def post(self, request: HttpRequest, dish_id: int) -> HttpResponse:
         """POSTリクエストの処理."""
-        dish = get_object_or_404(GeneratedDish, id=dish_id)
+        dish = get_object_or_404(GeneratedDish.objects.only("id", "name", "user_id"), id=dish_id)
 
-        # 自分の料理にはいいねできない
-        if dish.user == request.user:
+        # 自分の料理にはいいねできない. 作成者はIDで比較し、ユーザーを読み込まない
+        if dish.user_id == request.user.pk:
+            if self.wants_json():
+                return JsonResponse({"error": "自分の料理にはいいねできません。"}, status=400)
             messages.error(request, "自分の料理にはいいねできません。")
             return redirect("dishes:ranking")
 
-        like, created = Like.objects.get_or_create(
-            dish=dish,
-            user=request.user,
-        )
+        if like_buffer.enabled:
+            # 書き込みバッファに記録するのみで、データベースへはまとめて反映する
+            liked = like_buffer.toggle(request.user, dish.pk)
+        else:
+            liked = Like.objects.toggle(dish.pk, request.user)  # type: ignore[attr-defined]
+
+        if self.wants_json():
+            # シグナルで更新された後のいいね数を読み直し、未反映の増減を足す
+            dish.refresh_from_db(fields=["likes_count"])
+            return JsonResponse({"liked": liked, "likes_count": dish.likes_count + like_buffer.pending_delta(dish.pk)})
 
-        if not created:
-            # 既にいいねしていた場合は削除
-            like.delete()
+        if not liked:
             messages.info(request, f"「{dish.name}」のいいねを取り消しました。")
         else:
             messages.success(request, f"「{dish.name}」にいいねしました!")
@@ -241,29 +411,17 @@ class DemoGenerateView(View):
         return render(request, self.template_name)
 
 
-class RecentDishesView(ListView):
+class RecentDishesView(AsyncDishListView):
     """最新の料理表示ビュー(ログイン不要)."""
 
     model = GeneratedDish
     template_name = "dishes/recent.html"
     context_object_name = "dishes"
     paginate_by = 10
+    keyset_ordering = ("-created_at", "-id")
 
     def get_queryset(self) -> QuerySet[GeneratedDish]:
         """最新の料理を取得."""
         return GeneratedDish.objects.order_by(
-            "-created_at",
-        ).prefetch_related("ingredients", "user")
-
-    def get_context_data(self, **kwargs: object) -> dict[str, Any]:
-        """ユーザーのいいね情報を追加."""
-        context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
-            liked_dish_ids = Like.objects.filter(
-                user=self.request.user,
-                dish__in=context["dishes"],
-            ).values_list("dish_id", flat=True)
-            context["user_liked_dish_ids"] = list(liked_dish_ids)
-        else:
-            context["user_liked_dish_ids"] = []
-        return context
+            *self.keyset_ordering,
+        ).for_listing()
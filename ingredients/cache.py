@@ -0,0 +1,97 @@
+"""ユーザーごとの材料スナップショットのキャッシュ.
+
+料理名の生成画面では「別の料理を生成する」が繰り返し押されるため、
+材料のIDと名前だけを保持したスナップショットをキャッシュし、データベースへの問い合わせを省く。
+材料の保存・削除時にシグナルで破棄される。
+キャッシュが共有でない場合 (LocMemCache) は他のプロセスでの変更で破棄されないため、
+スナップショットは表示にだけ使い、料理の保存時の材料の確認はfetchでデータベースに問い合わせる。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from django.core.cache.backends.base import BaseCache
+
+
+class IngredientRef(NamedTuple):
+    """材料のIDと名前. テンプレートからはIngredientと同じ属性名で参照できる."""
+
+    id: int
+    name: str
+
+
+class IngredientSnapshotCache:
+    """ユーザーごとの材料スナップショットのキャッシュサービス."""
+
+    key_prefix = "ingredients:snapshot"
+
+    def __init__(self, alias: str | None = None, timeout: int | None = None) -> None:
+        """初期化する. 省略した値は使用時に設定から読むため、override_settingsも反映される."""
+        self._alias = alias
+        self._timeout = timeout
+
+    @property
+    def alias(self) -> str:
+        """使用するキャッシュのエイリアス."""
+        return self._alias or settings.INGREDIENT_CACHE_ALIAS
+
+    @property
+    def timeout(self) -> int:
+        """キャッシュの有効期間. 単位は秒."""
+        return self._timeout or settings.INGREDIENT_CACHE_TIMEOUT
+
+    @property
+    def cache(self) -> BaseCache:
+        """使用するキャッシュバックエンド."""
+        return caches[self.alias]
+
+    def key(self, user_id: int) -> str:
+        """ユーザーのキャッシュキー."""
+        return f"{self.key_prefix}:{user_id}"
+
+    def get(self, user_id: int) -> tuple[IngredientRef, ...]:
+        """ユーザーの材料一覧を返す. キャッシュが空の場合はデータベースから作成する.
+
+        並び順はIngredientの既定の並び順 (新しい順) と同じ。
+        """
+        refs = self.cache.get(self.key(user_id))
+        if refs is None:
+            refs = self.rebuild(user_id)
+        return refs
+
+    def rebuild(self, user_id: int) -> tuple[IngredientRef, ...]:
+        """データベースからスナップショットを作成してキャッシュする."""
+        from .models import Ingredient  # noqa: PLC0415
+
+        refs = tuple(
+            IngredientRef(*row) for row in Ingredient.objects.filter(user_id=user_id).values_list("id", "name")
+        )
+        self.cache.set(self.key(user_id), refs, self.timeout)
+        return refs
+
+    def fetch(self, user_id: int, ingredient_ids: Iterable[int]) -> tuple[IngredientRef, ...]:
+        """指定したIDの材料のうちユーザーのものを返す.
+
+        スナップショットは古い可能性があるため、キャッシュを使わずにデータベースから読む。
+        削除済みの材料や他のユーザーの材料は含まれない。
+        """
+        from .models import Ingredient  # noqa: PLC0415
+
+        return tuple(
+            IngredientRef(*row)
+            for row in Ingredient.objects.filter(user_id=user_id, pk__in=set(ingredient_ids)).values_list("id", "name")
+        )
+
+    def invalidate(self, user_id: int) -> None:
+        """ユーザーのキャッシュを破棄する. 次回の読み取り時に再作成される."""
+        self.cache.delete(self.key(user_id))
+
+
+ingredient_cache = IngredientSnapshotCache()
@@ -1,3 +1,6 @@
+import csv
+import io
+import re
 from typing import Any, ClassVar
 
 from django import forms
@@ -5,6 +8,15 @@ from django.contrib.auth.models import User
 
 from .models import Ingredient
 
+# 一括登録で一度に受け付ける材料の最大数
+MAX_IMPORT_COUNT = 1000
+# CSVファイルの最大サイズ. 単位はバイト
+MAX_IMPORT_FILE_SIZE = 1024 * 1024
+# テキスト入力の区切り文字. 改行・カンマ・読点・全角カンマで区切る
+NAME_SEPARATOR = re.compile(r"[\r\n,、\uff0c]+")
+# CSVの見出し行として読み飛ばす値
+CSV_HEADER_NAMES = {"name", "材料名"}
+
 
 class IngredientForm(forms.ModelForm):
     """材料登録・編集フォーム."""
@@ -28,23 +40,28 @@ class IngredientForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
     def clean_name(self) -> str | None:
-        """材料名の重複チェック."""
+        """材料名の重複チェック.
+
+        ユニーク制約の式インデックスを使って大文字・小文字を区別せずに検索する。
+        チェック後に同時登録された場合の重複はビュー側でIntegrityErrorとして扱う。
+        """
         name = self.cleaned_data.get("name")
         if name:
             # 編集時は自分自身を除外して重複チェック
-            existing_ingredients = Ingredient.objects.filter(
-                user=self.user,
-                name__iexact=name,
-            )
+            existing_ingredients = Ingredient.objects.filter(user=self.user).filter_name_ci(name)  # type: ignore[attr-defined]
             if self.instance.pk:
                 existing_ingredients = existing_ingredients.exclude(pk=self.instance.pk)
 
             if existing_ingredients.exists():
-                msg = f"「{name}」は既に登録されています。"
-                raise forms.ValidationError(msg)
+                raise forms.ValidationError(self.duplicate_message(name))
 
         return name
 
+    @staticmethod
+    def duplicate_message(name: str) -> str:
+        """重複時のエラーメッセージ."""
+        return f"「{name}」は既に登録されています。"
+
     def save(self, commit: bool = True) -> Ingredient:  # noqa: FBT001, FBT002
         """保存時にユーザーを設定."""
         ingredient = super().save(commit=False)
@@ -52,3 +69,57 @@ class IngredientForm(forms.ModelForm):
         if commit:
             ingredient.save()
         return ingredient
+
+
+class IngredientImportForm(forms.Form):
+    """材料の一括登録フォーム (テキスト入力またはCSVファイル)."""
+
+    names = forms.CharField(
+        label="材料名のリスト",
+        required=False,
+        widget=forms.Textarea(
+            attrs={
+                "placeholder": "1行に1つずつ、またはカンマ区切りで入力してください\n例:\n卵\nネギ\nチーズ",
+                "class": "form-control",
+                "rows": 10,
+            },
+        ),
+        help_text="改行・カンマ・読点で区切って入力できます。",
+    )
+    file = forms.FileField(
+        label="CSVファイル",
+        required=False,
+        help_text="1列目を材料名として読み込みます (UTF-8)。エクスポートしたCSVもそのまま使えます。",
+    )
+
+    def clean_file(self) -> list[str]:
+        """CSVファイルの1列目を材料名として読み込む."""
+        uploaded = self.cleaned_data.get("file")
+        if not uploaded:
+            return []
+        if uploaded.size > MAX_IMPORT_FILE_SIZE:
+            msg = f"CSVファイルは{MAX_IMPORT_FILE_SIZE // 1024}KB以下にしてください。"
+            raise forms.ValidationError(msg)
+        try:
+            text = uploaded.read().decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            msg = "CSVファイルはUTF-8で保存してください。"
+            raise forms.ValidationError(msg) from e
+        names = [row[0] for row in csv.reader(io.StringIO(text)) if row]
+        if names and names[0].strip().lower() in CSV_HEADER_NAMES:
+            names = names[1:]
+        return names
+
+    def clean(self) -> dict[str, Any]:
+        """テキスト入力とCSVファイルの材料名をまとめる."""
+        cleaned_data = super().clean()
+        names = NAME_SEPARATOR.split(cleaned_data.get("names") or "") + (cleaned_data.get("file") or [])
+        names = [name for name in names if name.strip()]
+        if not self.errors and not names:
+            msg = "材料名を入力するか、CSVファイルを選択してください。"
+            raise forms.ValidationError(msg)
+        if len(names) > MAX_IMPORT_COUNT:
+            msg = f"一度に登録できる材料は{MAX_IMPORT_COUNT}件までです。"
+            raise forms.ValidationError(msg)
+        cleaned_data["ingredient_names"] = names
+        return cleaned_data
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:29
+
+from collections import defaultdict
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def merge_case_duplicates(apps, schema_editor):
+    """大文字・小文字違いの重複材料を最も古いものにまとめる."""
+    Ingredient = apps.get_model('ingredients', 'Ingredient')
+    GeneratedDish = apps.get_model('dishes', 'GeneratedDish')
+    Through = GeneratedDish.ingredients.through
+
+    duplicates = (
+        Ingredient.objects.annotate(name_lower=Lower('name'))
+        .values('user_id', 'name_lower')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    affected_dish_ids = set()
+    for duplicate in duplicates:
+        ids = list(
+            Ingredient.objects.annotate(name_lower=Lower('name'))
+            .filter(user_id=duplicate['user_id'], name_lower=duplicate['name_lower'])
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)
+        )
+        keep, drop = ids[0], ids[1:]
+        dish_ids = set(Through.objects.filter(ingredient_id__in=ids).values_list('generateddish_id', flat=True))
+        kept_dish_ids = set(Through.objects.filter(ingredient_id=keep).values_list('generateddish_id', flat=True))
+        Through.objects.filter(ingredient_id__in=drop).delete()
+        Through.objects.bulk_create(
+            [Through(generateddish_id=dish_id, ingredient_id=keep) for dish_id in dish_ids - kept_dish_ids]
+        )
+        Ingredient.objects.filter(id__in=drop).delete()
+        affected_dish_ids |= dish_ids
+
+    # まとめた料理の材料名スナップショットを作り直す
+    names = defaultdict(list)
+    rows = (
+        Through.objects.filter(generateddish_id__in=affected_dish_ids)
+        .order_by('-ingredient__created_at', '-ingredient__id')
+        .values_list('generateddish_id', 'ingredient__name')
+    )
+    for dish_id, name in rows:
+        names[dish_id].append(name)
+    GeneratedDish.objects.bulk_update(
+        [GeneratedDish(pk=dish_id, ingredient_names=names[dish_id]) for dish_id in affected_dish_ids],
+        ['ingredient_names'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0001_initial'),
+        ('dishes', '0003_generateddish_ingredient_names'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_case_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), models.F('user'), name='ingredient_name_ci_unique', violation_error_message='同じ名前の材料が既に登録されています。'),
+        ),
+    ]
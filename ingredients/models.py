@@ -1,14 +1,115 @@
-from typing import ClassVar
+import string
+import unicodedata
+from collections.abc import Iterable
+from functools import partial
+from typing import ClassVar, NamedTuple
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+# 材料名の最大文字数
+NAME_MAX_LENGTH = 100
+# SQLiteのLOWER関数と同じく、ASCII文字だけを小文字にする変換表
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def normalize_ingredient_name(name: str) -> str:
+    """材料名を正規化する (全角英数・半角カナの統一、前後と連続する空白の除去)."""
+    return " ".join(unicodedata.normalize("NFKC", name).split())
+
+
+def name_lower(name: str, vendor: str) -> str:
+    """ユニーク制約 (LOWER(name)) と同じ規則で材料名を小文字にする.
+
+    SQLiteのLOWERはASCII文字だけを小文字にするため、str.lowerで比較すると
+    制約では別の名前として登録できる材料 (Äとäなど) を重複と判定してしまう。
+    """
+    if vendor == "sqlite":
+        return name.translate(ASCII_LOWER)
+    return name.lower()
+
+
+class ImportResult(NamedTuple):
+    """材料の一括登録の結果."""
+
+    created: list[str]
+    existing: list[str]
+    invalid: list[str]
+
+
+class IngredientQuerySet(models.QuerySet["Ingredient"]):
+    """材料のクエリセット."""
+
+    def filter_name_ci(self, name: str) -> "IngredientQuerySet":
+        """材料名を大文字・小文字を区別せずに絞り込む.
+
+        iexactと異なり、ユニーク制約の式インデックス (LOWER(name), user_id) を使える形で比較する。
+        小文字化もデータベース側で行い、制約と同じ規則で判定する。
+        """
+        return self.alias(name_lower=Lower("name")).filter(name_lower=Lower(Value(name)))
+
+    def bulk_import(self, user: User, names: Iterable[str]) -> ImportResult:
+        """材料名をまとめて登録する.
+
+        登録済みの材料名を1回のクエリで取得し、正規化・重複除去はメモリ上で行う。
+        登録はbulk_create(ignore_conflicts=True)で行うため、同時に登録された材料とも衝突しない。
+        重複の判定はユニーク制約 (ingredient_name_ci_unique) と同じ規則で大文字・小文字を区別しない (name_lower)。
+        bulk_createは衝突して登録されなかった行を区別しないため、登録後に新しく増えた行を読み直して
+        実際に登録した材料名を求め、同時に登録されていたものは登録済みとして返す。
+
+        Args:
+            user: 登録ユーザー
+            names: 材料名 (未正規化)
+
+        Returns:
+            登録した材料名・登録済みだった材料名・不正な材料名
+        """
+        from .cache import ingredient_cache  # noqa: PLC0415
+
+        result = ImportResult(created=[], existing=[], invalid=[])
+        with transaction.atomic(using=self.db):
+            rows = list(self.filter(user=user).values_list("pk", "name"))
+            vendor = connections[self.db].vendor
+            seen = {name_lower(name, vendor) for _, name in rows}
+            last_pk = max((pk for pk, _ in rows), default=0)
+            candidates: list[str] = []
+            for raw_name in names:
+                name = normalize_ingredient_name(raw_name)
+                if not name:
+                    continue
+                if len(name) > NAME_MAX_LENGTH:
+                    result.invalid.append(name)
+                    continue
+                key = name_lower(name, vendor)
+                if key in seen:
+                    result.existing.append(name)
+                    continue
+                seen.add(key)
+                candidates.append(name)
+
+            if candidates:
+                ingredients = self.bulk_create(
+                    [self.model(name=name, user=user) for name in candidates],
+                    batch_size=500,
+                    ignore_conflicts=True,
+                )
+                # 作成日時はINSERTの前にインスタンスへ設定されるため、同じ作成日時の行が自分の登録した行
+                inserted = set(self.filter(user=user, pk__gt=last_pk).values_list("name", "created_at"))
+                for ingredient in ingredients:
+                    registered = (ingredient.name, ingredient.created_at) in inserted
+                    (result.created if registered else result.existing).append(ingredient.name)
+                # bulk_createではシグナルが発生しないため、スナップショットはここで破棄する
+                transaction.on_commit(partial(ingredient_cache.invalidate, user.pk), using=self.db)
+        return result
 
 
 class Ingredient(models.Model):
     """材料モデル."""
 
     name = models.CharField(
-        max_length=100,
+        max_length=NAME_MAX_LENGTH,
         verbose_name="材料名",
         help_text="材料の名前を入力してください (例: 卵、ネギ、チーズ)",
     )
@@ -23,9 +124,19 @@ class Ingredient(models.Model):
         verbose_name="登録日時",
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
-        # 同じユーザーが同じ材料名を重複登録できないようにする
-        unique_together: ClassVar[list[str]] = ["name", "user"]
+        constraints: ClassVar[list[models.BaseConstraint]] = [
+            # 同じユーザーが同じ材料名を重複登録できないようにする. 大文字・小文字は区別しない
+            # 重複チェックもこの式インデックスを使って行う
+            models.UniqueConstraint(
+                Lower("name"),
+                "user",
+                name="ingredient_name_ci_unique",
+                violation_error_message="同じ名前の材料が既に登録されています。",
+            ),
+        ]
         verbose_name = "材料"
         verbose_name_plural = "材料"
         ordering: ClassVar[list[str]] = ["-created_at"]  # 新しい材料から順に表示
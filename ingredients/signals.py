@@ -0,0 +1,19 @@
+"""材料スナップショットのキャッシュを破棄するシグナルハンドラ."""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import ingredient_cache
+from .models import Ingredient
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_snapshot(*, instance: Ingredient, **_kwargs: object) -> None:
+    """材料の追加・変更・削除でユーザーのスナップショットを破棄."""
+    # コミット前に再作成されても古い内容が残らないよう、コミット後にも破棄する
+    ingredient_cache.invalidate(instance.user_id)  # type: ignore[attr-defined]
+    transaction.on_commit(partial(ingredient_cache.invalidate, instance.user_id))  # type: ignore[attr-defined]
@@ -1,3 +1,272 @@
-from django.test import TestCase
+from typing import ClassVar
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, models, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.testing import QueryBudget, QueryBudgetMixin
+
+from .cache import IngredientRef, ingredient_cache
+from .forms import MAX_IMPORT_COUNT, MAX_IMPORT_FILE_SIZE, IngredientForm, IngredientImportForm
+from .models import Ingredient, IngredientQuerySet
+from .views import IngredientListView
+
+
+class IngredientSnapshotCacheTests(TestCase):
+    """ユーザーごとの材料スナップショットのキャッシュ."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """材料を2件持つユーザーと、材料を持つ別のユーザーを作成."""
+        cls.user = User.objects.create_user(username="cook")
+        cls.ingredients = [Ingredient.objects.create(name=f"材料{i}", user=cls.user) for i in range(2)]
+        cls.others_ingredient = Ingredient.objects.create(name="他人の材料", user=User.objects.create_user("other"))
+
+    def setUp(self) -> None:
+        """キャッシュを空にする."""
+        cache.clear()
+
+    def test_snapshot_is_cached_newest_first(self) -> None:
+        """自分の材料を新しい順に保持し、2回目以降はデータベースに問い合わせない."""
+        with self.assertNumQueries(1):
+            refs = ingredient_cache.get(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(ingredient_cache.get(self.user.pk), refs)
+        self.assertEqual([ref.name for ref in refs], ["材料1", "材料0"])
+
+    def test_save_and_delete_invalidate(self) -> None:
+        """材料の追加・変更・削除でスナップショットを作り直す."""
+        ingredient_cache.get(self.user.pk)
+        added = Ingredient.objects.create(name="追加した材料", user=self.user)
+        self.ingredients[0].name = "変更した材料"
+        self.ingredients[0].save()
+        self.ingredients[1].delete()
+        self.assertEqual([ref.name for ref in ingredient_cache.get(self.user.pk)], [added.name, "変更した材料"])
+
+    def test_fetch_reads_only_own_existing_ingredients(self) -> None:
+        """fetchはキャッシュを使わず、削除済みの材料と他のユーザーの材料を除く."""
+        ingredient_cache.get(self.user.pk)
+        deleted = self.ingredients[1]
+        Ingredient.objects.filter(pk=deleted.pk).delete()
+        refs = ingredient_cache.fetch(self.user.pk, [self.ingredients[0].pk, deleted.pk, self.others_ingredient.pk])
+        self.assertEqual(refs, (IngredientRef(self.ingredients[0].pk, "材料0"),))
+
+    def test_settings_are_read_lazily(self) -> None:
+        """override_settingsで変更した設定が反映される."""
+        with override_settings(INGREDIENT_CACHE_TIMEOUT=5):
+            self.assertEqual(ingredient_cache.timeout, 5)
+
+
+class IngredientImportTests(TestCase):
+    """材料の一括登録とCSVエクスポート."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """材料を1件持つユーザーを作成."""
+        cls.user = User.objects.create_user(username="cook")
+        Ingredient.objects.create(name="Egg", user=cls.user)
+
+    def test_names_are_normalized(self) -> None:
+        """全角英数・半角カナ・空白を正規化し、大文字・小文字を区別せずに重複を除く."""
+        result = Ingredient.objects.bulk_import(  # type: ignore[attr-defined]
+            self.user,
+            ["\uff21\uff22\uff23", "ｶﾚｰ", "  卵　 ソース ", "abc", "卵 ソース", "EGG", "", "x" * 101],
+        )
+        self.assertEqual(result.created, ["ABC", "カレー", "卵 ソース"])
+        self.assertEqual(result.existing, ["abc", "卵 ソース", "EGG"])
+        self.assertEqual(result.invalid, ["x" * 101])
+        self.assertQuerySetEqual(
+            Ingredient.objects.filter(user=self.user).values_list("name", flat=True),
+            ["Egg", "ABC", "カレー", "卵 ソース"],
+            ordered=False,
+        )
+
+    def test_concurrently_created_names_are_reported_existing(self) -> None:
+        """読み込み後に他のリクエストが登録した材料名は、登録済みとして返す."""
+
+        def racing_bulk_create(queryset: IngredientQuerySet, objs: list[Ingredient], **kwargs: object) -> list:
+            Ingredient.objects.create(name="ネギ", user=self.user)
+            return models.QuerySet.bulk_create(queryset, objs, **kwargs)  # type: ignore[arg-type]
+
+        with mock.patch.object(IngredientQuerySet, "bulk_create", autospec=True, side_effect=racing_bulk_create):
+            result = Ingredient.objects.bulk_import(self.user, ["卵", "ネギ"])  # type: ignore[attr-defined]
+        self.assertEqual(result.created, ["卵"])
+        self.assertEqual(result.existing, ["ネギ"])
+
+    def test_import_view_reads_text_and_csv(self) -> None:
+        """テキスト入力とCSVファイル (BOM・見出し行付き) の材料名をまとめて登録する."""
+        self.client.force_login(self.user)
+        csv_file = SimpleUploadedFile("ingredients.csv", "\ufeffname,created_at\nチーズ,2026-01-01\negg,\n".encode())
+        response = self.client.post(
+            reverse("ingredients:import"),
+            {"names": "卵\nネギ、チーズ", "file": csv_file},
+            follow=True,
+        )
+        self.assertContains(response, "3件の材料を登録しました。")
+        self.assertContains(response, "2件は登録済みのためスキップしました。")
+        self.assertQuerySetEqual(
+            Ingredient.objects.filter(user=self.user).values_list("name", flat=True),
+            ["Egg", "卵", "ネギ", "チーズ"],
+            ordered=False,
+        )
+
+    def test_import_form_limits(self) -> None:
+        """空の入力・件数超過・サイズ超過・UTF-8以外のCSVはエラー."""
+        cases = {
+            "空の入力": ({"names": " \n、"}, {}),
+            "件数超過": ({"names": "\n".join(f"材料{i}" for i in range(MAX_IMPORT_COUNT + 1))}, {}),
+            "サイズ超過": ({}, {"file": SimpleUploadedFile("a.csv", b"a\n" * (MAX_IMPORT_FILE_SIZE // 2 + 1))}),
+            "UTF-8以外": ({}, {"file": SimpleUploadedFile("a.csv", "卵\n".encode("shift_jis"))}),
+        }
+        for label, (data, files) in cases.items():
+            with self.subTest(label):
+                self.assertFalse(IngredientImportForm(data, files).is_valid())
+
+        names = "\n".join(f"材料{i}" for i in range(MAX_IMPORT_COUNT))
+        form = IngredientImportForm({"names": names})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(len(form.cleaned_data["ingredient_names"]), MAX_IMPORT_COUNT)
+
+    def test_export_streams_csv(self) -> None:
+        """自分の材料だけを登録順に、BOM付きのCSVとして逐次返す."""
+        Ingredient.objects.create(name="卵, 特大", user=self.user)
+        Ingredient.objects.create(name="他人の材料", user=User.objects.create_user(username="other"))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("ingredients:export"))
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.rsplit(",", 1)[0] for line in lines], ["\ufeffname", "Egg", '"卵, 特大"'])
+
+
+class IngredientNameCaseTests(TestCase):
+    """大文字・小文字を区別しない材料名の重複判定."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """材料を持つユーザーを作成."""
+        cls.user = User.objects.create_user(username="cook")
+        for name in ["Egg", "Äpfel"]:
+            Ingredient.objects.create(name=name, user=cls.user)
+
+    def test_filter_name_ci(self) -> None:
+        """データベースの小文字化で比較する."""
+        matched = [name for name in ["EGG", "egg", "Eggs", "Äpfel"] if Ingredient.objects.filter_name_ci(name).exists()]  # type: ignore[attr-defined]
+        self.assertEqual(matched, ["EGG", "egg", "Äpfel"])
+
+    def test_database_rejects_case_duplicates(self) -> None:
+        """ユニーク制約はユーザーごとに大文字・小文字を区別せずに重複を拒否する."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.create(name="eGG", user=self.user)
+        Ingredient.objects.create(name="egg", user=User.objects.create_user(username="other"))
+        self.assertEqual(Ingredient.objects.filter_name_ci("egg").count(), 2)  # type: ignore[attr-defined]
+
+    def test_form_and_import_agree_with_constraint(self) -> None:
+        """フォームと一括登録はユニーク制約と同じ規則で重複を判定する."""
+        names = ["EGG", "äpfel", "ÄPFEL"]
+        form_accepted = [name for name in names if IngredientForm(self.user, {"name": name}).is_valid()]
+        result = Ingredient.objects.bulk_import(self.user, names)  # type: ignore[attr-defined]
+        self.assertEqual(result.created, form_accepted)
+
+    def test_duplicate_shows_form_error(self) -> None:
+        """重複した材料名はフォームのエラーになる."""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("ingredients:create"), {"name": "EGG"})
+        self.assertFormError(response.context["form"], "name", "「EGG」は既に登録されています。")
+
+    def test_concurrent_duplicate_shows_form_error(self) -> None:
+        """重複チェックの後に登録された場合も、IntegrityErrorではなくフォームのエラーになる."""
+        self.client.force_login(self.user)
+        with mock.patch.object(
+            IngredientQuerySet,
+            "filter_name_ci",
+            autospec=True,
+            side_effect=lambda queryset, _name: queryset.none(),
+        ):
+            response = self.client.post(reverse("ingredients:create"), {"name": "EGG"})
+        self.assertFormError(response.context["form"], "name", "「EGG」は既に登録されています。")
+        self.assertFalse(Ingredient.objects.filter(name="EGG").exists())
+
+
+class MergeCaseDuplicatesMigrationTests(TransactionTestCase):
+    """大文字・小文字違いの重複材料をまとめるマイグレーション (0002)."""
+
+    before: ClassVar[list[tuple[str, str]]] = [
+        ("ingredients", "0001_initial"),
+        ("dishes", "0003_generateddish_ingredient_names"),
+    ]
+    after: ClassVar[list[tuple[str, str]]] = [("ingredients", "0002_ingredient_name_ci_unique")]
+
+    def tearDown(self) -> None:
+        """最新のマイグレーションまで戻す."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged_into_oldest(self) -> None:
+        """最も古い材料に料理の材料をまとめ、重複を削除して材料名を作り直す."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        old_ingredient = apps.get_model("ingredients", "Ingredient")
+        old_dish = apps.get_model("dishes", "GeneratedDish")
+        user = apps.get_model("auth", "User").objects.create(username="cook")
+        other = apps.get_model("auth", "User").objects.create(username="other")
+
+        egg, upper_egg, lower_egg, leek = (
+            old_ingredient.objects.create(name=name, user=user) for name in ["Egg", "EGG", "egg", "Leek"]
+        )
+        others_egg = old_ingredient.objects.create(name="EGG", user=other)
+        both = old_dish.objects.create(name="両方", user=user)
+        both.ingredients.set([egg, upper_egg, leek])
+        duplicate_only = old_dish.objects.create(name="重複のみ", user=user)
+        duplicate_only.ingredients.set([lower_egg])
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        new_ingredient = apps.get_model("ingredients", "Ingredient")
+        new_dish = apps.get_model("dishes", "GeneratedDish")
+
+        self.assertQuerySetEqual(
+            new_ingredient.objects.values_list("pk", flat=True),
+            [egg.pk, leek.pk, others_egg.pk],
+            ordered=False,
+        )
+        self.assertQuerySetEqual(
+            new_dish.objects.order_by("name").values_list("name", "ingredient_names"),
+            [("両方", ["Leek", "Egg"]), ("重複のみ", ["Egg"])],
+        )
+        self.assertQuerySetEqual(
+            new_dish.objects.get(pk=duplicate_only.pk).ingredients.values_list("pk", flat=True),
+            [egg.pk],
+        )
+
+
+class IngredientQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """材料アプリの全URLのクエリ数の上限."""
+
+    urlconf = "ingredients.urls"
+    budgets: ClassVar[list[QueryBudget]] = [
+        QueryBudget("list", 0, 4, paginated_view=IngredientListView),
+        QueryBudget("create", 0, 2),
+        QueryBudget("create", 0, 6, method="post", data=lambda _t: {"name": "新しい材料"}),
+        QueryBudget("import", 0, 2),
+        # 登録後に、実際に登録した行を読み直す
+        QueryBudget("import", 0, 7, method="post", data=lambda _t: {"names": "新しい材料1\n新しい材料2\n材料0"}),
+        QueryBudget("export", 0, 3),
+        QueryBudget("update", 0, 3, kwargs=lambda t: {"pk": t.ingredient.pk}),
+        QueryBudget(
+            "update",
+            0,
+            9,
+            method="post",
+            data=lambda _t: {"name": "変更した材料"},
+            kwargs=lambda t: {"pk": t.ingredient.pk},
+        ),
+        QueryBudget("delete", 0, 3, kwargs=lambda t: {"pk": t.ingredient.pk}),
+        QueryBudget("delete", 0, 6, method="post", kwargs=lambda t: {"pk": t.ingredient.pk}),
+    ]
@@ -9,6 +9,9 @@ urlpatterns = [
     path("", views.IngredientListView.as_view(), name="list"),
     # 材料登録
     path("create/", views.IngredientCreateView.as_view(), name="create"),
+    # 材料の一括登録・エクスポート
+    path("import/", views.IngredientImportView.as_view(), name="import"),
+    path("export/", views.IngredientExportView.as_view(), name="export"),
     # 材料編集
     path("<int:pk>/update/", views.IngredientUpdateView.as_view(), name="update"),
     # 材料削除
@@ -1,15 +1,19 @@
+import csv
+from collections.abc import Iterator
 from typing import Any
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
-from django.forms import BaseModelForm
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.urls import reverse_lazy
-from django.views.generic import CreateView, DeleteView, ListView, UpdateView
+from django.utils import timezone
+from django.views import View
+from django.views.generic import CreateView, DeleteView, FormView, ListView, UpdateView
 
-from .forms import IngredientForm
-from .models import Ingredient
+from .forms import IngredientForm, IngredientImportForm
+from .models import NAME_MAX_LENGTH, Ingredient
 
 
 class IngredientListView(LoginRequiredMixin, ListView):
@@ -25,49 +29,56 @@ class IngredientListView(LoginRequiredMixin, ListView):
         return Ingredient.objects.filter(user=self.request.user)
 
 
-class IngredientCreateView(LoginRequiredMixin, CreateView):
-    """材料登録ビュー."""
+class IngredientFormMixin:
+    """材料の登録・編集ビュー共通の処理."""
 
-    model = Ingredient
-    form_class = IngredientForm
-    template_name = "ingredients/create.html"
-    success_url = reverse_lazy("ingredients:list")
+    request: HttpRequest
+    # 保存成功時のメッセージ. {name}に材料名が入る
+    success_message = ""
 
     def get_form_kwargs(self) -> dict[str, Any]:
         """フォームにユーザー情報を渡す."""
-        kwargs = super().get_form_kwargs()
+        kwargs = super().get_form_kwargs()  # type: ignore[misc]
         kwargs["user"] = self.request.user
         return kwargs
 
-    def form_valid(self, form: BaseModelForm) -> HttpResponse:
+    def form_valid(self, form: IngredientForm) -> HttpResponse:
         """フォーム送信成功時の処理."""
-        messages.success(self.request, f"材料「{form.cleaned_data['name']}」を登録しました。")
-        return super().form_valid(form)
+        name = form.cleaned_data["name"]
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)  # type: ignore[misc]
+        except IntegrityError:
+            # 重複チェックの後に同じ名前の材料が登録された場合
+            form.add_error("name", form.duplicate_message(name))
+            return self.form_invalid(form)  # type: ignore[attr-defined]
+        messages.success(self.request, self.success_message.format(name=name))
+        return response
+
+
+class IngredientCreateView(LoginRequiredMixin, IngredientFormMixin, CreateView):
+    """材料登録ビュー."""
+
+    model = Ingredient
+    form_class = IngredientForm
+    template_name = "ingredients/create.html"
+    success_url = reverse_lazy("ingredients:list")
+    success_message = "材料「{name}」を登録しました。"
 
 
-class IngredientUpdateView(LoginRequiredMixin, UpdateView):
+class IngredientUpdateView(LoginRequiredMixin, IngredientFormMixin, UpdateView):
     """材料編集ビュー."""
 
     model = Ingredient
     form_class = IngredientForm
     template_name = "ingredients/update.html"
     success_url = reverse_lazy("ingredients:list")
+    success_message = "材料「{name}」を更新しました。"
 
     def get_queryset(self) -> QuerySet[Ingredient]:
         """ログインユーザーの材料のみを取得."""
         return Ingredient.objects.filter(user=self.request.user)
 
-    def get_form_kwargs(self) -> dict[str, Any]:
-        """フォームにユーザー情報を渡す."""
-        kwargs = super().get_form_kwargs()
-        kwargs["user"] = self.request.user
-        return kwargs
-
-    def form_valid(self, form: BaseModelForm) -> HttpResponse:
-        """フォーム送信成功時の処理."""
-        messages.success(self.request, f"材料「{form.cleaned_data['name']}」を更新しました。")
-        return super().form_valid(form)
-
 
 class IngredientDeleteView(LoginRequiredMixin, DeleteView):
     """材料削除ビュー."""
@@ -88,3 +99,62 @@ class IngredientDeleteView(LoginRequiredMixin, DeleteView):
             ingredient_name = ingredient.name
             messages.success(request, f"材料「{ingredient_name}」を削除しました。")
         return super().delete(request, *args, **kwargs)
+
+
+class IngredientImportView(LoginRequiredMixin, FormView):
+    """材料の一括登録ビュー."""
+
+    form_class = IngredientImportForm
+    template_name = "ingredients/import.html"
+    success_url = reverse_lazy("ingredients:list")
+
+    def form_valid(self, form: IngredientImportForm) -> HttpResponse:
+        """フォーム送信成功時の処理."""
+        result = Ingredient.objects.bulk_import(  # type: ignore[attr-defined]
+            self.request.user,
+            form.cleaned_data["ingredient_names"],
+        )
+        messages.success(self.request, f"{len(result.created)}件の材料を登録しました。")
+        if result.existing:
+            messages.info(self.request, f"{len(result.existing)}件は登録済みのためスキップしました。")
+        if result.invalid:
+            messages.warning(
+                self.request,
+                f"{len(result.invalid)}件は{NAME_MAX_LENGTH}文字を超えるためスキップしました。",
+            )
+        return super().form_valid(form)
+
+
+class _Echo:
+    """csv.writerの書き込み先. 書き込まれた行をそのまま返す."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class IngredientExportView(LoginRequiredMixin, View):
+    """材料のCSVエクスポートビュー.
+
+    行を逐次書き出すため、材料の件数によらずメモリ使用量は一定。
+    """
+
+    def get(self, request: HttpRequest) -> StreamingHttpResponse:
+        """GETリクエストの処理."""
+        filename = f"ingredients_{timezone.localdate():%Y%m%d}.csv"
+        response = StreamingHttpResponse(self.rows(request.user.pk), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @staticmethod
+    def rows(user_id: int) -> Iterator[str]:
+        """CSVの各行を生成する. Excelで文字化けしないようBOMを付ける."""
+        writer = csv.writer(_Echo())
+        yield "\ufeff" + writer.writerow(["name", "created_at"])
+        ingredients = (
+            Ingredient.objects.filter(user_id=user_id)
+            .order_by("created_at", "id")
+            .values_list("name", "created_at")
+            .iterator(chunk_size=500)
+        )
+        for name, created_at in ingredients:
+            yield writer.writerow([name, timezone.localtime(created_at).isoformat()])
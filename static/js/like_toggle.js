@@ -0,0 +1,48 @@
+// いいねボタンの非同期化 (プログレッシブエンハンスメント)
+// .like-formの送信をfetchに置き換え、JSONで返る新しいいいね状態といいね数でボタンだけを書き換える。
+// 通信に失敗した場合や想定外の応答の場合は、通常のフォーム送信 (ページ遷移) に切り替える。
+document.addEventListener('submit', function(event) {
+    const form = event.target;
+    if (!(form instanceof HTMLFormElement) || !form.classList.contains('like-form')) {
+        return;
+    }
+    event.preventDefault();
+
+    const button = form.querySelector('.like-btn');
+    if (button.disabled) {
+        return;
+    }
+    button.disabled = true;
+
+    fetch(form.action, {
+        method: 'POST',
+        headers: {
+            'Accept': 'application/json',
+            'X-CSRFToken': document.querySelector('meta[name="csrf-token"]').content,
+        },
+        credentials: 'same-origin',
+    })
+        .then(function(response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        })
+        .then(function(data) {
+            // トップページなどでは同じ料理が複数のリストに表示されるため、すべてのボタンを更新する
+            const action = form.getAttribute('action');
+            document.querySelectorAll('form.like-form').forEach(function(likeForm) {
+                if (likeForm.getAttribute('action') !== action) {
+                    return;
+                }
+                const likeButton = likeForm.querySelector('.like-btn');
+                likeButton.classList.toggle('liked', data.liked);
+                likeButton.textContent = (data.liked ? '❤️ ' : '🤍 ') + data.likes_count;
+            });
+            button.disabled = false;
+        })
+        .catch(function() {
+            // HTMLFormElement.submitはsubmitイベントを発生させないため、この処理は繰り返されない
+            form.submit();
+        });
+});
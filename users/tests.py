@@ -1,3 +1,30 @@
+from typing import ClassVar
+
 from django.test import TestCase
 
-# Create your tests here.
+from core.testing import TEST_PASSWORD, QueryBudget, QueryBudgetMixin
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """ユーザーアプリの全URLのクエリ数の上限."""
+
+    urlconf = "users.urls"
+    budgets: ClassVar[list[QueryBudget]] = [
+        QueryBudget("login", 0, 2),
+        QueryBudget(
+            "login",
+            10,
+            7,
+            method="post",
+            data=lambda _t: {"username": "budget_user", "password": TEST_PASSWORD},
+        ),
+        QueryBudget("logout", 0, 4),
+        QueryBudget("signup", 0, 2),
+        QueryBudget(
+            "signup",
+            3,
+            3,
+            method="post",
+            data=lambda _t: {"username": "new_user", "password1": "Xy7-budget-pass", "password2": "Xy7-budget-pass"},
+        ),
+    ]